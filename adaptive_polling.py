@@ -0,0 +1,96 @@
+'''Adaptive polling: poll less often while the inverters of a DTU or template produce nothing, e.g. at night'''
+
+# system imports:
+import datetime
+import math
+
+# the sun is considered up if its center is less than 0.833 degree below the horizon (refraction, disc size)
+SUN_ALTITUDE_AT_SUNRISE = -0.833
+
+
+def sun_times(day, latitude, longitude):
+    '''
+    Return (sunrise, sunset) of the given date as UTC datetimes, using the NOAA approximation (about 1 minute).
+
+    Returns (None, None) if the sun does not rise (polar night) and (day start, day end) if it does not set.
+    '''
+    gamma = 2 * math.pi / 365 * (day.timetuple().tm_yday - 1)
+    equation_of_time = 229.18 * (0.000075 + 0.001868 * math.cos(gamma) - 0.032077 * math.sin(gamma)
+                                 - 0.014615 * math.cos(2 * gamma) - 0.040849 * math.sin(2 * gamma))
+    declination = (0.006918 - 0.399912 * math.cos(gamma) + 0.070257 * math.sin(gamma)
+                   - 0.006758 * math.cos(2 * gamma) + 0.000907 * math.sin(2 * gamma)
+                   - 0.002697 * math.cos(3 * gamma) + 0.00148 * math.sin(3 * gamma))
+    latitude_rad = math.radians(latitude)
+    cos_hour_angle = ((math.sin(math.radians(SUN_ALTITUDE_AT_SUNRISE)) - math.sin(latitude_rad) * math.sin(declination))
+                      / (math.cos(latitude_rad) * math.cos(declination)))
+    midnight = datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc)
+    if cos_hour_angle > 1:
+        return None, None
+    if cos_hour_angle < -1:
+        return midnight, midnight + datetime.timedelta(days=1)
+    hour_angle = math.degrees(math.acos(cos_hour_angle))
+    sunrise = 720 - 4 * (longitude + hour_angle) - equation_of_time
+    sunset = 720 - 4 * (longitude - hour_angle) - equation_of_time
+    return midnight + datetime.timedelta(minutes=sunrise), midnight + datetime.timedelta(minutes=sunset)
+
+
+class AdaptivePolling:
+    '''
+    Polling policy of one service: the fast interval while it produces, idle_interval once it was idle.
+
+    The service is idle after it reported a power of 0 for idle_after seconds. If latitude and
+    longitude are configured, the interval is only stretched between sunset and `wake_before`
+    seconds before sunrise, and never beyond that point, so the morning ramp-up is not delayed.
+    The first non-zero power switches back to the fast interval. idle_interval=0 disables the policy.
+    '''
+
+    def __init__(self, idle_interval=0, idle_after=600, latitude=None, longitude=None, wake_before=1800):
+        self.idle_interval = float(idle_interval)
+        self.idle_after = float(idle_after)
+        self.latitude = latitude
+        self.longitude = longitude
+        self.wake_before = datetime.timedelta(seconds=wake_before)
+        self._idle_since = None
+
+    @property
+    def enabled(self):
+        '''True if the interval can be stretched'''
+        return self.idle_interval > 0
+
+    def record(self, power, now):
+        '''Record the power of an update (None if unknown, counts as 0), now is a monotonic timestamp in seconds'''
+        if power is not None and power > 0:
+            self._idle_since = None
+        elif self._idle_since is None:
+            self._idle_since = now
+
+    def is_idle(self, now):
+        '''True if the power was 0 for at least idle_after seconds'''
+        return self._idle_since is not None and now - self._idle_since >= self.idle_after
+
+    def get_interval(self, interval, now, utc_now=None):
+        '''Return the polling interval in ms to use instead of the (fast) interval in ms'''
+        if not self.enabled or not self.is_idle(now):
+            return interval
+        idle_interval = self.idle_interval
+        if self.latitude is not None and self.longitude is not None:
+            until_daylight = self.seconds_until_daylight(utc_now or datetime.datetime.now(datetime.timezone.utc))
+            idle_interval = min(idle_interval, until_daylight)
+        return max(interval, idle_interval * 1000)
+
+    def seconds_until_daylight(self, utc_now):
+        '''Seconds until wake_before seconds before the next sunrise, 0 during the day'''
+        next_start = None
+        for day_offset in (-1, 0, 1, 2):
+            sunrise, sunset = sun_times((utc_now + datetime.timedelta(days=day_offset)).date(),
+                                        self.latitude, self.longitude)
+            if sunrise is None:
+                continue  # polar night
+            start = sunrise - self.wake_before
+            if start <= utc_now < sunset:
+                return 0
+            if start > utc_now and (next_start is None or start < next_start):
+                next_start = start
+        if next_start is None:
+            return math.inf
+        return (next_start - utc_now).total_seconds()
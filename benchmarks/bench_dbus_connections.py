@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+'''
+Cost of the D-Bus connections of the services, measured on a local session bus.
+
+Every service registers its com.victronenergy.*.http_<instance> name on a private connection,
+because velib's VeDbusService exports its object tree at "/" of the connection it is given and
+D-Bus dispatches a method call by connection and object path, not by the bus name it was sent to.
+This benchmark compares, for --services names, one private connection per name against all names
+on one connection: registration time, RSS and open file descriptors of the process. With --velib
+it also checks whether the installed velib can put two VeDbusService on one connection.
+
+Needs dbus-python. Without --address a dbus-daemon --session is started for the run.
+
+Usage: python3 benchmarks/bench_dbus_connections.py [--services 13] [--address ADDRESS] [--velib PATH]
+'''
+
+# system imports:
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARK_DIR)  # noqa pylint: disable=wrong-import-position
+
+from bench_scaling import get_rss_kb  # noqa pylint: disable=wrong-import-position
+
+MODES = ("private", "shared")
+
+
+def get_fd_count():
+    '''Number of open file descriptors of this process'''
+    return len(os.listdir("/proc/self/fd"))
+
+
+def run_one(mode, services, address):
+    '''Register the names in this process, return the results as dict'''
+    import dbus  # pylint: disable=import-outside-toplevel,import-error
+    import dbus.service  # pylint: disable=import-outside-toplevel,import-error
+
+    rss_before, fds_before = get_rss_kb(), get_fd_count()
+    started = time.perf_counter()
+    connections, names = [], []
+    for number in range(services):
+        if mode == "private" or not connections:
+            connection = dbus.bus.BusConnection(address)
+            connections.append(connection)
+        names.append(dbus.service.BusName(f"com.victronenergy.pvinverter.http_{100 + number}", connections[-1],
+                                          do_not_queue=True))
+    startup_ms = (time.perf_counter() - started) * 1000
+    return {
+        "mode": mode,
+        "services": services,
+        "connections": len(connections),
+        "startup_ms": round(startup_ms, 1),
+        "rss_kb": get_rss_kb() - rss_before,
+        "fds": get_fd_count() - fds_before,
+    }
+
+
+def check_velib(velib_path, address):
+    '''Try two VeDbusService on one connection, return None if it works, else the error'''
+    import dbus  # pylint: disable=import-outside-toplevel,import-error
+    sys.path.insert(1, velib_path)
+    from vedbus import VeDbusService  # pylint: disable=import-outside-toplevel,import-error
+
+    connection = dbus.bus.BusConnection(address)
+    try:
+        for number in range(2):
+            service = VeDbusService(f"com.victronenergy.pvinverter.http_{200 + number}", bus=connection,
+                                    register=False)
+            service.add_path("/Ac/Power", 0)
+            service.register()
+    except Exception as error:  # pylint: disable=broad-except
+        return f"{type(error).__name__}: {error}"
+    return None
+
+
+def start_session_bus():
+    '''Start a dbus-daemon --session for the run, return the process and its address'''
+    daemon = subprocess.Popen(  # pylint: disable=consider-using-with
+        ["dbus-daemon", "--session", "--nofork", "--print-address=1"], stdout=subprocess.PIPE, text=True)
+    return daemon, daemon.stdout.readline().strip()
+
+
+def main():
+    '''Measure both modes, each in its own process'''
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0].strip())
+    parser.add_argument("--services", type=int, default=13, help="number of services (bus names)")
+    parser.add_argument("--address", default=None, help="bus address, default: a dbus-daemon started for the run")
+    parser.add_argument("--velib", default=None, help="path of velib_python, to check shared connections")
+    parser.add_argument("--run-one", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(run_one(args.run_one, args.services, args.address)))
+        return 0
+
+    daemon = None
+    if args.address is None:
+        daemon, args.address = start_session_bus()
+    try:
+        print(f"{'mode':8} {'services':>8} {'connections':>11} {'startup ms':>10} {'RSS kB':>8} {'fds':>5}")
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run-one", mode, "--services", str(args.services),
+                 "--address", args.address],
+                stdout=subprocess.PIPE, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{result['mode']:8} {result['services']:8} {result['connections']:11} "
+                  f"{result['startup_ms']:10.1f} {result['rss_kb']:8} {result['fds']:5}", flush=True)
+        if args.velib:
+            error = check_velib(args.velib, args.address)
+            print("velib: two VeDbusService on one connection " + ("work" if error is None else f"fail: {error}"))
+    finally:
+        if daemon is not None:
+            daemon.terminate()
+            daemon.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
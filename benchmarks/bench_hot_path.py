@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+'''
+Micro-benchmarks of the functions run for every inverter in every update cycle.
+
+The functions run on the docs/*.json fixtures, the services write to an in-memory D-Bus
+stand-in. For each case the time per call (best of several runs) and the memory allocated
+during one call (peak traced by tracemalloc) are shown. CPython has no counter of single
+allocations, the peak bytes are the closest stable measure of the garbage made per call.
+
+With --save-baseline the results are stored, later runs are compared against them and exit with
+status 1 if a case got slower or allocates more than --threshold percent.
+
+Usage: python3 benchmarks/bench_hot_path.py [--filter TEXT] [--baseline FILE] [--save-baseline] [--threshold 20]
+'''
+
+# system imports:
+import argparse
+import json
+import logging
+import os
+import sys
+import timeit
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, '..'))  # noqa pylint: disable=wrong-import-position
+sys.path.insert(0, BENCHMARK_DIR)  # noqa pylint: disable=wrong-import-position
+
+import memory_dbus  # noqa pylint: disable=wrong-import-position
+
+memory_dbus.install()
+
+# our imports:
+import constants  # noqa pylint: disable=wrong-import-position
+from adaptive_polling import AdaptivePolling  # noqa pylint: disable=wrong-import-position
+from dbus_publisher import PublishFilter  # noqa pylint: disable=wrong-import-position
+from dbus_service import DbusService  # noqa pylint: disable=wrong-import-position,import-error
+from dtu_poller import DtuPoller  # noqa pylint: disable=wrong-import-position
+from fleet_table import FleetTable  # noqa pylint: disable=wrong-import-position
+from helpers import (  # noqa pylint: disable=wrong-import-position
+    PathAccessor,
+    convert_to_expected_type,
+    get_ahoy_field_by_name,
+    get_value_by_path,
+)
+
+DOCS_DIR = os.path.join(BENCHMARK_DIR, '..', 'docs')
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline_hot_path.json")
+
+TEMPLATE_POWER = ["StatusSNS", "ENERGY", "Power", "0"]
+
+
+def load_fixture(file_name):
+    '''Return the decoded docs/<file_name>'''
+    with open(os.path.join(DOCS_DIR, file_name), encoding="utf-8") as file:
+        return json.load(file)
+
+
+def get_ahoy_data():
+    '''Ahoy /api/live with the inverter data added, as check_and_enrich_ahoy_data() does'''
+    meter_data = load_fixture("ahoy_0.5.93_live.json")
+    meter_data["inverter"] = [load_fixture(f"ahoy_0.5.93_inverter-id-{number}.json") for number in range(2)]
+    return meter_data
+
+
+def create_service(dtuvariant, meter_data, phase="L1", servicename="com.victronenergy.pvinverter",
+                   refresh_interval=60):
+    '''A DbusService on the fixture data, without config file or network'''
+    service = DbusService("testing", 0)
+    service.dtuvariant = dtuvariant
+    service.set_test_data(meter_data)
+    service._servicename = servicename  # pylint: disable=protected-access
+    service.pvinverterphase = phase
+    service.deviceinstance = 100
+    service.host = "dtu"
+    service._dbusservice = memory_dbus.MemoryVeDbusService()  # pylint: disable=protected-access
+    service._dbus_batch = None  # pylint: disable=protected-access
+    service._publish_seconds = None  # pylint: disable=protected-access
+    service._publish_filter = PublishFilter(refresh_interval=refresh_interval)  # pylint: disable=protected-access
+    service.polling_policy = AdaptivePolling()
+    if dtuvariant == constants.DTUVARIANT_TEMPLATE:
+        service._template_accessors = (  # pylint: disable=protected-access
+            PathAccessor(TEMPLATE_POWER, None, 1),
+            PathAccessor(["StatusSNS", "ENERGY", "Total"], None, 1),
+            PathAccessor(["StatusSNS", "ENERGY", "Current", "0"]),
+            PathAccessor(["StatusSNS", "ENERGY", "Voltage"]),
+        )
+    return service
+
+
+def create_table_service(meter_data, build_table, dtuvariant=constants.DTUVARIANT_OPENDTU):
+    '''A DbusService reading its values from the FleetTable of a DtuPoller snapshot'''
+    service = create_service(dtuvariant, None)
+    service._poller = DtuPoller(lambda: meter_data, build_table)  # pylint: disable=protected-access
+    service._poller.poll(0)  # pylint: disable=protected-access
+    return service
+
+
+def get_fleet_data(inverters):
+    '''OpenDTU /api/livedata/status with `inverters` producing inverters'''
+    meter_data = load_fixture("opendtu_status.json")
+    inverter = meter_data["inverters"][1]
+    meter_data["inverters"] = [dict(inverter, serial=f"1161{number:08d}") for number in range(inverters)]
+    return meter_data
+
+
+def get_cases():
+    '''Return the benchmark cases as list of (name, function without arguments)'''
+    ahoy_data = get_ahoy_data()
+    opendtu_data = load_fixture("opendtu_status.json")
+    opendtu_data["inverters"][0]["producing"] = True
+    template_data = load_fixture("tasmota_shelly_2pm.json")
+
+    ahoy = create_service(constants.DTUVARIANT_AHOY, ahoy_data)
+    opendtu = create_service(constants.DTUVARIANT_OPENDTU, opendtu_data)
+    template = create_service(constants.DTUVARIANT_TEMPLATE, template_data)
+    opendtu_3p = create_service(constants.DTUVARIANT_OPENDTU, opendtu_data, phase="3P")
+    opendtu_inverter = create_service(constants.DTUVARIANT_OPENDTU, opendtu_data,
+                                      servicename="com.victronenergy.inverter")
+    opendtu_write_all = create_service(constants.DTUVARIANT_OPENDTU, opendtu_data, refresh_interval=0)
+    opendtu_table = create_table_service(opendtu_data, FleetTable.from_opendtu)
+    ahoy_table = create_table_service(ahoy_data, FleetTable.from_ahoy, constants.DTUVARIANT_AHOY)
+    fleet_data = get_fleet_data(200)
+
+    return [
+        ("get_ahoy_field_by_name P_AC", lambda: get_ahoy_field_by_name(ahoy_data, 0, "P_AC")),
+        ("get_ahoy_field_by_name U_DC", lambda: get_ahoy_field_by_name(ahoy_data, 0, "U_DC", False)),
+        ("get_value_by_path template power", lambda: get_value_by_path(template_data, TEMPLATE_POWER)),
+        ("convert_to_expected_type float", lambda: convert_to_expected_type("229.5", float, None)),
+        ("convert_to_expected_type invalid", lambda: convert_to_expected_type("n/a", float, None)),
+        ("get_values_for_inverter ahoy", ahoy.get_values_for_inverter),
+        ("get_values_for_inverter opendtu", opendtu.get_values_for_inverter),
+        ("get_values_for_inverter template", template.get_values_for_inverter),
+        ("get_values_for_inverter opendtu table", opendtu_table.get_values_for_inverter),
+        ("get_values_for_inverter ahoy table", ahoy_table.get_values_for_inverter),
+        ("FleetTable.from_ahoy", lambda: FleetTable.from_ahoy(ahoy_data)),
+        ("FleetTable.from_opendtu 200 inverters", lambda: FleetTable.from_opendtu(fleet_data)),
+        ("set_dbus_values ahoy", ahoy.set_dbus_values),
+        ("set_dbus_values opendtu", opendtu.set_dbus_values),
+        ("set_dbus_values opendtu 3P", opendtu_3p.set_dbus_values),
+        ("set_dbus_values opendtu inverter", opendtu_inverter.set_dbus_values),
+        ("set_dbus_values opendtu write all", opendtu_write_all.set_dbus_values),
+        ("set_dbus_values template", template.set_dbus_values),
+        ("set_dbus_values_to_zero opendtu", opendtu.set_dbus_values_to_zero),
+        ("set_dbus_values_to_zero opendtu 3P", opendtu_3p.set_dbus_values_to_zero),
+    ]
+
+
+def measure_time(function, repeat=5, min_seconds=0.2):
+    '''Return the best time per call in nanoseconds'''
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    number = max(number, int(number * min_seconds / 0.2))
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def measure_allocations(function, calls=20):
+    '''Return the peak bytes allocated during one call (the smallest of several calls)'''
+    function()  # warm-up: caches, interned strings, the first D-Bus writes
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(calls):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            function()
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+    return min(peaks)
+
+
+def compare(results, baseline, threshold):
+    '''Print the cases which got worse than in baseline, return their number'''
+    regressions = 0
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for field in ("ns", "bytes"):
+            # small absolute changes are noise, e.g. a few bytes of a dict resize
+            slack = 50 if field == "ns" else 64
+            if result[field] > previous[field] * (1 + threshold / 100) + slack:
+                regressions += 1
+                print(f"REGRESSION {name} {field}/op: {previous[field]} -> {result[field]}")
+    return regressions
+
+
+def main():
+    '''Run the benchmark, compare with and optionally save the baseline'''
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0].strip())
+    parser.add_argument("--filter", default="", help="only run the cases containing this text")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=20, help="allowed slowdown in percent")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+
+    results = {}
+    print(f"{'case':38} {'ns/op':>9} {'B/op':>7} {'baseline':>9} {'change':>7}")
+    for name, function in get_cases():
+        if args.filter not in name:
+            continue
+        result = {"ns": round(measure_time(function)), "bytes": measure_allocations(function)}
+        results[name] = result
+        previous = baseline.get(name)
+        change = f"{(result['ns'] / previous['ns'] - 1) * 100:+6.1f}%" if previous else ""
+        print(f"{name:38} {result['ns']:9} {result['bytes']:7} {previous['ns'] if previous else '':>9} {change:>7}",
+              flush=True)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    return 1 if compare(results, baseline, args.threshold) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+'''
+Benchmark of the JSON decoding of the docs/*.json fixtures with all installed backends.
+
+For each fixture and backend it shows the time per decode of the whole document and with the
+selective decoding used by the services, and how many values are kept afterwards.
+
+Usage: python3 benchmarks/bench_json_decode.py [number of decodes per measurement]
+'''
+
+# system imports:
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+# our imports:
+import constants  # noqa pylint: disable=wrong-import-position
+from json_decoder import JsonDecoder, get_backend_names  # noqa pylint: disable=wrong-import-position
+
+DOCS_DIR = os.path.join(os.path.dirname(__file__), '..', 'docs')
+URL = "http://dtu/api/livedata/status"
+
+# fields read by the services from each fixture (None = no selective decoding for this document)
+FIELDS = {
+    "opendtu_status.json": constants.OPENDTU_LIVEDATA_FIELDS,
+    "opendtu_v24.2.12_livedata_status.json": constants.OPENDTU_LIVEDATA_FIELDS,
+    "opendtu_v24.2.12_inverter.json": constants.OPENDTU_LIVEDATA_FIELDS,
+    "tasmota_shelly_2pm.json": [
+        ["StatusSNS", "ENERGY", "Power", "0"],
+        ["StatusSNS", "ENERGY", "Total"],
+        ["StatusSNS", "ENERGY", "Voltage"],
+        ["StatusSNS", "ENERGY", "Current", "0"],
+    ],
+}
+
+
+def count_values(document):
+    '''Number of scalar values in a decoded document'''
+    if isinstance(document, dict):
+        return sum(count_values(value) for value in document.values())
+    if isinstance(document, list):
+        return sum(count_values(value) for value in document)
+    return 1
+
+
+def measure(decoder, content, url, number):
+    '''Return the time per decode in microseconds'''
+    return min(timeit.repeat(lambda: decoder.decode(content, url), number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    '''Run the benchmark and print the results as table'''
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    backends = get_backend_names()
+    print(f"{'fixture':46} {'bytes':>6} {'backend':8} {'full us':>8} {'select us':>9} {'values':>7} {'kept':>5}")
+    for file_name in sorted(os.listdir(DOCS_DIR)):
+        if not file_name.endswith(".json"):
+            continue
+        with open(os.path.join(DOCS_DIR, file_name), "rb") as file:
+            content = file.read()
+        try:
+            JsonDecoder("json").decode(content)
+        except ValueError:
+            continue  # annotated example, not a plain response
+        for backend in backends:
+            full_decoder = JsonDecoder(backend)
+            selective_decoder = JsonDecoder(backend, selective=True)
+            if FIELDS.get(file_name):
+                selective_decoder.add_fields(URL, FIELDS[file_name])
+            full_us = measure(full_decoder, content, URL, number)
+            select_us = measure(selective_decoder, content, URL, number)
+            values = count_values(full_decoder.decode(content, URL))
+            kept = count_values(selective_decoder.decode(content, URL))
+            print(f"{file_name:46} {len(content):6} {backend:8} {full_us:8.1f} {select_us:9.1f} {values:7} {kept:5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+'''
+Steady-state memory of the services, measured with tracemalloc against a fake DTU.
+
+For each response payload size a fresh process starts benchmarks/fake_dtu.py, registers the services
+on an in-memory D-Bus stand-in and runs update cycles. Between two cycles the services should only
+keep the values they publish (the FleetTable of a DTU, the Reading of a template), not the responses,
+so the memory still allocated after a cycle should not grow with --payloads.
+
+It reports the memory traced after the warm-up cycles and after the measured cycles (after a
+gc.collect()), the peak during the cycles and the growth per cycle.
+
+Usage: python3 benchmarks/bench_memory.py [--variant opendtu|opendtu-v24|ahoy|template]
+           [--inverters 10] [--payloads 0,10000,100000] [--cycles 20]
+'''
+
+# system imports:
+import argparse
+import gc
+import json
+import logging
+import os
+import subprocess
+import sys
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, '..'))  # noqa pylint: disable=wrong-import-position
+sys.path.insert(0, BENCHMARK_DIR)  # noqa pylint: disable=wrong-import-position
+
+from bench_scaling import create_config  # noqa pylint: disable=wrong-import-position
+from fake_dtu import VARIANTS  # noqa pylint: disable=wrong-import-position
+
+WARMUP_CYCLES = 3
+
+
+def get_traced_kb():
+    '''Memory traced by tracemalloc after a full collection, in kB'''
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0] / 1024
+
+
+def run_one(variant, inverters, cycles, payload):
+    '''Measure one payload size in this process, return the results as dict'''
+    import memory_dbus  # pylint: disable=import-outside-toplevel
+    logging.basicConfig(level=logging.ERROR)
+    glib = memory_dbus.install()
+    import dbus_opendtu  # pylint: disable=import-outside-toplevel,import-error
+    from dbus_service import DbusService  # pylint: disable=import-outside-toplevel,import-error
+
+    with subprocess.Popen([sys.executable, os.path.join(BENCHMARK_DIR, "fake_dtu.py"), "--variant", variant,
+                           "--inverters", str(inverters), "--payload", str(payload)],
+                          stdout=subprocess.PIPE, text=True) as server:
+        try:
+            port = int(server.stdout.readline().split()[1])
+            config = create_config(variant, inverters, f"127.0.0.1:{port}")
+            DbusService._get_config = staticmethod(lambda: config)  # pylint: disable=protected-access
+
+            tracemalloc.start()
+            services = dbus_opendtu.get_DbusServices(config)
+            for _cycle in range(WARMUP_CYCLES):
+                glib.advance(3600)  # all polling intervals have elapsed
+                dbus_opendtu.update_all_services(services)
+            after_warmup_kb = get_traced_kb()
+            tracemalloc.reset_peak()
+            for _cycle in range(cycles):
+                glib.advance(3600)
+                dbus_opendtu.update_all_services(services)
+            peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+            after_cycles_kb = get_traced_kb()
+            tracemalloc.stop()
+        finally:
+            server.terminate()
+
+    return {
+        "variant": variant,
+        "inverters": inverters,
+        "payload": payload,
+        "failed": sum(1 for service in services if not service.last_update_successful),
+        "after_warmup_kb": round(after_warmup_kb, 1),
+        "after_cycles_kb": round(after_cycles_kb, 1),
+        "peak_kb": round(peak_kb, 1),
+        "growth_per_cycle_kb": round((after_cycles_kb - after_warmup_kb) / cycles, 2),
+    }
+
+
+def main():
+    '''Measure each payload size in its own process'''
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0].strip())
+    parser.add_argument("--variant", choices=VARIANTS, default="opendtu")
+    parser.add_argument("--inverters", type=int, default=10, help="number of inverters (or templates)")
+    parser.add_argument("--payloads", default="0,10000,100000", help="comma separated extra bytes per response")
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--run-one", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    payloads = [int(payload) for payload in args.payloads.split(",")]
+
+    if args.run_one:
+        print(json.dumps(run_one(args.variant, args.inverters, args.cycles, payloads[0])))
+        return 0
+
+    print(f"{'variant':12} {'inverters':>9} {'payload':>8} {'failed':>6} {'warm-up kB':>10} {'kept kB':>9} "
+          f"{'peak kB':>9} {'growth kB/cycle':>15}")
+    for payload in payloads:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-one", "--variant", args.variant,
+             "--inverters", str(args.inverters), "--payloads", str(payload), "--cycles", str(args.cycles)],
+            stdout=subprocess.PIPE, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{result['variant']:12} {result['inverters']:9} {result['payload']:8} {result['failed']:6} "
+              f"{result['after_warmup_kb']:10.1f} {result['after_cycles_kb']:9.1f} {result['peak_kb']:9.1f} "
+              f"{result['growth_per_cycle_kb']:15.2f}", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
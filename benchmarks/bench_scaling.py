@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+'''
+End-to-end scaling benchmark: get_DbusServices() and update_all_services() against a fake DTU.
+
+For each fleet size a fresh process starts benchmarks/fake_dtu.py with that many inverters
+(or templates), registers the services on an in-memory D-Bus stand-in and runs update cycles.
+It reports per cycle the wall time, the CPU time of the driver, the HTTP requests and the RSS.
+
+With --save-baseline the results are stored, later runs are compared against them and exit with
+status 1 if a value got worse by more than --threshold percent (requests: by any amount).
+
+Usage: python3 benchmarks/bench_scaling.py [--variant opendtu|opendtu-v24|ahoy|template]
+           [--sizes 1,10,50,100,200] [--cycles 20] [--latency 0.02] [--payload 0]
+           [--baseline FILE] [--save-baseline] [--threshold 25]
+'''
+
+# system imports:
+import argparse
+import configparser
+import json
+import logging
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, '..'))  # noqa pylint: disable=wrong-import-position
+sys.path.insert(0, BENCHMARK_DIR)  # noqa pylint: disable=wrong-import-position
+
+from fake_dtu import VARIANTS  # noqa pylint: disable=wrong-import-position
+
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline_scaling.json")
+
+# result fields compared against the baseline, with the allowed increase in percent (None = --threshold)
+COMPARED = {"cycle_ms": None, "cpu_ms": None, "requests": 0, "rss_kb": None}
+
+
+def get_rss_kb():
+    '''Current resident set size in kB (peak RSS where /proc is not available)'''
+    try:
+        with open("/proc/self/status", encoding="ascii") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def create_config(variant, inverters, host):
+    '''Config of a site with `inverters` inverters (or templates) on the fake DTU at host'''
+    config = configparser.ConfigParser()
+    config["DEFAULT"] = {
+        "DTU": "template" if variant == "template" else "opendtu" if variant.startswith("opendtu") else "ahoy",
+        "Host": host,
+        "NumberOfInvertersToQuery": "0" if variant == "template" else str(inverters),
+        "NumberOfTemplates": str(inverters) if variant == "template" else "0",
+        "Logging": "ERROR",
+        "DiscoveryCacheFile": "",
+        "MaxAgeTsLastSuccess": "600",
+        "RequestCoalescingTTL": "0",  # the cycles follow each other at once, each must fetch
+    }
+    for number in range(inverters):
+        if variant == "template":
+            config[f"TEMPLATE{number}"] = {
+                "Username": "", "Password": "", "DigestAuth": "False", "Host": host,
+                "CUST_SN": str(10000000 + number), "CUST_API_PATH": f"cm?cmnd=STATUS+8&device={number}",
+                "CUST_POLLING": "5000",
+                "CUST_Total": "StatusSNS/ENERGY/Total", "CUST_Total_Mult": "1",
+                "CUST_Power": "StatusSNS/ENERGY/Power/0", "CUST_Power_Mult": "1",
+                "CUST_Voltage": "StatusSNS/ENERGY/Voltage", "CUST_Current": "StatusSNS/ENERGY/Current/0",
+                "Phase": "L1", "DeviceInstance": str(100 + number), "AcPosition": "0", "Name": f"Tasmota {number}",
+            }
+        else:
+            config[f"INVERTER{number}"] = {"Phase": "L1", "DeviceInstance": str(100 + number), "AcPosition": "0"}
+    return config
+
+
+def get_request_count(port):
+    '''Number of requests the fake DTU has served'''
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/__stats", timeout=5) as response:
+        return json.load(response)["requests"]
+
+
+def run_one(variant, inverters, cycles, latency, payload):
+    '''Measure one fleet size in this process, return the results as dict'''
+    import memory_dbus  # pylint: disable=import-outside-toplevel
+    logging.basicConfig(level=logging.ERROR)
+    glib = memory_dbus.install()
+    import dbus_opendtu  # pylint: disable=import-outside-toplevel,import-error
+    from dbus_service import DbusService  # pylint: disable=import-outside-toplevel,import-error
+
+    with subprocess.Popen([sys.executable, os.path.join(BENCHMARK_DIR, "fake_dtu.py"), "--variant", variant,
+                           "--inverters", str(inverters), "--latency", str(latency), "--payload", str(payload)],
+                          stdout=subprocess.PIPE, text=True) as server:
+        try:
+            port = int(server.stdout.readline().split()[1])
+            config = create_config(variant, inverters, f"127.0.0.1:{port}")
+            DbusService._get_config = staticmethod(lambda: config)  # pylint: disable=protected-access
+
+            started = time.perf_counter()
+            services = dbus_opendtu.get_DbusServices(config)
+            startup_ms = (time.perf_counter() - started) * 1000
+
+            wall, cpu = [], []
+            requests_before = None
+            for cycle in range(cycles + 1):
+                glib.advance(3600)  # all polling intervals have elapsed
+                if cycle == 1:
+                    requests_before = get_request_count(port)  # the first cycle is the warm-up
+                wall_started, cpu_started = time.perf_counter(), time.process_time()
+                dbus_opendtu.update_all_services(services)
+                wall.append((time.perf_counter() - wall_started) * 1000)
+                cpu.append((time.process_time() - cpu_started) * 1000)
+            requests = get_request_count(port) - requests_before
+        finally:
+            server.terminate()
+
+    return {
+        "variant": variant,
+        "inverters": inverters,
+        "services": len(services),
+        "failed": sum(1 for service in services if not service.last_update_successful),
+        "startup_ms": round(startup_ms, 1),
+        "cycle_ms": round(statistics.median(wall[1:]), 2),
+        "cpu_ms": round(statistics.median(cpu[1:]), 2),
+        "requests": round(requests / cycles, 1),
+        "rss_kb": get_rss_kb(),
+    }
+
+
+def run_sizes(args):
+    '''Measure each fleet size in its own process'''
+    results = []
+    for inverters in args.sizes:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-one", "--variant", args.variant,
+             "--sizes", str(inverters), "--cycles", str(args.cycles), "--latency", str(args.latency),
+             "--payload", str(args.payload)],
+            stdout=subprocess.PIPE, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{result['variant']:12} {result['inverters']:9} {result['services']:8} {result['failed']:6} "
+              f"{result['startup_ms']:10.1f} {result['cycle_ms']:9.2f} {result['cpu_ms']:8.2f} "
+              f"{result['requests']:8.1f} {result['rss_kb']:8}", flush=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    '''Print the values which got worse than in baseline, return their number'''
+    regressions = 0
+    for result in results:
+        key = f"{result['variant']}/{result['inverters']}"
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        for field, allowed in COMPARED.items():
+            allowed = threshold if allowed is None else allowed
+            if result[field] > previous[field] * (1 + allowed / 100) + 1e-9:
+                regressions += 1
+                print(f"REGRESSION {key} {field}: {previous[field]} -> {result[field]}")
+    return regressions
+
+
+def main():
+    '''Run the benchmark, compare with and optionally save the baseline'''
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0].strip())
+    parser.add_argument("--variant", choices=VARIANTS, default="opendtu")
+    parser.add_argument("--sizes", default="1,10,50,100,200", help="comma separated numbers of inverters")
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02, help="response latency of the fake DTU in seconds")
+    parser.add_argument("--payload", type=int, default=0, help="extra bytes in each response")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=25, help="allowed slowdown in percent")
+    parser.add_argument("--run-one", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",")]
+
+    if args.run_one:
+        print(json.dumps(run_one(args.variant, args.sizes[0], args.cycles, args.latency, args.payload)))
+        return 0
+
+    print(f"{'variant':12} {'inverters':>9} {'services':>8} {'failed':>6} {'startup ms':>10} {'cycle ms':>9} "
+          f"{'CPU ms':>8} {'requests':>8} {'RSS kB':>8}")
+    results = run_sizes(args)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+    regressions = 0 if args.save_baseline else compare(results, baseline, args.threshold)
+    if args.save_baseline:
+        baseline.update({f"{result['variant']}/{result['inverters']}": result for result in results})
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
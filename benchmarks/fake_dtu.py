@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+'''
+Fake OpenDTU, Ahoy or template (Tasmota) HTTP server for the benchmarks.
+
+It serves N generated inverters, built from the docs/*.json fixtures, with a configurable
+response latency and extra payload. The values change with every response, so each poll
+has new data to publish. GET /__stats returns the number of requests served so far.
+
+Usage: python3 benchmarks/fake_dtu.py [--variant opendtu|opendtu-v24|ahoy|template] [--inverters N]
+                                      [--latency SECONDS] [--payload BYTES] [--port PORT]
+The first line printed is "port <port>", useful with --port 0.
+'''
+
+# system imports:
+import argparse
+import copy
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+DOCS_DIR = os.path.join(os.path.dirname(__file__), '..', 'docs')
+
+VARIANTS = ("opendtu", "opendtu-v24", "ahoy", "template")
+
+
+def load_fixture(file_name):
+    '''Return the decoded docs/<file_name>'''
+    with open(os.path.join(DOCS_DIR, file_name), encoding="utf-8") as file:
+        return json.load(file)
+
+
+class FakeDtu:
+    '''
+    Generates the responses of a DTU with `inverters` inverters.
+
+    opendtu: /api/livedata/status with all details (OpenDTU before v24.2.12)
+    opendtu-v24: /api/livedata/status with a summary, details from /api/livedata/status?inv=<serial>
+    ahoy: /api/live plus /api/inverter/id/<n>
+    template: a Tasmota STATUS 8 response on every path
+    '''
+
+    def __init__(self, variant="opendtu", inverters=1, payload=0):
+        if variant not in VARIANTS:
+            raise ValueError(f"variant must be one of {VARIANTS}")
+        self.variant = variant
+        self.inverters = int(inverters)
+        self.padding = "x" * int(payload)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._opendtu_inverter = load_fixture("opendtu_status.json")["inverters"][0]
+        self._opendtu_summary = load_fixture("opendtu_v24.2.12_livedata_status.json")["inverters"][0]
+        self._ahoy_live = load_fixture("ahoy_0.6.9_live.json")
+        self._ahoy_inverter = load_fixture("ahoy_0.5.93_inverter-id-0.json")
+        self._template = load_fixture("tasmota_shelly_2pm.json")
+
+    @staticmethod
+    def get_serial(number):
+        '''Serial of inverter number'''
+        return f"1161{number:08d}"
+
+    def get_response(self, path):
+        '''Return the JSON document for the request path, None if there is none'''
+        url = urlsplit(path)
+        if url.path == "/__stats":
+            return {"requests": self.requests}
+        with self._lock:
+            self.requests += 1
+            sequence = self.requests
+        if self.variant == "template":
+            document = self._get_template(sequence)
+        elif self.variant.startswith("opendtu") and url.path == "/api/livedata/status":
+            serial = parse_qs(url.query).get("inv")
+            document = self._get_opendtu(sequence, serial[0] if serial else None)
+        elif self.variant == "ahoy" and url.path == "/api/live":
+            document = self._get_ahoy_live()
+        elif self.variant == "ahoy" and url.path.startswith("/api/inverter/id/"):
+            document = self._get_ahoy_inverter(sequence, int(url.path.rsplit("/", 1)[1]))
+        else:
+            return None
+        if self.padding:
+            document["padding"] = self.padding
+        return document
+
+    def _get_power(self, sequence, number):
+        return 100 + (sequence + number) % 50
+
+    def _get_opendtu_inverter(self, sequence, number):
+        inverter = copy.deepcopy(self._opendtu_inverter)
+        inverter.update(serial=self.get_serial(number), name=f"HM-{number}", reachable=True, producing=True)
+        inverter["AC"]["0"]["Power"]["v"] = self._get_power(sequence, number)
+        return inverter
+
+    def _get_opendtu(self, sequence, serial):
+        if serial is not None:
+            return {"inverters": [self._get_opendtu_inverter(sequence, int(serial[4:]))]}
+        if self.variant == "opendtu":
+            inverters = [self._get_opendtu_inverter(sequence, number) for number in range(self.inverters)]
+        else:
+            inverters = []
+            for number in range(self.inverters):
+                inverter = copy.deepcopy(self._opendtu_summary)
+                inverter.update(serial=self.get_serial(number), name=f"HM-{number}", reachable=True, producing=True)
+                inverters.append(inverter)
+        return {"inverters": inverters, "total": {"Power": {"v": 0, "u": "W", "d": 1}},
+                "hints": {"time_sync": False, "radio_problem": False, "default_password": False}}
+
+    def _get_ahoy_live(self):
+        document = copy.deepcopy(self._ahoy_live)
+        document["generic"]["esp_type"] = "ESP32"
+        document["iv"] = [True] * self.inverters
+        return document
+
+    def _get_ahoy_inverter(self, sequence, number):
+        document = copy.deepcopy(self._ahoy_inverter)
+        document.update(id=number, name=f"HM-{number}", serial=self.get_serial(number),
+                        ts_last_success=int(time.time()))
+        document["ch"][0][2] = self._get_power(sequence, number)
+        return document
+
+    def _get_template(self, sequence):
+        document = copy.deepcopy(self._template)
+        document["StatusSNS"]["ENERGY"]["Power"] = [self._get_power(sequence, 0), 0]
+        return document
+
+
+class _FakeDtuHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        '''Answer after the configured latency'''
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+        document = self.server.dtu.get_response(self.path)
+        if document is None:
+            self.send_error(404)
+            return
+        body = json.dumps(document).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+def create_server(dtu, latency=0.0, port=0, address="127.0.0.1"):
+    '''Return a ThreadingHTTPServer serving dtu, not started yet'''
+    server = ThreadingHTTPServer((address, port), _FakeDtuHandler)
+    server.daemon_threads = True
+    server.dtu = dtu
+    server.latency = float(latency)
+    return server
+
+
+def main():
+    '''Serve until interrupted'''
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0].strip())
+    parser.add_argument("--variant", choices=VARIANTS, default="opendtu")
+    parser.add_argument("--inverters", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each response")
+    parser.add_argument("--payload", type=int, default=0, help="extra bytes in each response")
+    parser.add_argument("--port", type=int, default=0)
+    args = parser.parse_args()
+
+    server = create_server(FakeDtu(args.variant, args.inverters, args.payload), args.latency, args.port)
+    print(f"port {server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
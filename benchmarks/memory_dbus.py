@@ -0,0 +1,109 @@
+'''
+In-memory stand-ins for dbus, velib's vedbus and GLib, so the benchmarks run the real services
+without a D-Bus daemon. install() must be called before dbus_service or dbus_opendtu is imported.
+'''
+
+# system imports:
+import sys
+import types
+
+
+class MemoryVeDbusService(dict):
+    '''
+    Mimics velib's VeDbusService: the paths are kept in the dict, writes and signals are only counted.
+
+    A write outside of a "with" block sends one PropertiesChanged signal, all writes within one
+    "with" block are sent as one ItemsChanged signal when the block is left.
+    '''
+
+    class Batch:
+        '''Mimics velib's ServiceContext: the writes of one "with" block'''
+
+        def __init__(self, parent):
+            self.parent = parent
+            self.writes = 0
+
+        def __getitem__(self, path):
+            return self.parent[path]
+
+        def __setitem__(self, path, value):
+            dict.__setitem__(self.parent, path, value)
+            self.writes += 1
+
+    def __init__(self, servicename=None, bus=None, register=True):  # pylint: disable=unused-argument
+        super().__init__()
+        self.servicename = servicename
+        self.signals = 0
+        self.writes = 0
+        self._batch = None
+
+    def add_path(self, path, value, **kwargs):  # pylint: disable=unused-argument
+        '''Create the path with its initial value'''
+        dict.__setitem__(self, path, value)
+
+    def register(self):
+        '''Claim the service name (nothing to do in memory)'''
+
+    def __setitem__(self, path, value):
+        super().__setitem__(path, value)
+        self.signals += 1
+        self.writes += 1
+
+    def __enter__(self):
+        self._batch = self.Batch(self)
+        return self._batch
+
+    def __exit__(self, *exc):
+        batch, self._batch = self._batch, None
+        if batch.writes:
+            self.writes += batch.writes
+            self.signals += 1
+        return False
+
+
+class MemoryGLib(types.ModuleType):
+    '''Mimics the parts of GLib used by dbus_opendtu, with a clock the benchmark advances'''
+
+    def __init__(self):
+        super().__init__("GLib")
+        self.now_us = 0
+
+    def get_real_time(self):
+        '''Microseconds of the benchmark clock'''
+        return self.now_us
+
+    def advance(self, seconds):
+        '''Move the benchmark clock forward'''
+        self.now_us += int(seconds * 1e6)
+
+    @staticmethod
+    def timeout_add(interval, callback, *args):  # pylint: disable=unused-argument
+        '''Timers are not run, the benchmark drives the updates'''
+        return 0
+
+    @staticmethod
+    def idle_add(callback, *args):
+        '''Run at once, there is no main loop'''
+        callback(*args)
+        return 0
+
+
+def install():
+    '''Put the stand-ins into sys.modules, return the GLib stand-in'''
+    dbus = types.ModuleType("dbus")
+    dbus.SystemBus = lambda private=False: object()
+    dbus.SessionBus = lambda private=False: object()
+    dbus.Bus = object
+    sys.modules["dbus"] = dbus
+
+    vedbus = types.ModuleType("vedbus")
+    vedbus.VeDbusService = MemoryVeDbusService
+    sys.modules["vedbus"] = vedbus
+
+    glib = MemoryGLib()
+    gi = types.ModuleType("gi")
+    gi.repository = types.ModuleType("gi.repository")
+    gi.repository.GLib = glib
+    sys.modules["gi"] = gi
+    sys.modules["gi.repository"] = gi.repository
+    return glib
@@ -0,0 +1,126 @@
+'''Circuit breaker per host: stop sending requests to a device that is down, probe it with growing pauses'''
+
+# system imports:
+import logging
+import random
+import threading
+import time
+
+import requests
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    '''The request was not sent: the circuit breaker of the host is open'''
+
+
+class CircuitBreaker:
+    '''
+    Circuit breaker for one host, shared by all services requesting it.
+
+    closed: requests are sent. After `failure_threshold` consecutive connection failures it opens.
+    open: requests fail at once with CircuitOpenError, nothing is sent and nobody waits.
+    half-open: after the pause one request is let through as probe. Success closes the breaker,
+    failure opens it again with twice the pause (up to max_reset_timeout), +/- `jitter` of it.
+    '''
+
+    def __init__(self, failure_threshold=3, reset_timeout=180, max_reset_timeout=900, jitter=0.1,
+                 clock=time.monotonic, rng=None):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.max_reset_timeout = max(float(max_reset_timeout), self.reset_timeout)
+        self.jitter = float(jitter)
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self._open_until = 0.0
+        self._probe_in_flight = False
+
+    def before_request(self):
+        '''Raise CircuitOpenError if no request may be sent now, return True if the request is a probe'''
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return False
+            if self.state == STATE_OPEN and self._clock() >= self._open_until:
+                self.state = STATE_HALF_OPEN
+            if self.state == STATE_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            raise CircuitOpenError(f"Circuit breaker open, next attempt in {self._get_remaining():.0f} s")
+
+    def record_success(self):
+        '''The host answered'''
+        with self._lock:
+            if self.state != STATE_CLOSED:
+                logging.info("Circuit breaker closed again after %d pauses", self.trips)
+            self.state = STATE_CLOSED
+            self.failures = 0
+            self.trips = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        '''The host did not answer, return True if this opened the breaker'''
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == STATE_HALF_OPEN or self.failures >= self.failure_threshold:
+                self._trip()
+                return True
+            return False
+
+    def record_not_sent(self):
+        '''The request passed before_request() but was not sent, e.g. because of the rate limit'''
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _trip(self):
+        pause = min(self.reset_timeout * 2 ** self.trips, self.max_reset_timeout)
+        pause *= 1 + self._rng.uniform(-self.jitter, self.jitter)
+        self.trips += 1
+        self.state = STATE_OPEN
+        self._open_until = self._clock() + pause
+        logging.info("Circuit breaker opened after %d failures, next attempt in %.0f s", self.failures, pause)
+
+    def _get_remaining(self):
+        return max(0.0, self._open_until - self._clock())
+
+    def get_state(self):
+        '''Return the state for diagnostics'''
+        with self._lock:
+            state = {"state": self.state, "failures": self.failures, "trips": self.trips, "rejected": self.rejected}
+            if self.state != STATE_CLOSED:
+                state["retry_in"] = round(self._get_remaining(), 1)
+            return state
+
+
+class CircuitBreakers:
+    '''One CircuitBreaker per host name, all created with the same settings'''
+
+    def __init__(self, **settings):
+        self._settings = settings
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, host):
+        '''Return the breaker for host (the host name of an url, without port)'''
+        host = (host or "").lower()
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(**self._settings)
+                self._breakers[host] = breaker
+            return breaker
+
+    def get_states(self):
+        '''Return the state of every breaker, by host'''
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {host: breaker.get_state() for host, breaker in breakers.items()}
@@ -0,0 +1,165 @@
+'''Shared pool of keep-alive HTTP sessions, one per host, port and auth'''
+
+# system imports:
+import logging
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import requests  # for http GET
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPDigestAuth
+
+# our imports:
+import constants
+
+
+class _PooledSession:
+    '''A requests session together with its bookkeeping'''
+
+    def __init__(self, session):
+        self.session = session
+        self.last_used = time.monotonic()
+        self.uses = 0
+
+
+class ConnectionPool:
+    '''
+    Shared pool of keep-alive HTTP sessions keyed by (scheme, host, port, auth).
+
+    All services talking to the same DTU or template host reuse the same session, so the
+    ESP device sees one persistent TCP connection instead of a new one on every poll.
+    The pool is bounded (least recently used sessions are closed first), sessions idle for
+    longer than idle_timeout seconds are closed, and a connection reset by the device is
+    retried once on a fresh session.
+    '''
+
+    def __init__(self,
+                 max_sessions=constants.HTTP_POOL_MAX_SESSIONS,
+                 idle_timeout=constants.HTTP_POOL_IDLE_TIMEOUT,
+                 connections_per_host=constants.HTTP_POOL_CONNECTIONS_PER_HOST):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.connections_per_host = connections_per_host
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._closed_counts = {"connections": 0, "requests": 0}
+        self._counters = {"sessions_opened": 0, "sessions_evicted": 0, "reconnects": 0}
+
+    @staticmethod
+    def get_key(url, username=None, password=None, digestauth=False):
+        '''Return the pool key for an url and its credentials'''
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        if digestauth:
+            auth = ("digest", username, password)
+        elif username and password:
+            auth = ("basic", username, password)
+        else:
+            auth = None
+        return (parts.scheme, parts.hostname, port, auth)
+
+    def get(self, url, timeout, username=None, password=None, digestauth=False):
+        '''HTTP GET on a pooled keep-alive session'''
+        key = self.get_key(url, username, password, digestauth)
+        pooled = self._acquire(key)
+        try:
+            return pooled.session.get(url, timeout=timeout)
+        except requests.exceptions.ConnectionError as error:
+            # A timeout or a fresh connection failing means the host is down: do not retry here.
+            # A reused keep-alive connection may have been reset by the device: reconnect once.
+            if isinstance(error, requests.exceptions.Timeout) or pooled.uses <= 1:
+                raise
+            logging.debug("Connection to %s:%s was reset, reconnecting", key[1], key[2])
+            self._discard(key, pooled)
+            with self._lock:
+                self._counters["reconnects"] += 1
+            pooled = self._acquire(key)
+            return pooled.session.get(url, timeout=timeout)
+
+    def _acquire(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            pooled = self._sessions.get(key)
+            if pooled is None:
+                pooled = _PooledSession(self._create_session(key))
+                self._sessions[key] = pooled
+                self._counters["sessions_opened"] += 1
+                while len(self._sessions) > self.max_sessions:
+                    _oldest_key, oldest = self._sessions.popitem(last=False)
+                    self._close(oldest)
+            self._sessions.move_to_end(key)
+            pooled.last_used = now
+            pooled.uses += 1
+            return pooled
+
+    def _create_session(self, key):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.connections_per_host, pool_block=True)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        auth = key[3]
+        if auth is not None:
+            auth_type, username, password = auth
+            if auth_type == "digest":
+                # keep the digest auth object, so the nonce is reused instead of a 401 round trip per poll
+                session.auth = HTTPDigestAuth(username, password)
+            else:
+                session.auth = (username, password)
+        return session
+
+    def _evict_idle(self, now):
+        for key in [key for key, pooled in self._sessions.items() if now - pooled.last_used > self.idle_timeout]:
+            self._close(self._sessions.pop(key))
+
+    def _discard(self, key, pooled):
+        with self._lock:
+            if self._sessions.get(key) is pooled:
+                del self._sessions[key]
+            self._close(pooled)
+
+    def _close(self, pooled):
+        connections, requests_done = self._connection_counts(pooled.session)
+        self._closed_counts["connections"] += connections
+        self._closed_counts["requests"] += requests_done
+        self._counters["sessions_evicted"] += 1
+        pooled.session.close()
+
+    @staticmethod
+    def _connection_counts(session):
+        '''Return (connections opened, requests done) of all urllib3 pools of the session'''
+        connections = 0
+        requests_done = 0
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for pool_key in pools.keys():
+                pool = pools.get(pool_key)
+                if pool is not None:
+                    connections += pool.num_connections
+                    requests_done += pool.num_requests
+        return connections, requests_done
+
+    def get_stats(self):
+        '''Return counters how often connections were reused versus newly opened'''
+        with self._lock:
+            connections = self._closed_counts["connections"]
+            requests_done = self._closed_counts["requests"]
+            for pooled in self._sessions.values():
+                session_connections, session_requests = self._connection_counts(pooled.session)
+                connections += session_connections
+                requests_done += session_requests
+            stats = dict(self._counters)
+            stats["sessions_active"] = len(self._sessions)
+        stats["requests"] = requests_done
+        stats["connections_opened"] = connections
+        stats["connections_reused"] = max(0, requests_done - connections)
+        return stats
+
+    def close(self):
+        '''Close all sessions'''
+        with self._lock:
+            while self._sessions:
+                _key, pooled = self._sessions.popitem()
+                self._close(pooled)
@@ -5,11 +5,46 @@ from helpers import _kwh, _a, _w, _v
 DTUVARIANT_AHOY = "ahoy"
 DTUVARIANT_OPENDTU = "opendtu"
 DTUVARIANT_TEMPLATE = "template"
+DTUVARIANT_MQTT = "mqtt"  # template receiving its values from an MQTT broker (Source=mqtt)
 PRODUCTNAME = "henne49_dbus-opendtu"
 CONNECTION = "TCP/IP (HTTP)"
 MODE_TIMEOUT = "timeout"
 MODE_RETRYCOUNT = "retrycount"
 
+# path of an unset CUST_* value of a template, resolves to 0
+UNDEFINED_PATH = "[undefined]"
+
+# Shared HTTP keep-alive sessions (see connection_pool.py)
+HTTP_POOL_MAX_SESSIONS = 16
+HTTP_POOL_IDLE_TIMEOUT = 60  # seconds
+HTTP_POOL_CONNECTIONS_PER_HOST = 2
+
+# Per host rate limits (see rate_limiter.py): <requests per second>/<burst>/<max requests in flight>
+RATE_LIMIT_ESP8266 = "1/2/1"  # ESP8266 based DTUs reboot under bursty load
+RATE_LIMIT_MAX_WAIT = 10  # seconds a request may wait for its turn before it fails
+
+# Number of parallel per-inverter requests to OpenDTU v24.2.12 and newer
+OPENDTU_PARALLEL_REQUESTS = 4
+
+# Fields of the OpenDTU /livedata/status documents read by the services (see json_decoder.py)
+OPENDTU_LIVEDATA_FIELDS = (
+    ["inverters", "*", "serial"],
+    ["inverters", "*", "name"],
+    ["inverters", "*", "producing"],
+    ["inverters", "*", "reachable"],
+    ["inverters", "*", "AC", "*", "Power"],
+    ["inverters", "*", "AC", "*", "Voltage"],
+    ["inverters", "*", "AC", "*", "Current"],
+    ["inverters", "*", "AC", "*", "YieldDay"],
+    ["inverters", "*", "AC", "*", "YieldTotal"],
+    ["inverters", "*", "DC", "*", "Voltage"],
+    ["inverters", "*", "INV", "*", "YieldDay"],
+    ["inverters", "*", "INV", "*", "YieldTotal"],
+)
+
+# Fields of the Ahoy /api/inverter/id/<n> documents read by the services, the others are not kept
+AHOY_INVERTER_FIELDS = ("id", "name", "serial", "ts_last_success", "ch")
+
 # Status codes for the DTU
 STATUSCODE_STARTUP = 0
 STATUSCODE_RUNNING = 7
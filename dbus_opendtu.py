@@ -32,6 +32,53 @@ def getConfig():
     return config
 
 
+def get_dtu_services(config, dtu_number, number_of_inverters):
+    """
+    Registers the inverters of one DTU.
+
+    Args:
+        config (dict): Configuration dictionary containing the necessary settings.
+        dtu_number (int): 0 for the DTU configured in DEFAULT, else the number of its DTU<n> section.
+        number_of_inverters (int): Inverters to register, 0 = as many as the DTU reports.
+
+    Returns:
+        list: The DbusService instances of the inverters, empty if the DTU has none.
+    """
+    _, inverter_section = get_dtu_sections(dtu_number)
+    servicename = get_config_value(config, "Servicename", inverter_section, 0, "com.victronenergy.pvinverter")
+    service = DbusService(
+        servicename=servicename,
+        actual_inverter=0,
+        dtu_number=dtu_number,
+    )
+    services = [service]
+
+    if number_of_inverters == 0:
+        # pylint: disable=W0621
+        number_of_inverters = service.get_number_of_inverters()
+        if number_of_inverters == 0:
+            # inverter 0 has registered on D-Bus already
+            service.unregister()
+            return []
+
+    if number_of_inverters > 1:
+        # start our main-service if there are more than 1 inverter
+        for actual_inverter in range(number_of_inverters - 1):
+            servicename = get_config_value(
+                config,
+                "Servicename",
+                inverter_section,
+                actual_inverter + 1,
+                "com.victronenergy.pvinverter"
+            )
+            services.append(DbusService(
+                servicename=servicename,
+                actual_inverter=actual_inverter + 1,
+                dtu_number=dtu_number,
+            ))
+    return services
+
+
 def get_DbusServices(config):
     """
     Retrieves and registers D-Bus services based on the provided configuration.
@@ -65,41 +112,58 @@ def get_DbusServices(config):
     except KeyError:
         logging.critical("DTU key not found in configuration")
         return
+
+    # Names, serials etc. discovered from the DTU can be cached, so the services register without HTTP requests
+    discovery_cache_file = get_default_config(config, "DiscoveryCacheFile", "")
+    if discovery_cache_file:
+        if not os.path.isabs(discovery_cache_file):
+            discovery_cache_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), discovery_cache_file)
+        DbusService.set_discovery_cache(DiscoveryCache(discovery_cache_file))
+    else:
+        DbusService.set_discovery_cache(None)
+
+    # JSON decoding of all responses, must be set before the services register the fields they read
+    DbusService.set_json_decoder(JsonDecoder(
+        backend=get_default_config(config, "JsonBackend", "auto"),
+        selective=is_true(get_default_config(config, "SelectiveJson", 0)),
+    ))
+
+    # Rate limit and cap on requests in flight per host, shared by all services requesting the same device
+    DbusService.set_rate_limiters(RateLimiters(
+        default=parse_rate_limit(get_default_config(config, "RateLimit", "")),
+        esp_limits={
+            "ESP8266": parse_rate_limit(get_default_config(config, "ESP8266RateLimit", constants.RATE_LIMIT_ESP8266)),
+            "ESP32": parse_rate_limit(get_default_config(config, "ESP32RateLimit", "")),
+        },
+        host_limits=parse_host_rate_limits(get_default_config(config, "HostRateLimits", "")),
+    ))
+
+    # Circuit breaker per host: after MinRetriesUntilFail connection failures the host is only probed
+    # every RetryAfterSeconds, doubled after each failed probe up to MaxRetryAfterSeconds
+    retry_after_seconds = int(get_default_config(config, "RetryAfterSeconds", 180))
+    DbusService.set_circuit_breakers(CircuitBreakers(
+        failure_threshold=int(get_default_config(config, "MinRetriesUntilFail", 3)),
+        reset_timeout=retry_after_seconds,
+        max_reset_timeout=int(get_default_config(config, "MaxRetryAfterSeconds", max(900, retry_after_seconds))),
+    ))
     # endregion
 
     # region Register the inverters
+    # the first DTU is configured in DEFAULT, further DTUs in the sections DTU1, DTU2, ...
     if dtuvariant != constants.DTUVARIANT_TEMPLATE:
         logging.info("Registering dtu devices")
-        servicename = get_config_value(config, "Servicename", "INVERTER", 0, "com.victronenergy.pvinverter")
-        service = DbusService(
-            servicename=servicename,
-            actual_inverter=0,
-        )
-        services.append(service)
-
-        if number_of_inverters == 0:
-            # pylint: disable=W0621
-            number_of_inverters = service.get_number_of_inverters()
-
-        # If there are no inverters or templates, return an empty list
-        if number_of_inverters == 0 and number_of_templates == 0:
-            logging.critical("No inverters or templates to query")
-            return []  # Empty list
-
-        if number_of_inverters > 1:
-            # start our main-service if there are more than 1 inverter
-            for actual_inverter in range(number_of_inverters - 1):
-                servicename = get_config_value(
-                    config,
-                    "Servicename",
-                    "INVERTER",
-                    actual_inverter + 1,
-                    "com.victronenergy.pvinverter"
-                )
-                services.append(DbusService(
-                    servicename=servicename,
-                    actual_inverter=actual_inverter + 1,
-                ))
+        services.extend(get_dtu_services(config, 0, number_of_inverters))
+
+    for dtu_number in range(1, int(get_default_config(config, "NumberOfDTUs", 1))):
+        logging.info("Registering the devices of DTU%d", dtu_number)
+        services.extend(get_dtu_services(
+            config, dtu_number,
+            int(get_own_config_value(config, f"DTU{dtu_number}", "NumberOfInvertersToQuery", 0))))
+
+    # If there are no inverters or templates, return an empty list
+    if not services and number_of_templates == 0:
+        logging.critical("No inverters or templates to query")
+        return []  # Empty list
     # endregion
 
     # region Register the templates
@@ -122,6 +186,35 @@ def get_DbusServices(config):
     return services
 
 
+def start_mqtt_source(config, services, dispatch=None):
+    """
+    Connects the templates with Source=mqtt to the MQTT broker configured in the DEFAULT section.
+
+    Args:
+        config (dict): Configuration dictionary containing the broker settings.
+        services (list): All registered services, only the MQTT templates are subscribed.
+        dispatch (callable): Hands the messages to the main loop, e.g. gobject.idle_add.
+
+    Returns:
+        MqttSource: The started MQTT source, or None if no template uses MQTT.
+    """
+    mqtt_services = [service for service in services if service.dtuvariant == constants.DTUVARIANT_MQTT]
+    if not mqtt_services:
+        return None
+    mqtt_source = MqttSource(
+        host=get_default_config(config, "MqttHost", "localhost"),
+        port=int(get_default_config(config, "MqttPort", 1883)),
+        username=get_default_config(config, "MqttUsername", None),
+        password=get_default_config(config, "MqttPassword", None),
+        dispatch=dispatch,
+        decode=DbusService._json_decoder.decode,  # pylint: disable=protected-access
+    )
+    for service in mqtt_services:
+        service.subscribe_mqtt(mqtt_source, dispatch=dispatch)
+    mqtt_source.start()
+    return mqtt_source
+
+
 def sign_of_life_all_services(services):
     """
     Sends a 'sign of life' signal to all services in the provided list.
@@ -139,7 +232,8 @@ def sign_of_life_all_services(services):
 
 def update_all_services(services):
     """
-    Updates all services in the provided list.
+    Updates all services in the provided list whose polling interval elapsed.
+    main() uses the PollScheduler instead, this is kept for callers polling on a fixed tick.
 
     Args:
         services (list): A list of service objects. 
@@ -164,8 +258,13 @@ def main():
     """ Main function """
     config = getConfig()
     signofliveinterval = int(get_config_value(config, "SignOfLifeLog", "DEFAULT", "", 1))
+    fetch_threads = int(get_config_value(config, "FetchThreads", "DEFAULT", "", 4))
+    polling_jitter = float(get_config_value(config, "PollingJitter", "DEFAULT", "", 5))
+    metrics_port = int(get_config_value(config, "MetricsPort", "DEFAULT", "", 0))
+    metrics_address = get_config_value(config, "MetricsAddress", "DEFAULT", "", "127.0.0.1")
 
     logging.debug("SignOfLifeLog: %d", signofliveinterval)
+    logging.debug("FetchThreads: %d", fetch_threads)
 
     # TODO: I think it is better to run the tests inside CI/CD pipeline instead of running it here
     # tests.run_tests()
@@ -181,11 +280,31 @@ def main():
         services = get_DbusServices(config)
         logging.info("Registered %d services", len(services))
 
+        # Run the HTTP fetches in background threads, results are handed back to the mainloop
+        fetch_engine = FetchEngine(max_workers=fetch_threads, dispatch=gobject.idle_add)
+        for service in services:
+            service.fetch_engine = fetch_engine
+
+        # Templates with Source=mqtt get their values from the MQTT broker
+        start_mqtt_source(config, services, dispatch=gobject.idle_add)
+
+        # OpenDTU pushes its live data over a WebSocket, polling is only the fallback (OpenDTUPush per DTU)
+        for service in services:
+            if (service.dtuvariant == constants.DTUVARIANT_OPENDTU and service.pvinverternumber == 0
+                    and service.opendtu_push):
+                service.start_opendtu_push(services, dispatch=gobject.idle_add)
+
+        # Latencies and error counters for Prometheus, off unless MetricsPort is set
+        if metrics_port > 0:
+            MetricsServer(metrics_port, metrics_address).start()
+
         # Use a single timeout to call sign_of_life for all services
         gobject.timeout_add(signofliveinterval * 60 * 1000, sign_of_life_all_services, services)
 
-        # Use another timeout to update all services
-        gobject.timeout_add(1000, update_all_services, services)
+        # Update each service when its polling interval is due, one timer armed for the next deadline
+        scheduler = PollScheduler(services, timeout_add=gobject.timeout_add, jitter=polling_jitter / 100,
+                                  get_interval=DbusService.get_current_polling_interval)
+        scheduler.start()
 
         logging.info("Connected to dbus, and switching over to gobject.MainLoop() (= event based)")
         mainloop = gobject.MainLoop()
@@ -0,0 +1,85 @@
+'''Change detection and deadband filtering for the values written to D-Bus'''
+
+# system imports:
+import fnmatch
+import logging
+
+
+def parse_deadbands(text):
+    '''
+    Parse a deadband configuration like "/Ac/Power:1, /Ac/*/Voltage:0.1, /Ac/*/Current:2%".
+
+    Returns a list of (path pattern, absolute deadband, relative deadband). A value ending with "%"
+    is relative to the last published value, otherwise it is absolute in the unit of the path.
+    '''
+    deadbands = []
+    for entry in (text or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            pattern, value = entry.rsplit(":", 1)
+            value = value.strip()
+            if value.endswith("%"):
+                deadbands.append((pattern.strip(), 0.0, float(value[:-1]) / 100))
+            else:
+                deadbands.append((pattern.strip(), float(value), 0.0))
+        except ValueError:
+            logging.warning("Ignoring invalid deadband entry '%s' (expected <path>:<value>[%%])", entry)
+    return deadbands
+
+
+class PublishFilter:
+    '''
+    Keeps the last value published for each D-Bus path and skips writes that would not change it.
+
+    A write is skipped when the value is unchanged or within the deadband configured for the path.
+    Changes to and from exactly 0 are always published. Every path is re-published at least every
+    refresh_interval seconds, so consumers never see stale data for too long.
+    '''
+
+    def __init__(self, deadbands=None, refresh_interval=60):
+        self.deadbands = deadbands or []
+        self.refresh_interval = refresh_interval
+        self.suppressed_count = 0
+        self._published = {}
+        self._deadband_by_path = {}
+
+    def filter(self, values, now):
+        '''Return the subset of values (dict path -> value) that has to be written and remember it'''
+        changed = {}
+        for path, value in values.items():
+            last = self._published.get(path)
+            if (last is not None and now - last[1] < self.refresh_interval and
+                    self._is_within_deadband(path, last[0], value)):
+                self.suppressed_count += 1
+                continue
+            self._published[path] = (value, now)
+            changed[path] = value
+        return changed
+
+    def forget(self):
+        '''Forget all published values, so the next values are written in any case'''
+        self._published.clear()
+
+    def _get_deadband(self, path):
+        deadband = self._deadband_by_path.get(path)
+        if deadband is None:
+            deadband = (0.0, 0.0)
+            for pattern, absolute, relative in self.deadbands:
+                if fnmatch.fnmatchcase(path, pattern):
+                    deadband = (absolute, relative)
+                    break
+            self._deadband_by_path[path] = deadband
+        return deadband
+
+    def _is_within_deadband(self, path, last_value, value):
+        if last_value == value:
+            return True
+        if not isinstance(value, (int, float)) or not isinstance(last_value, (int, float)):
+            return False
+        if isinstance(value, bool) or isinstance(last_value, bool) or value == 0 or last_value == 0:
+            return False
+        absolute, relative = self._get_deadband(path)
+        difference = abs(value - last_value)
+        return difference < absolute or difference < relative * abs(last_value)
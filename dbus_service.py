@@ -12,11 +12,26 @@ import platform
 import sys
 import logging
 import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
 import requests  # for http GET
-from requests.auth import HTTPDigestAuth
 
 # our imports:
 import constants
+import metrics
+from adaptive_polling import AdaptivePolling
+from circuit_breaker import CircuitBreakers
+from connection_pool import ConnectionPool
+from dbus_publisher import PublishFilter, parse_deadbands
+from dtu_poller import DtuPoller, DtuSnapshot
+from fleet_table import FleetTable
+from fetch_engine import run_concurrently
+from json_decoder import JsonDecoder
+from mqtt_source import parse_topic_spec
+from opendtu_push import OpenDtuPush, merge_livedata
+from rate_limiter import RateLimiters
+from reading import Reading
+from request_coalescer import RequestCoalescer
 from helpers import *
 
 # victron imports:
@@ -52,15 +67,27 @@ class DbusService:
     '''Main class to register PV Inverter in DBUS'''
     __metaclass__ = DbusServiceRegistry
     _registry = []
-    _meter_data = None
+    _connection_pool = ConnectionPool()
+    _request_coalescer = RequestCoalescer()
+    _rate_limiters = RateLimiters()  # set by get_DbusServices()
+    _circuit_breakers = CircuitBreakers()  # set by get_DbusServices()
+    _json_decoder = JsonDecoder()  # set by get_DbusServices()
+    _pollers = {}  # DtuPoller of each DTU, by discovery key
+    _discovery_cache = None  # DiscoveryCache, set by get_DbusServices()
+    _opendtu_pushes = {}  # OpenDtuPush of each DTU, by discovery key, set by start_opendtu_push()
+    _discovered = None
+    _poller = None
+    _published_generation = None
     _test_meter_data = None
     _servicename = None
+    _metric_labels = None  # labels of the metrics by host, built on first use
 
     def __init__(
         self,
         servicename,
         actual_inverter,
         istemplate=False,
+        dtu_number=0,
     ):
 
         if servicename == "testing":
@@ -76,9 +103,16 @@ class DbusService:
 
         # Initiale own properties
         self.esptype = None
-        self.meter_data = None
+        self.reading = None  # template and MQTT: the last values, the responses are not kept
         self.dtuvariant = None
 
+        # MQTT: (topic, accessor) per value, time of the last message (None = none yet) and the
+        # dispatch of the publishing, which runs once per burst of messages
+        self._mqtt_values = []
+        self._mqtt_last_message = None
+        self._mqtt_dispatch = None
+        self._mqtt_publish_pending = False
+
         # Initialize error handling properties
         self.error_mode = None
         self.retry_after_seconds = 0
@@ -87,22 +121,35 @@ class DbusService:
         self.failed_update_count = 0
         self.reset_statuscode_on_next_success = False
 
+        # Background fetching (set by main(), None = fetch synchronously)
+        self.fetch_engine = None
+        self._fetch_pending = False
+
+        # metadata from the discovery cache, until the first live data has revalidated it
+        self._discovered = None
+
+        # D-Bus writes of the running update cycle, sent as one ItemsChanged signal (None = no cycle running)
+        self._dbus_batch = None
+        # for the metrics: start of the running update (None = none running), D-Bus time of the running cycle
+        self._cycle_started = None
+        self._publish_seconds = None
+
         if not istemplate:
-            self._read_config_dtu(actual_inverter)
+            self._read_config_dtu(actual_inverter, dtu_number)
+            self._poller = self._get_poller()
+            self._discovered = self._get_cached_discovery()
+            if self._discovered is None and self._poller.snapshot is None:
+                # the inverters are discovered from the first response, before the main loop runs:
+                # afterwards the data is only fetched by update(), never by reading it
+                self._poller.poll(self.pvinverternumber)
             self.numberofinverters = self.get_number_of_inverters()
         else:
             self._read_config_template(actual_inverter)
 
         logging.info("%s /DeviceInstance = %d", servicename, self.deviceinstance)
 
-        # Allow for multiple Instance per process in DBUS
-        dbus_conn = (
-            dbus.SessionBus()
-            if "DBUS_SESSION_BUS_ADDRESS" in os.environ
-            else dbus.SystemBus(private=True)
-        )
-
-        self._dbusservice = VeDbusService(f"{servicename}.http_{self.deviceinstance}", bus=dbus_conn, register=False)
+        self._dbusservice = VeDbusService(f"{servicename}.http_{self.deviceinstance}",
+                                          bus=self._open_dbus_connection(), register=False)
         self._paths = constants.VICTRON_PATHS
 
         # Create the management objects, as specified in the ccgx dbus-api document
@@ -157,6 +204,16 @@ class DbusService:
         self.polling_interval = self._get_polling_interval()
         self.last_polling = 0
 
+        if self._discovered is None:
+            self._record_discovery()
+
+    def unregister(self):
+        '''Remove the service from D-Bus again, e.g. if its DTU turned out to have no inverters'''
+        # velib releases the bus name and all object paths only on an explicit __del__()
+        self._dbusservice.__del__()
+        if self in DbusService._registry:
+            DbusService._registry.remove(self)
+
     @staticmethod
     def get_ac_inverter_state(current):
         '''return the state of the inverter based on the current value'''
@@ -184,48 +241,67 @@ class DbusService:
     @staticmethod
     def get_processed_meter_value(meter_data: dict, path_to_value, default_value: any, factor: int = 1) -> any:
         '''return the processed meter value by applying the factor and return a default value due an Exception'''
-        raw_value = get_value_by_path(meter_data, path_to_value)
-        raw_value = convert_to_expected_type(raw_value, float, default_value)
-        if isinstance(raw_value, (float, int)):
-            value = float(raw_value * float(factor))
-        else:
-            value = default_value
-
-        return value
+        return get_path_accessor(path_to_value, default_value, factor).get(meter_data)
 
     # read config file
-    def _read_config_dtu(self, actual_inverter):
+    def _read_config_dtu(self, actual_inverter, dtu_number=0):
         config = self._get_config()
         self.pvinverternumber = actual_inverter
-        self.dtuvariant = str(config["DEFAULT"]["DTU"])
+        self.dtunumber = dtu_number
+        # the first DTU is configured in DEFAULT and INVERTERn, the others in DTUm and DTUm.INVERTERn
+        dtu_section, inverter_section = get_dtu_sections(dtu_number)
+        self.dtuvariant = str(config[dtu_section]["DTU"])
         if self.dtuvariant not in (constants.DTUVARIANT_OPENDTU, constants.DTUVARIANT_AHOY):
             raise ValueError(f"Error in config.ini: DTU must be one of \
                 {constants.DTUVARIANT_OPENDTU}, \
                 {constants.DTUVARIANT_AHOY}")
-        self.deviceinstance = int(config[f"INVERTER{self.pvinverternumber}"]["DeviceInstance"])
-        self.acposition = int(get_config_value(config, "AcPosition", "INVERTER", self.pvinverternumber))
-        self.useyieldday = int(get_config_value(config, "useYieldDay", "DEFAULT", "", 0))
-        self.pvinverterphase = str(config[f"INVERTER{self.pvinverternumber}"]["Phase"])
-        self.host = get_config_value(config, "Host", "INVERTER", self.pvinverternumber)
-        self.username = get_config_value(config, "Username", "DEFAULT", "", self.pvinverternumber)
-        self.password = get_config_value(config, "Password", "DEFAULT", "", self.pvinverternumber)
-        self.digestauth = is_true(get_config_value(config, "DigestAuth", "INVERTER", self.pvinverternumber, False))
+        self.deviceinstance = int(config[f"{inverter_section}{self.pvinverternumber}"]["DeviceInstance"])
+        self.acposition = int(get_config_value(config, "AcPosition", inverter_section, self.pvinverternumber))
+        self.useyieldday = int(get_config_value(config, "useYieldDay", dtu_section, "", 0))
+        self.pvinverterphase = str(config[f"{inverter_section}{self.pvinverternumber}"]["Phase"])
+        if dtu_number == 0:
+            self.host = get_config_value(config, "Host", "INVERTER", self.pvinverternumber)
+            self.digestauth = is_true(get_config_value(config, "DigestAuth", "INVERTER", self.pvinverternumber, False))
+            self.username = get_config_value(config, "Username", dtu_section, "", self.pvinverternumber)
+            self.password = get_config_value(config, "Password", dtu_section, "", self.pvinverternumber)
+        else:
+            # host and credentials of DEFAULT belong to the first DTU, the DTUm sections must not inherit them
+            self.host = get_own_config_value(config, dtu_section, "Host")
+            if not self.host:
+                raise ValueError(f"config entry 'Host' not found in section [{dtu_section}]")
+            self.digestauth = is_true(get_own_config_value(config, dtu_section, "DigestAuth", False))
+            self.username = get_own_config_value(config, dtu_section, "Username")
+            self.password = get_own_config_value(config, dtu_section, "Password")
 
         try:
-            self.max_age_ts = int(config["DEFAULT"]["MaxAgeTsLastSuccess"])
+            self.max_age_ts = int(config[dtu_section]["MaxAgeTsLastSuccess"])
         except (KeyError, ValueError) as ex:
             logging.warning("MaxAgeTsLastSuccess: %s", ex)
             logging.warning("MaxAgeTsLastSuccess not set, using default")
             self.max_age_ts = 600
 
         self.dry_run = is_true(get_default_config(config, "DryRun", False))
-        self.pollinginterval = int(get_config_value(config, "ESP8266PollingIntervall", "DEFAULT", "", 10000))
-        self.meter_data = 0
+        self.pollinginterval = int(get_config_value(config, "ESP8266PollingIntervall", dtu_section, "", 10000))
+        self.ahoy_parallel_requests = int(get_config_value(config, "AhoyParallelRequests", dtu_section, "", 0))
+        # the pushed updates are merged into the last response, so the poller has to keep it
+        self.opendtu_push = is_true(get_config_value(config, "OpenDTUPush", dtu_section, "",
+                                                     get_default_config(config, "OpenDTUPush", 0)))
         self.httptimeout = get_default_config(config, "HTTPTimeout", 2.5)
+        # the inverters of a DTU share one fetch of its DtuPoller, only requests in flight are coalesced,
+        # so the response is not kept after the fetch
+        self.coalescing_ttl = 0
         self._load_error_handling_config(config)
+        self._load_publish_config(config)
+        self._load_polling_config(config, inverter_section, self.pvinverternumber)
+
+        if self.dtuvariant == constants.DTUVARIANT_OPENDTU:
+            DbusService._json_decoder.add_fields(self._get_status_url(), constants.OPENDTU_LIVEDATA_FIELDS)
 
     def _read_config_template(self, template_number):
         config = self._get_config()
+        if get_config_value(config, "Source", "TEMPLATE", template_number, "http") == constants.DTUVARIANT_MQTT:
+            self._read_config_mqtt(config, template_number)
+            return
         self.pvinverternumber = template_number
         self.custpower = config[f"TEMPLATE{template_number}"]["CUST_Power"].split("/")
         self.custpower_factor = config[f"TEMPLATE{template_number}"]["CUST_Power_Mult"]
@@ -248,12 +324,13 @@ class DbusService:
         self.useyieldday = int(get_config_value(config, "useYieldDay", "DEFAULT", "", 0))
         self.pvinverterphase = str(config[f"TEMPLATE{template_number}"]["Phase"])
         self.digestauth = is_true(get_config_value(config, "DigestAuth", "TEMPLATE", template_number, False))
+        self.esptype = get_config_value(config, "ESPType", "TEMPLATE", template_number, None)
 
         try:
             self.custcurrent = config[f"TEMPLATE{template_number}"]["CUST_Current"].split("/")
         except Exception:
             # set to undefined because get_nested will solve this to 0
-            self.custcurrent = "[undefined]"
+            self.custcurrent = constants.UNDEFINED_PATH
             logging.debug("CUST_Current not set")
         self.custcurrent_default = get_config_value(config,  "CUST_Current_Default", "TEMPLATE", template_number, None)
 
@@ -261,11 +338,23 @@ class DbusService:
             self.custdcvoltage = config[f"TEMPLATE{template_number}"]["CUST_DCVoltage"].split("/")
         except Exception:
             # set to undefined because get_nested will solve this to 0
-            self.custdcvoltage = "[undefined]"
+            self.custdcvoltage = constants.UNDEFINED_PATH
             logging.debug("CUST_DCVoltage not set")
         self.custdcvoltage_default = get_config_value(
             config,  "CUST_DCVoltage_Default", "TEMPLATE", template_number, None)
 
+        # compile the paths once, get_values_for_inverter() then reads all values in one go
+        self._template_accessors = (
+            PathAccessor(self.custpower, self.custpower_default, self.custpower_factor),
+            PathAccessor(self.custtotal, self.custtotal_default, self.custtotal_factor),
+            PathAccessor(self.custcurrent, self.custcurrent_default),
+            PathAccessor(self.custvoltage, self.custvoltage_default),
+        )
+        DbusService._json_decoder.add_fields(
+            self.get_template_base_url(),
+            [list(path) for path in (self.custpower, self.custtotal, self.custcurrent, self.custvoltage)
+             if path != constants.UNDEFINED_PATH])
+
         try:
             self.max_age_ts = int(config["DEFAULT"]["MaxAgeTsLastSuccess"])
         except (KeyError, ValueError) as ex:
@@ -274,9 +363,47 @@ class DbusService:
             self.max_age_ts = 600
 
         self.dry_run = is_true(get_default_config(config, "DryRun", False))
-        self.meter_data = 0
         self.httptimeout = get_default_config(config, "HTTPTimeout", 2.5)
+        self.coalescing_ttl = float(get_default_config(config, "RequestCoalescingTTL", 0.5))
+        self._load_error_handling_config(config)
+        self._load_publish_config(config)
+        self._load_polling_config(config, "TEMPLATE", template_number)
+
+    def _read_config_mqtt(self, config, template_number):
+        '''Read a template with Source=mqtt: CUST_* are "<topic>[#<path in JSON payload>]"'''
+        section = config[f"TEMPLATE{template_number}"]
+        self.pvinverternumber = template_number
+        self.dtuvariant = constants.DTUVARIANT_MQTT
+        self.serial = str(section["CUST_SN"])
+        self.pollinginterval = int(get_config_value(config, "CUST_POLLING", "TEMPLATE", template_number, 5000))
+        self.host = get_config_value(config, "MqttHost", "DEFAULT", "", "localhost")
+        self.username = None
+        self.password = None
+        self.digestauth = False
+        self.deviceinstance = int(section["DeviceInstance"])
+        self.customname = section["Name"]
+        self.acposition = int(section["AcPosition"])
+        self.useyieldday = int(get_config_value(config, "useYieldDay", "DEFAULT", "", 0))
+        self.pvinverterphase = str(section["Phase"])
+
+        # (topic, accessor) for power, yield, current and voltage
+        for name, has_factor in (("Power", True), ("Total", True), ("Current", False), ("Voltage", False)):
+            spec = get_config_value(config, f"CUST_{name}", "TEMPLATE", template_number, "")
+            topic, path = parse_topic_spec(spec)
+            # power and yield are 0 until the first message on their topic arrived
+            default = get_config_value(config, f"CUST_{name}_Default", "TEMPLATE", template_number,
+                                       0 if has_factor else None)
+            factor = section[f"CUST_{name}_Mult"] if has_factor else 1
+            self._mqtt_values.append((topic, PathAccessor(path, default, factor)))
+
+        self.max_age_ts = int(get_config_value(config, "MaxAgeTsLastSuccess", "DEFAULT", "", 600))
+        self.dry_run = is_true(get_default_config(config, "DryRun", False))
+        self.reading = Reading(*[accessor.default for _topic, accessor in self._mqtt_values])
+        self.httptimeout = get_default_config(config, "HTTPTimeout", 2.5)
+        self.coalescing_ttl = 0
         self._load_error_handling_config(config)
+        self._load_publish_config(config)
+        self._load_polling_config(config, "TEMPLATE", template_number)
 
     def _load_error_handling_config(self, config):
         '''Loads error handling configuration values from the provided config object.'''
@@ -286,12 +413,40 @@ class DbusService:
         self.min_retries_until_fail = int(get_default_config(config, "MinRetriesUntilFail", 3))
         self.error_state_after_seconds = int(get_default_config(config, "ErrorStateAfterSeconds", 0))
 
+    def _load_publish_config(self, config):
+        '''Loads the change detection / deadband configuration for the D-Bus writes.'''
+        self._publish_filter = PublishFilter(
+            deadbands=parse_deadbands(get_default_config(config, "PublishDeadband", "")),
+            refresh_interval=int(get_default_config(config, "PublishRefreshSeconds", 60)),
+        )
+
+    def _load_polling_config(self, config, inverter_or_template, number):
+        '''Loads the adaptive polling configuration, the inverter/template section overrides DEFAULT.'''
+
+        def get_value(name, defaultvalue):
+            return get_config_value(config, name, inverter_or_template, number,
+                                    get_default_config(config, name, defaultvalue))
+
+        latitude = str(get_value("Latitude", "")).strip()
+        longitude = str(get_value("Longitude", "")).strip()
+        self.polling_policy = AdaptivePolling(
+            idle_interval=float(get_value("IdlePollingInterval", 0)),
+            idle_after=float(get_value("IdleAfterSeconds", 600)),
+            latitude=float(latitude) if latitude else None,
+            longitude=float(longitude) if longitude else None,
+        )
+
     # get the Serialnumber
     def _get_serial(self, pvinverternumber):
 
         meter_data = None
         serial = None
-        if self.dtuvariant in (constants.DTUVARIANT_AHOY, constants.DTUVARIANT_OPENDTU):
+        table = None if self._is_discovery_cache_used() else self._get_complete_fleet_table()
+        if self._is_discovery_cache_used() and pvinverternumber == self.pvinverternumber:
+            serial = self._discovered["serial"]
+        elif table is not None:
+            serial = table.serial[pvinverternumber]
+        elif self.dtuvariant in (constants.DTUVARIANT_AHOY, constants.DTUVARIANT_OPENDTU):
             meter_data = self._get_data()
 
             if self.dtuvariant == constants.DTUVARIANT_AHOY:
@@ -304,14 +459,17 @@ class DbusService:
                     raise ValueError("Response does not contain serial attribute try name")
                 serial = meter_data["inverters"][pvinverternumber]["serial"]
 
-        elif self.dtuvariant == constants.DTUVARIANT_TEMPLATE:
+        elif self.dtuvariant in (constants.DTUVARIANT_TEMPLATE, constants.DTUVARIANT_MQTT):
             serial = self.serial
 
         return serial
 
     def _get_name(self):
-        if self.dtuvariant in (constants.DTUVARIANT_OPENDTU, constants.DTUVARIANT_AHOY):
-            meter_data = self._get_data()
+        if self._is_discovery_cache_used():
+            return self._discovered["name"]
+        table = self._get_complete_fleet_table()
+        if table is not None:
+            return table.name[self.pvinverternumber]
         meter_data = None
         if self.dtuvariant in (constants.DTUVARIANT_OPENDTU, constants.DTUVARIANT_AHOY):
             meter_data = self._get_data()
@@ -325,25 +483,115 @@ class DbusService:
 
     def get_number_of_inverters(self):
         '''return number of inverters in JSON response'''
-        meter_data = self._get_data()
-        if self.dtuvariant == constants.DTUVARIANT_AHOY:
+        if self._is_discovery_cache_used():
+            return self._discovered["number_of_inverters"]
+        table = self._get_complete_fleet_table()
+        meter_data = self._get_data() if table is None else None
+        if table is not None:
+            numberofinverters = len(table)
+        elif self.dtuvariant == constants.DTUVARIANT_AHOY:
             numberofinverters = len(meter_data["inverter"])
         else:  # Assuming the only other option is constants.DTUVARIANT_OPENDTU
             numberofinverters = len(meter_data["inverters"])
         logging.info("Number of Inverters found: %s", numberofinverters)
         return numberofinverters
 
+    def _get_discovery_key(self):
+        return f"{self.dtuvariant}|{self.host}"
+
+    def _get_poller(self):
+        '''Return the poller shared by the inverters of this DTU, inverter 0 starts a new one'''
+        key = self._get_discovery_key()
+        if self.pvinverternumber == 0 or key not in DbusService._pollers:
+            build_table = (FleetTable.from_opendtu if self.dtuvariant == constants.DTUVARIANT_OPENDTU
+                           else FleetTable.from_ahoy)
+            DbusService._pollers[key] = DtuPoller(
+                self._fetch_dtu_data, build_table,
+                keep_meter_data=self.dtuvariant == constants.DTUVARIANT_OPENDTU and self.opendtu_push)
+        return DbusService._pollers[key]
+
+    def _get_cached_discovery(self):
+        '''return the cached metadata of this inverter, if its DTU was discovered before, else None'''
+        cache = DbusService._discovery_cache
+        if cache is None:
+            return None
+        dtu = cache.get_dtu(self._get_discovery_key())
+        inverter = cache.get_inverter(self._get_discovery_key(), self.pvinverternumber)
+        if not dtu or not inverter:
+            return None
+        discovered = dict(dtu)
+        discovered.update(inverter)
+        if not all(key in discovered for key in ("number_of_inverters", "esp_type", "name", "serial")):
+            return None
+        if self._poller.details_in_livedata is None:
+            # only a hint until the first response, enrich_opendtu_data() checks every response
+            self._poller.details_in_livedata = discovered.get("details_in_livedata")
+        logging.info("Inverter #%d: using cached discovery data, revalidating with the first live data",
+                     self.pvinverternumber)
+        return discovered
+
+    def _is_discovery_cache_used(self):
+        '''True as long as there is cached discovery data but no live data yet'''
+        return self._discovered is not None and self._poller.snapshot is None and not self._test_meter_data
+
+    def _record_discovery(self):
+        '''Store the metadata of this inverter (and for inverter 0 of its DTU) in the discovery cache'''
+        cache = DbusService._discovery_cache
+        if cache is None or self.dtuvariant in (constants.DTUVARIANT_TEMPLATE, constants.DTUVARIANT_MQTT):
+            return
+        if self.pvinverternumber == 0:
+            cache.update_dtu(
+                self._get_discovery_key(),
+                number_of_inverters=self.get_number_of_inverters(),
+                esp_type=self.esptype,
+                details_in_livedata=self._poller.details_in_livedata,
+            )
+        cache.update_inverter(
+            self._get_discovery_key(),
+            self.pvinverternumber,
+            name=self._get_name(),
+            serial=self._get_serial(self.pvinverternumber),
+        )
+
+    def _revalidate_discovery(self):
+        '''Compare the cached metadata with the first live data and update D-Bus and the cache'''
+        discovered = self._discovered
+        self._discovered = None
+
+        name = self._get_name()
+        serial = self._get_serial(self.pvinverternumber)
+        if name != discovered["name"]:
+            self._set_dbus_value("/CustomName", name)
+        if serial != discovered["serial"]:
+            self._set_dbus_value("/Serial", serial)
+        if self.pvinverternumber == 0:
+            self.polling_interval = self._get_polling_interval()
+            if self.get_number_of_inverters() != discovered["number_of_inverters"]:
+                logging.warning("Number of inverters changed from %d to %d, restart to register all inverters",
+                                discovered["number_of_inverters"], self.get_number_of_inverters())
+        self._record_discovery()
+
     def _get_dtu_variant(self):
         return self.dtuvariant
 
+    @staticmethod
+    def _get_esp_type(meter_data):
+        '''return the esp_type from the Ahoy live data - depending on the API version'''
+        try:
+            return meter_data["generic"]["esp_type"]
+        except Exception:  # pylint: disable=broad-except
+            return meter_data["system"]["esp_type"]
+
     def _get_polling_interval(self):
-        meter_data = self._get_data()
         if self.dtuvariant == constants.DTUVARIANT_AHOY:
             # Check for ESP8266 and limit polling
-            try:
-                self.esptype = meter_data["generic"]["esp_type"]
-            except Exception:  # pylint: disable=broad-except
-                self.esptype = meter_data["system"]["esp_type"]
+            table = None if self._is_discovery_cache_used() else self._get_complete_fleet_table()
+            if self._is_discovery_cache_used():
+                self.esptype = self._discovered["esp_type"]
+            elif table is not None:
+                self.esptype = table.esp_type
+            else:
+                self.esptype = self._get_esp_type(self._get_data())
 
             if self.esptype == "ESP8266":
                 polling_interval = self.pollinginterval
@@ -354,10 +602,17 @@ class DbusService:
         elif self.dtuvariant == constants.DTUVARIANT_OPENDTU:
             polling_interval = 5000
 
-        elif self.dtuvariant == constants.DTUVARIANT_TEMPLATE:
+        elif self.dtuvariant in (constants.DTUVARIANT_TEMPLATE, constants.DTUVARIANT_MQTT):
             polling_interval = self.pollinginterval
+
+        if self.esptype and self.dtuvariant != constants.DTUVARIANT_MQTT:
+            DbusService._rate_limiters.set_esp_type(urlsplit(f"http://{self.host}").hostname, self.esptype)
         return polling_interval
 
+    def get_current_polling_interval(self):
+        '''Polling interval in ms, stretched by the adaptive polling policy while the inverters are idle'''
+        return self.polling_policy.get_interval(self.polling_interval, time.monotonic())
+
     def _get_status_url(self):
         url = None
         if self.dtuvariant == constants.DTUVARIANT_OPENDTU:
@@ -383,30 +638,65 @@ class DbusService:
         return f"http://{self.host}/{self.custapipath}"
 
     def _refresh_data(self):
-        '''Fetch new data from the DTU API and store in locally if successful.'''
+        '''
+        Fetch new data from the DTU API and store in locally if successful.
+
+        Returns False if there is nothing new to publish, because the DTU snapshot was published before.
+        '''
+        return self._store_fetched_data(self._fetch_data())
+
+    def _store_fetched_data(self, fetched):
+        '''Store the result of _fetch_data(), return True if it has to be published'''
+        if isinstance(fetched, DtuSnapshot):
+            return fetched.generation != self._published_generation
+        if self.dtuvariant == constants.DTUVARIANT_MQTT:
+            # the values are stored by _on_mqtt_message(): no data yet before the first message
+            return self._has_data()
+        if fetched is not None:
+            self.store_for_later_use(fetched)
+        return True
 
-        if self.pvinverternumber != 0 and self.dtuvariant != constants.DTUVARIANT_TEMPLATE:
-            # only fetch new data when called for inverter 0
-            # (background: data is kept at class level for all inverters)
-            return
+    def _fetch_data(self):
+        '''
+        Fetch and validate new data from the DTU API without storing it.
+
+        This method does network I/O only and may run in a worker thread of the fetch engine.
+        Returns the DtuSnapshot of the DTU, the Reading of a template, or None for MQTT.
+        '''
+        if self.dtuvariant == constants.DTUVARIANT_MQTT:
+            # the values are pushed by the broker, only check that they are still coming in
+            if (self._mqtt_last_message is not None and
+                    time.monotonic() - self._mqtt_last_message > self.max_age_ts):
+                raise ValueError(f"No MQTT message received for more than {self.max_age_ts} seconds")
+            return None
+
+        if self.dtuvariant == constants.DTUVARIANT_TEMPLATE:
+            # extracted here, the response is not kept
+            return Reading.from_response(self.fetch_url(self._get_status_url()), self._template_accessors)
+
+        # one fetch per polling interval serves all inverters of the DTU, whichever is updated first
+        return self._poller.poll(self.pvinverternumber, max_age=self.polling_interval / 1000)
 
-        url = self._get_status_url()
-        meter_data = self.fetch_url(url)
+    def _fetch_dtu_data(self):
+        '''Fetch, validate and enrich the live data of the DTU, called by its DtuPoller'''
+        # the response may be shared with other services (request coalescing): enrich a copy only
+        meter_data = dict(self.fetch_url(self._get_status_url()))
 
         if self.dtuvariant == constants.DTUVARIANT_OPENDTU:
             self.check_opendtu_data(meter_data)
+            self.enrich_opendtu_data(meter_data)
 
         if self.dtuvariant == constants.DTUVARIANT_AHOY:
             self.check_and_enrich_ahoy_data(meter_data)
 
-        self.store_for_later_use(meter_data)
+        return meter_data
 
     def store_for_later_use(self, meter_data):
-        '''Store meter data for later use in other methods'''
+        '''Store meter data for later use in other methods (the Reading of a template)'''
         if self.dtuvariant == constants.DTUVARIANT_TEMPLATE:
-            self.meter_data = meter_data
+            self.reading = meter_data
         else:
-            DbusService._meter_data = meter_data
+            self._poller.store(meter_data)
 
     def check_and_enrich_ahoy_data(self, meter_data):
         ''' Check if Ahoy data is valid and enrich it with additional data'''
@@ -424,14 +714,41 @@ class DbusService:
 
         # add the field "inverter" to meter_data:
         # This will contain an array of the "iv" data from all inverters.
+        # The inverters are fetched concurrently, so one cycle costs about one round trip instead of N.
+        enabled_inverters = [inverter_number for inverter_number in range(len(meter_data["iv"]))
+                             if is_true(meter_data["iv"][inverter_number])]
+        results = run_concurrently(self.fetch_ahoy_iv_data, enabled_inverters,
+                                   self._get_ahoy_parallel_requests(meter_data), self._get_executor())
+
         meter_data["inverter"] = []
-        for inverter_number in range(len(meter_data["iv"])):
-            if is_true(meter_data["iv"][inverter_number]):
-                iv_data = self.fetch_ahoy_iv_data(inverter_number)
-                while len(meter_data["inverter"]) < inverter_number:
-                    # there was a gap in the sequence of inverter numbers -> fill in a dummy value
-                    meter_data["inverter"].append({})
-                meter_data["inverter"].append(iv_data)
+        for inverter_number, (iv_data, error) in zip(enabled_inverters, results):
+            if error is not None:
+                # keep the last good data of this inverter, so the other inverters can still be updated
+                iv_data = self._poller.iv_data.get(inverter_number)
+                if iv_data is None:
+                    raise error
+                logging.warning(f"Fetching Ahoy inverter {inverter_number} failed, using last data: {str(error)}")
+            else:
+                iv_data = {field: iv_data[field] for field in constants.AHOY_INVERTER_FIELDS if field in iv_data}
+                self._poller.iv_data[inverter_number] = iv_data
+            while len(meter_data["inverter"]) < inverter_number:
+                # there was a gap in the sequence of inverter numbers -> fill in a dummy value
+                meter_data["inverter"].append({})
+            meter_data["inverter"].append(iv_data)
+
+    def _get_ahoy_parallel_requests(self, meter_data):
+        '''return how many inverters may be fetched from Ahoy in parallel (ESP8266 builds can only handle 1)'''
+        if self.ahoy_parallel_requests > 0:
+            return self.ahoy_parallel_requests
+        try:
+            esptype = self._get_esp_type(meter_data)
+        except Exception:  # pylint: disable=broad-except
+            esptype = None
+        return 1 if esptype == "ESP8266" else 4
+
+    def _get_executor(self):
+        '''return the thread pool for the per-inverter requests, the one of the FetchEngine if it runs'''
+        return self.fetch_engine.executor if self.fetch_engine is not None else None
 
     def check_opendtu_data(self, meter_data):
         ''' Check if OpenDTU data has the right format'''
@@ -440,6 +757,40 @@ class DbusService:
             raise ValueError("You do not have the latest OpenDTU Version to run this script,"
                              "please upgrade your OpenDTU to at least version 4.4.3")
 
+    def enrich_opendtu_data(self, meter_data):
+        '''
+        Add the inverter details to the OpenDTU data, if they are not part of /livedata/status.
+
+        OpenDTU v24.2.12 (breaking API changes 2024-02-19) and newer only reports a summary per inverter,
+        the details need one more request per inverter. The firmware generation is detected from every
+        response, so an update of the OpenDTU while the service runs is noticed. The details of all inverters
+        are fetched concurrently, so get_values_for_inverter() needs no network I/O.
+        '''
+        details_in_livedata = "AC" in meter_data["inverters"][0]
+        if details_in_livedata != self._poller.details_in_livedata:
+            logging.info("OpenDTU %s reports inverter details in /livedata/status: %s",
+                         self.host, details_in_livedata)
+            self._poller.details_in_livedata = details_in_livedata
+        if details_in_livedata:
+            return
+
+        meter_data["inverters"] = [dict(inverter) for inverter in meter_data["inverters"]]
+        serials = [inverter["serial"] for inverter in meter_data["inverters"]]
+        results = run_concurrently(self.fetch_opendtu_iv_data, serials, constants.OPENDTU_PARALLEL_REQUESTS,
+                                   self._get_executor())
+        for inverter, serial, (iv_data, error) in zip(meter_data["inverters"], serials, results):
+            if error is not None:
+                # keep the last good details of this inverter, so the other inverters can still be updated
+                details = self._poller.iv_data.get(serial)
+                if details is None:
+                    raise error
+                logging.warning(f"Fetching OpenDTU inverter {serial} failed, using last data: {str(error)}")
+            else:
+                details = {field: iv_data["inverters"][0][field] for field in ("AC", "DC", "INV")}
+                self._poller.iv_data[serial] = details
+            for field in ("AC", "DC", "INV"):
+                inverter[field] = details[field]
+
     def fetch_opendtu_iv_data(self, inverter_serial):
         '''Fetch inverter data from OpenDTU device for one inverter'''
         iv_url = self._get_status_url() + "?inv=" + inverter_serial
@@ -457,59 +808,143 @@ class DbusService:
         record_live_url = self.get_ahoy_base_url() + "/record/live"
         return self.fetch_url(record_live_url)
 
+    def fetch_url(self, url):
+        '''
+        Fetch JSON data from url. Throw an exception on any error. Only return on success.
+
+        Identical requests (same url and credentials) of several services are coalesced:
+        only one request is in flight and its parsed JSON is shared for RequestCoalescingTTL seconds.
+        '''
+        key = (url, self.username, self.password, self.digestauth)
+        return DbusService._request_coalescer.fetch(key, lambda: self._fetch_url(url), self.coalescing_ttl)
+
     @timeit
-    def fetch_url(self, url, try_number=1):
-        '''Fetch JSON data from url. Throw an exception on any error. Only return on success.'''
+    def _fetch_url(self, url):
+        '''Fetch JSON data from url without coalescing, count the errors by type for the metrics'''
         try:
-            logging.debug(f"calling {url} with timeout={self.httptimeout}")
-            if self.digestauth:
-                logging.debug("using Digest access authentication...")
-                json_str = requests.get(url=url, auth=HTTPDigestAuth(
-                    self.username, self.password), timeout=float(self.httptimeout))
-            elif self.username and self.password:
-                logging.debug("using Basic access authentication...")
-                json_str = requests.get(url=url, auth=(
-                    self.username, self.password), timeout=float(self.httptimeout))
-            else:
-                json_str = requests.get(
-                    url=url, timeout=float(self.httptimeout))
-            json_str.raise_for_status()  # raise exception on bad status code
-
-            # check for response
-            if not json_str:
-                logging.info("No Response from DTU")
-                raise ConnectionError("No response from DTU - ", self.host)
+            return self._fetch_url_uncounted(url)
+        except Exception as error:
+            metrics.FETCH_ERRORS.inc(type=type(error).__name__, **self._get_metric_labels(urlsplit(url).hostname))
+            raise
+
+    def _fetch_url_uncounted(self, url):
+        '''
+        Fetch JSON data from url.
+
+        There is no retry here: the circuit breaker of the host counts the connection failures of
+        all services and stops sending requests to it for a while, see circuit_breaker.py.
+        '''
+        logging.debug(f"calling {url} with timeout={self.httptimeout}")
+        if self.digestauth:
+            logging.debug("using Digest access authentication...")
+        elif self.username and self.password:
+            logging.debug("using Basic access authentication...")
+        host = urlsplit(url).hostname
+        labels = self._get_metric_labels(host)
+        breaker = DbusService._circuit_breakers.get(host)
+        # raises CircuitOpenError at once while the host is considered down
+        if breaker.before_request():
+            metrics.FETCH_RETRIES.inc(**labels)
+        try:
+            # all services requesting the same host share its rate limit, waiting requests are served in order
+            with DbusService._rate_limiters.get(host).limit(timeout=constants.RATE_LIMIT_MAX_WAIT):
+                with metrics.FETCH_SECONDS.time(**labels):
+                    json_str = DbusService._connection_pool.get(
+                        url,
+                        timeout=float(self.httptimeout),
+                        username=self.username,
+                        password=self.password,
+                        digestauth=self.digestauth,
+                    )
+            if json_str.status_code >= 500:
+                # the device answers, but cannot serve the data, e.g. while it restarts
+                json_str.raise_for_status()
+        except requests.exceptions.RequestException:
+            if breaker.record_failure():
+                metrics.BREAKER_TRIPS.inc(**labels)
+            raise
+        except BaseException:
+            # e.g. waited too long for the rate limit: the host was not asked, but a probe must not stay
+            # in flight, or the breaker would reject all further requests
+            breaker.record_not_sent()
+            raise
+        breaker.record_success()
+        json_str.raise_for_status()  # raise exception on bad status code, the host is up nevertheless
+
+        # check for response
+        if not json_str:
+            logging.info("No Response from DTU")
+            raise ConnectionError("No response from DTU - ", self.host)
+
+        json = None
+        try:
+            with metrics.DECODE_SECONDS.time(**labels):
+                json = DbusService._json_decoder.decode(json_str.content, url)
+        except ValueError as error:
+            logging.debug(f"JSONDecodeError: {str(error)}")
 
-            json = None
-            try:
-                json = json_str.json()
-            except json.decoder.JSONDecodeError as error:
-                logging.debug(f"JSONDecodeError: {str(error)}")
-
-            # check for Json
-            if not json:
-                # will be logged when catched
-                raise ValueError(f"Converting response from {url} to JSON failed: "
-                                 f"status={json_str.status_code},\nresponse={json_str.text}")
-            return json
-        except Exception:
-            # retry same call up to 3 times
-            if try_number < 3:  # pylint: disable=no-else-return
-                time.sleep(0.5)
-                return self.fetch_url(url, try_number + 1)
-            else:
-                raise
+        # check for Json
+        if not json:
+            # will be logged when catched
+            raise ValueError(f"Converting response from {url} to JSON failed: "
+                             f"status={json_str.status_code},\nresponse={json_str.text}")
+        return json
 
     def _get_data(self) -> dict:
         if self._test_meter_data:
             return self._test_meter_data
-        if not DbusService._meter_data:
-            self._refresh_data()
+        if self.dtuvariant in (constants.DTUVARIANT_TEMPLATE, constants.DTUVARIANT_MQTT):
+            return None  # only the Reading is kept
 
+        if self._poller.snapshot is None:
+            return None  # no data yet
+        # None if the poller has dropped it, the complete FleetTable of the snapshot has all values
+        return self._poller.snapshot.meter_data
+
+    def _has_data(self):
+        '''False until the first response (or MQTT message) is there, which update() fetches'''
+        if self._test_meter_data:
+            return True
+        if self.dtuvariant == constants.DTUVARIANT_MQTT:
+            return self._mqtt_last_message is not None
         if self.dtuvariant == constants.DTUVARIANT_TEMPLATE:
-            return self.meter_data
+            return self.reading is not None
+        return self._poller.snapshot is not None
+
+    @staticmethod
+    def _open_dbus_connection():
+        '''
+        Open the private D-Bus connection of one service.
+
+        The services cannot share a connection: velib's VeDbusService exports its object tree at "/"
+        of its connection, and D-Bus dispatches by connection and object path, not by bus name.
+        The session bus (used for development) needs private connections as well, else all
+        services would get the one shared connection of dbus.SessionBus().
+        See benchmarks/bench_dbus_connections.py for the cost of the connections.
+        '''
+        if "DBUS_SESSION_BUS_ADDRESS" in os.environ:
+            return dbus.SessionBus(private=True)
+        return dbus.SystemBus(private=True)
+
+    @staticmethod
+    def set_json_decoder(json_decoder):
+        '''Set the JsonDecoder used for all responses'''
+        DbusService._json_decoder = json_decoder
+
+    @staticmethod
+    def set_rate_limiters(rate_limiters):
+        '''Set the RateLimiters shared by all services'''
+        DbusService._rate_limiters = rate_limiters
+
+    @staticmethod
+    def set_circuit_breakers(circuit_breakers):
+        '''Set the CircuitBreakers shared by all services'''
+        DbusService._circuit_breakers = circuit_breakers
 
-        return DbusService._meter_data
+    @staticmethod
+    def set_discovery_cache(discovery_cache):
+        '''Set the DiscoveryCache used by all services (None = disabled)'''
+        DbusService._discovery_cache = discovery_cache
 
     def set_test_data(self, test_data):
         '''Set Test Data to run test'''
@@ -521,20 +956,39 @@ class DbusService:
 
     def is_data_up2date(self):
         '''check if data is up to date with timestamp and producing inverter'''
+        if not self._has_data():
+            return False
+
+        reading = None if self._test_meter_data else self.reading
+        if reading is not None and not reading.valid:
+            # a value of the template is missing: keep the values published before
+            logging.debug("is_data_up2date: inverter #%d: %r", self.pvinverternumber, reading)
+            return False
+
         if self.max_age_ts < 0:
             # check is disabled by config
             return True
 
+        if reading is not None:
+            # template and MQTT: the time of the response or message the values were read from
+            return 0 <= time.time() - reading.timestamp < self.max_age_ts
+
         meter_data = self._get_data()
+        table = self._get_fleet_table()
+        if table is not None and not table.is_valid(self.pvinverternumber):
+            table = None
 
         if self.dtuvariant == constants.DTUVARIANT_AHOY:
-            ts_last_success = self.get_ts_last_success(meter_data)
+            ts_last_success = (table.ts_last_success[self.pvinverternumber] if table is not None
+                               else self.get_ts_last_success(meter_data))
             age_seconds = time.time() - ts_last_success
             logging.debug("is_data_up2date: inverter #%d: age_seconds=%d, max_age_ts=%d",
                           self.pvinverternumber, age_seconds, self.max_age_ts)
             return 0 <= age_seconds < self.max_age_ts
 
         if self.dtuvariant == constants.DTUVARIANT_OPENDTU:
+            if table is not None:
+                return bool(table.reachable[self.pvinverternumber])
             return is_true(meter_data["inverters"][self.pvinverternumber]["reachable"])
         return True
 
@@ -555,15 +1009,41 @@ class DbusService:
         logging.debug("Last inverter #%d _update() call: %s", self.pvinverternumber, self._last_update)
         logging.info("[%s] Last inverter #%d '/Ac/Power': %s", self._servicename,
                      self.pvinverternumber, self._dbusservice["/Ac/Power"])
+        logging.debug("HTTP connection pool: %s", DbusService._connection_pool.get_stats())
+        logging.debug("Requests delayed by the rate limit, per host: %s", DbusService._rate_limiters.get_stats())
+        logging.debug("Circuit breakers, per host: %s", DbusService._circuit_breakers.get_states())
+        if self._poller is not None:
+            logging.debug("Inverter #%d: DTU poller %s", self.pvinverternumber, self._poller.get_health())
+            snapshot = self._poller.snapshot
+            if snapshot is not None and snapshot.table is not None and self.pvinverternumber == 0:
+                logging.info("[%s] DTU %s totals: %s", self._servicename, self.host, snapshot.table.get_totals())
+        if self.reading is not None:
+            logging.debug("Inverter #%d: %s", self.pvinverternumber, self.reading)
+        logging.debug("Inverter #%d: %d D-Bus writes suppressed (unchanged or within deadband)",
+                      self.pvinverternumber, self._publish_filter.suppressed_count)
         return True
 
     def _refresh_and_update(self):
         """
         Helper method to refresh data, handle data update if up-to-date, update index, and set successful flag.
         """
-        self._refresh_data()
+        if not self._refresh_data():
+            return True
+        return self._publish_refreshed_data()
+
+    def _publish_refreshed_data(self):
+        """
+        Helper method to handle data update if up-to-date and update index. Must run on the main loop.
+        """
+        if self._poller is not None and self._poller.snapshot is not None:
+            self._published_generation = self._poller.snapshot.generation
+            if self._discovered is not None:
+                self._revalidate_discovery()
         if self.is_data_up2date():
             self._handle_data_update()
+        else:
+            # stale data or an unreachable inverter, e.g. at night: it produces nothing
+            self.polling_policy.record(0, time.monotonic())
         self._update_index()
         return True
 
@@ -572,10 +1052,14 @@ class DbusService:
         Updates inverter data from the DTU (Data Transfer Unit) and sets DBus values if the data is up-to-date.
 
         Main logic:
-        - In timeout mode: Always attempt reconnect every RetryAfterSeconds. Only set zero values after ErrorStateAfterSeconds has elapsed since last success.
-        - In retrycount mode: After min_retries_until_fail failures, wait RetryAfterSeconds before next attempt and set zero values immediately.
+        - In timeout mode: Only set zero values after ErrorStateAfterSeconds has elapsed since last success.
+        - In retrycount mode: After min_retries_until_fail failures, set zero values immediately.
+        - In both modes the pause before reconnecting to an unreachable host is left to its circuit breaker,
+          which fails the request at once until RetryAfterSeconds have passed, see circuit_breaker.py.
         - Always updates the DBus update index after a refresh.
         - Tracks success/failure state and manages reconnect timing.
+        - If a fetch engine is set, the HTTP fetch runs in the background and the D-Bus values are
+          set later by _on_fetch_done() on the main loop.
 
         Exception handling:
         - Catches and logs HTTP, value, and general exceptions during update.
@@ -585,71 +1069,221 @@ class DbusService:
             None
         """
         logging.debug("_update")
+        if self._fetch_pending:
+            logging.debug("Inverter #%d: previous fetch still in progress, skipping update", self.pvinverternumber)
+            return
+        if self._is_pushed():
+            logging.debug("Inverter #%d: data is pushed by OpenDTU, skipping poll", self.pvinverternumber)
+            return
+
         successful = False
         now = time.time()
+        with self._dbus_update_cycle():
+            try:
+                if self.error_mode == constants.MODE_TIMEOUT and self.error_state_after_seconds > 0:
+                    # Set zero values only after ErrorStateAfterSeconds has elapsed since last success
+                    if (not self.last_update_successful and
+                            (now - self._last_update) >= self.error_state_after_seconds):
+                        self._handle_reconnect_wait()
+                    should_refresh_data = True
+                elif self.error_mode == constants.MODE_RETRYCOUNT:
+                    # Classic retry-count-based error handling
+                    if self.failed_update_count >= self.min_retries_until_fail:
+                        self._handle_reconnect_wait()
+                    should_refresh_data = True
+                else:
+                    should_refresh_data = False
+
+                # no pause here while the host is down: the circuit breaker of the host rejects the
+                # request without sending it until RetryAfterSeconds have passed
+                if should_refresh_data:
+                    self._cycle_started = time.monotonic()
+                    if self.fetch_engine is None:
+                        successful = self._refresh_and_update()
+                    else:
+                        self._fetch_pending = True
+                        self.fetch_engine.submit(self._fetch_data, self._on_fetch_done)
+            except Exception as error:  # pylint: disable=broad-except
+                self._log_update_error(error)
+            finally:
+                if not self._fetch_pending:
+                    self._finalize_update(successful)
+
+    def _on_fetch_done(self, meter_data, error):
+        '''Completion of a background fetch: store the data and set D-Bus values on the main loop'''
+        self._fetch_pending = False
+        successful = False
+        with self._dbus_update_cycle():
+            try:
+                if error is not None:
+                    raise error
+                successful = (self._publish_refreshed_data() if self._store_fetched_data(meter_data)
+                              else True)
+            except Exception as ex:  # pylint: disable=broad-except
+                self._log_update_error(ex)
+            finally:
+                self._finalize_update(successful)
+
+    def start_opendtu_push(self, services, dispatch=None, reconnect_interval=30):
+        '''
+        Receive the live data over the OpenDTU /livedata WebSocket and publish each update immediately.
+
+        Polling is only the fallback while the WebSocket is not connected. Call on the service of inverter 0
+        of each OpenDTU, services may include the services of other DTUs.
+        '''
+        status_url = self._get_status_url()
+        push = OpenDtuPush(
+            f"ws://{self.host}/livedata",
+            on_message=lambda document: DbusService._on_opendtu_push(document, services, self._poller),
+            decode=lambda message: DbusService._json_decoder.decode(message, status_url),
+            dispatch=dispatch,
+            username=self.username,
+            password=self.password,
+            reconnect_interval=reconnect_interval,
+            timeout=max(float(self.httptimeout), 30),
+        )
+        self._poller.keep_meter_data = True
+        DbusService._opendtu_pushes[self._get_discovery_key()] = push
+        push.start()
+        return push
+
+    def subscribe_mqtt(self, mqtt_source, dispatch=None):
+        '''
+        Subscribe to the topics of this MQTT template, the values are published as soon as they arrive.
+
+        With `dispatch` (e.g. GLib.idle_add) the values of a burst of messages, e.g. one per value of the
+        inverter, are published once after the messages already queued on the main loop.
+        '''
+        self._mqtt_dispatch = dispatch
+        for topic in sorted({topic for topic, _accessor in self._mqtt_values if topic}):
+            mqtt_source.subscribe(topic, self._on_mqtt_message)
+
+    def _on_mqtt_message(self, topic, value):
+        # keep the values read from the payload, not the payload
+        self.reading = Reading(*[accessor.get(value) if value_topic == topic else old_value
+                                 for (value_topic, accessor), old_value
+                                 in zip(self._mqtt_values, self.reading.get_values())])
+        self._mqtt_last_message = time.monotonic()
+        if self._mqtt_dispatch is None:
+            self._publish_pushed_data()
+        elif not self._mqtt_publish_pending:
+            self._mqtt_publish_pending = True
+            self._mqtt_dispatch(self._publish_mqtt_values)
+
+    def _publish_mqtt_values(self):
+        self._mqtt_publish_pending = False
+        self._publish_pushed_data()
+        return False  # run only once when used as GLib idle source
+
+    @staticmethod
+    def _on_opendtu_push(document, services, poller):
+        '''Merge a pushed OpenDTU update into the snapshot of the DTU and publish the inverters it contains'''
+        if poller.snapshot is None or "inverters" not in (poller.snapshot.meter_data or {}):
+            return  # the first poll provides the complete data the updates are merged into
+        meter_data, serials = merge_livedata(poller.snapshot.meter_data, document)
+        poller.store(meter_data)
+        for service in services:
+            if (service._poller is poller and
+                    service._get_serial(service.pvinverternumber) in serials):
+                service._publish_pushed_data()
+
+    def _publish_pushed_data(self):
+        successful = False
+        with self._dbus_update_cycle():
+            try:
+                successful = self._publish_refreshed_data()
+            except Exception as ex:  # pylint: disable=broad-except
+                self._log_update_error(ex)
+            finally:
+                self._finalize_update(successful)
+
+    def _is_pushed(self):
+        if self.dtuvariant != constants.DTUVARIANT_OPENDTU or not DbusService._opendtu_pushes:
+            return False
+        push = DbusService._opendtu_pushes.get(self._get_discovery_key())
+        if push is None or not push.connected:
+            return False
+        # keep polling until there is a response the updates can be merged into
+        snapshot = self._poller.snapshot
+        return snapshot is not None and snapshot.meter_data is not None
+
+    @contextmanager
+    def _dbus_update_cycle(self):
+        '''
+        Collect all D-Bus writes of one update cycle and send them as one ItemsChanged signal.
+
+        Uses the context manager of velib's VeDbusService. With a velib without it (or a plain
+        dict in the tests) the values are written one by one.
+        '''
+        if self._dbus_batch is not None or self._publish_seconds is not None:
+            yield  # nested in a running cycle
+            return
+        self._publish_seconds = 0.0
         try:
-            if self.error_mode == constants.MODE_TIMEOUT and self.error_state_after_seconds > 0:
-                # Set zero values only after ErrorStateAfterSeconds has elapsed since last success
-                if (not self.last_update_successful and (now - self._last_update) >= self.error_state_after_seconds):
-                    self._handle_reconnect_wait()
-                # Always allow a reconnect attempt every RetryAfterSeconds
-                if (now - self._last_update) >= self.retry_after_seconds:
-                    successful = self._refresh_and_update()
-                # In normal operation (no error), always call _refresh_data on every update
-                if self.last_update_successful:
-                    successful = self._refresh_and_update()
-            elif self.error_mode == constants.MODE_RETRYCOUNT:
-                # Classic retry-count-based error handling
-                if self.failed_update_count >= self.min_retries_until_fail:
-                    self._handle_reconnect_wait()
-                # Determine if we should refresh data based on current state and timing
-                is_last_update_successful = self.last_update_successful
-                time_since_last_update = now - self._last_update
-                is_retry_interval_elapsed = time_since_last_update >= self.retry_after_seconds
-                is_below_min_retries = self.failed_update_count < self.min_retries_until_fail
-
-                should_refresh_data = (
-                    is_last_update_successful or
-                    is_retry_interval_elapsed or
-                    is_below_min_retries
-                )
+            if not hasattr(self._dbusservice, "__enter__"):
+                yield
+            else:
+                with self._dbusservice as batch:
+                    self._dbus_batch = batch
+                    try:
+                        yield
+                    finally:
+                        self._dbus_batch = None
+                        flush_started = time.monotonic()
+                # the batch was sent when the with block was left
+                self._publish_seconds += time.monotonic() - flush_started
+            metrics.PUBLISH_SECONDS.observe(self._publish_seconds, **self._get_metric_labels())
+        finally:
+            self._publish_seconds = None
 
-                if should_refresh_data:
-                    successful = self._refresh_and_update()
-        except requests.exceptions.RequestException as exception:
+    def _set_dbus_value(self, path, value):
+        '''Write one D-Bus value, as part of the batch of the running update cycle if there is one'''
+        target = self._dbusservice if self._dbus_batch is None else self._dbus_batch
+        target[path] = value
+
+    def _log_update_error(self, error):
+        if isinstance(error, requests.exceptions.RequestException):
             logging.warning(f"HTTP Error at _update for inverter "
-                            f"{self.pvinverternumber} ({self._get_name()}): {str(exception)}")
-        except ValueError as error:
+                            f"{self.pvinverternumber} ({self._get_name()}): {str(error)}")
+        elif isinstance(error, ValueError):
             logging.warning(f"Error at _update for inverter "
                             f"{self.pvinverternumber} ({self._get_name()}): {str(error)}")
-        except Exception as error:  # pylint: disable=broad-except
+        else:
             logging.warning(f"Error at _update for inverter "
                             f"{self.pvinverternumber} ({self._get_name()})", exc_info=error)
-        finally:
-            self._finalize_update(successful)
 
     def _handle_reconnect_wait(self):
         if not self.reset_statuscode_on_next_success:
             self.set_dbus_values_to_zero()
             self.reset_statuscode_on_next_success = True
 
-    def _should_refresh_data(self, now):
-        return (
-            self.last_update_successful or
-            (now - self._last_update) >= self.retry_after_seconds or
-            self.failed_update_count < self.min_retries_until_fail
-        )
-
     def _handle_data_update(self):
         if self.dry_run:
             logging.info("DRY RUN. No data is sent!!")
         else:
             self.set_dbus_values()
 
+    def _get_metric_labels(self, host=None):
+        '''Labels of the metrics of this service, host defaults to the configured host without port'''
+        if self._metric_labels is None:
+            self._metric_labels = {}
+        labels = self._metric_labels.get(host)
+        if labels is None:
+            label_host = host
+            if label_host is None:
+                label_host = urlsplit(f"//{self.host}").hostname if self.host else ""
+            labels = {"host": label_host or "", "dtu": self.dtuvariant or "", "instance": str(self.deviceinstance)}
+            self._metric_labels[host] = labels
+        return labels
+
     def _finalize_update(self, successful):
+        if self._cycle_started is not None:
+            metrics.CYCLE_SECONDS.observe(time.monotonic() - self._cycle_started, **self._get_metric_labels())
+            self._cycle_started = None
         if successful:
             if self.reset_statuscode_on_next_success:
-                self._dbusservice["/StatusCode"] = constants.STATUSCODE_RUNNING
+                # through the filter, so it knows the ERROR it has seen last is gone
+                self._publish({"/StatusCode": constants.STATUSCODE_RUNNING})
             if not self.last_update_successful:
                 logging.warning(
                     f"Recovered inverter {self.pvinverternumber} ({self._get_name()}): "
@@ -670,15 +1304,36 @@ class DbusService:
         index = self._dbusservice["/UpdateIndex"] + 1  # increment index
         if index > 255:  # maximum value of the index
             index = 0  # overflow from 255 to 0
-        self._dbusservice["/UpdateIndex"] = index
+        self._set_dbus_value("/UpdateIndex", index)
         self._last_update = time.time()
 
+    def _get_fleet_table(self):
+        '''return the FleetTable of the current DTU snapshot, None for templates, test data and before the first response'''
+        if self._poller is None or self._test_meter_data or self._poller.snapshot is None:
+            return None
+        return self._poller.snapshot.table
+
+    def _get_complete_fleet_table(self):
+        '''return the FleetTable of the current DTU snapshot if it has all values, else None'''
+        table = self._get_fleet_table()
+        return table if table is not None and table.complete else None
+
     def get_values_for_inverter(self):
         '''read data and return (power, pvyield, current, voltage, dc-voltage)'''
+        if not self._has_data():
+            raise ValueError(f"No data received from {self._get_name()} yet")
+        table = self._get_fleet_table()
+        if table is not None and table.is_valid(self.pvinverternumber):
+            return table.get_values(self.pvinverternumber, self.useyieldday)
+        if (self.dtuvariant in (constants.DTUVARIANT_TEMPLATE, constants.DTUVARIANT_MQTT) and
+                not self._test_meter_data):
+            return self.reading.get_values()
+
         meter_data = self._get_data()
         (power, pvyield, current, voltage, dc_voltage) = (None, None, None, None, None)
 
         if self.dtuvariant == constants.DTUVARIANT_AHOY:
+            # without a valid row in the FleetTable, whose field positions are resolved once per snapshot
             power = get_ahoy_field_by_name(meter_data, self.pvinverternumber, "P_AC")
             if self.useyieldday:
                 pvyield = get_ahoy_field_by_name(meter_data, self.pvinverternumber, "YieldDay") / 1000
@@ -689,22 +1344,15 @@ class DbusService:
             current = get_ahoy_field_by_name(meter_data, self.pvinverternumber, "I_AC")
 
         elif self.dtuvariant == constants.DTUVARIANT_OPENDTU:
-            # OpenDTU v24.2.12 breaking API changes 2024-02-19
-            if "AC" in meter_data["inverters"][self.pvinverternumber]:
-                root_meter_data = meter_data["inverters"][self.pvinverternumber]
-                firmware_v24_2_12_or_newer = True
-            else:
-                inverter_serial = meter_data["inverters"][self.pvinverternumber]["serial"]
-                logging.debug(f"Inverter #{self.pvinverternumber} Serial: {inverter_serial}")
-                root_meter_data = self.fetch_opendtu_iv_data(inverter_serial)["inverters"][0]
-                logging.debug(f"{root_meter_data}")
-                firmware_v24_2_12_or_newer = False
+            # the inverter details were added to the data by enrich_opendtu_data(), if needed
+            root_meter_data = meter_data["inverters"][self.pvinverternumber]
+            # OpenDTU v24.2.12 breaking API changes 2024-02-19: the yield moved from "AC" to "INV"
+            field_inv = "AC" if "YieldTotal" in root_meter_data["AC"]["0"] else "INV"
 
             producing = is_true(root_meter_data["producing"])
             power = (root_meter_data["AC"]["0"]["Power"]["v"]
                      if producing
                      else 0)
-            field_inv = "AC" if firmware_v24_2_12_or_newer else "INV"
             if self.useyieldday:
                 pvyield = root_meter_data[field_inv]["0"]["YieldDay"]["v"] / 1000
             else:
@@ -716,75 +1364,96 @@ class DbusService:
                        else 0)
 
         elif self.dtuvariant == constants.DTUVARIANT_TEMPLATE:
-            power = self.get_processed_meter_value(
-                meter_data, self.custpower, self.custpower_default, self.custpower_factor)
-            pvyield = self.get_processed_meter_value(
-                meter_data, self.custtotal, self.custtotal_default, self.custtotal_factor)
-            voltage = self.get_processed_meter_value(meter_data, self.custvoltage, self.custvoltage_default)
-            current = self.get_processed_meter_value(meter_data, self.custcurrent, self.custcurrent_default)
+            (power, pvyield, current, voltage) = [accessor.get(meter_data) for accessor in self._template_accessors]
+
+        elif self.dtuvariant == constants.DTUVARIANT_MQTT:
+            # test data: the last payload per topic
+            (power, pvyield, current, voltage) = [
+                accessor.get(meter_data[topic]) if topic in meter_data else accessor.default
+                for topic, accessor in self._mqtt_values]
 
         return (power, pvyield, current, voltage, dc_voltage)
 
+    def _publish(self, values):
+        '''Write the values (dict path -> value) to D-Bus, skipping unchanged values and values within deadband'''
+        started = time.monotonic()
+        changed = self._publish_filter.filter(values, started)
+        for path, value in changed.items():
+            self._set_dbus_value(path, value)
+        labels = self._get_metric_labels()
+        metrics.DBUS_WRITES.inc(len(changed), **labels)
+        metrics.DBUS_WRITES_SKIPPED.inc(len(values) - len(changed), **labels)
+        elapsed = time.monotonic() - started
+        if self._publish_seconds is None:
+            metrics.PUBLISH_SECONDS.observe(elapsed, **labels)  # outside of an update cycle
+        else:
+            self._publish_seconds += elapsed
+
     def set_dbus_values_to_zero(self):
         '''zero power data and cleat connection status and set dbus values'''
+        values = {}
 
         if self._servicename == "com.victronenergy.inverter":
             # see https://github.com/victronenergy/venus/wiki/dbus#inverter
-            self._dbusservice["/Ac/Out/L1/V"] = 0
-            self._dbusservice["/Ac/Out/L1/I"] = 0
-            self._dbusservice["/Ac/Out/L1/P"] = 0
-            self._dbusservice["/Dc/0/Voltage"] = 0
-            self._dbusservice["/Ac/Power"] = 0
-
-            self._dbusservice["/Ac/L1/Current"] = 0
-            self._dbusservice["/Ac/L1/Power"] = 0
-            self._dbusservice["/Ac/L1/Voltage"] = 0
+            values["/Ac/Out/L1/V"] = 0
+            values["/Ac/Out/L1/I"] = 0
+            values["/Ac/Out/L1/P"] = 0
+            values["/Dc/0/Voltage"] = 0
+            values["/Ac/Power"] = 0
+
+            values["/Ac/L1/Current"] = 0
+            values["/Ac/L1/Power"] = 0
+            values["/Ac/L1/Voltage"] = 0
         else:
             # 0=Startup 0; 1=Startup 1; 2=Startup 2; 3=Startup 3; 4=Startup 4; 5=Startup 5; 6=Startup 6; 7=Running; 8=Standby; 9=Boot loading; 10=Error
-            self._dbusservice["/StatusCode"] = constants.STATUSCODE_ERROR
+            values["/StatusCode"] = constants.STATUSCODE_ERROR
 
             # three-phase inverter: split total power equally over all three phases
             if "3P" == self.pvinverterphase:
 
-                self._dbusservice["/Ac/L1/Voltage"] = 0
-                self._dbusservice["/Ac/L1/Current"] = 0
-                self._dbusservice["/Ac/L1/Power"] = 0
-                self._dbusservice["/Ac/L2/Voltage"] = 0
-                self._dbusservice["/Ac/L2/Current"] = 0
-                self._dbusservice["/Ac/L2/Power"] = 0
-                self._dbusservice["/Ac/L3/Voltage"] = 0
-                self._dbusservice["/Ac/L3/Current"] = 0
-                self._dbusservice["/Ac/L3/Power"] = 0
-                self._dbusservice["/Ac/Power"] = 0
+                values["/Ac/L1/Voltage"] = 0
+                values["/Ac/L1/Current"] = 0
+                values["/Ac/L1/Power"] = 0
+                values["/Ac/L2/Voltage"] = 0
+                values["/Ac/L2/Current"] = 0
+                values["/Ac/L2/Power"] = 0
+                values["/Ac/L3/Voltage"] = 0
+                values["/Ac/L3/Current"] = 0
+                values["/Ac/L3/Power"] = 0
+                values["/Ac/Power"] = 0
 
             else:
                 pre = "/Ac/" + self.pvinverterphase
-                self._dbusservice[pre + "/Voltage"] = 0
-                self._dbusservice[pre + "/Current"] = 0
-                self._dbusservice[pre + "/Power"] = 0
-                self._dbusservice["/Ac/Power"] = 0
+                values[pre + "/Voltage"] = 0
+                values[pre + "/Current"] = 0
+                values[pre + "/Power"] = 0
+                values["/Ac/Power"] = 0
+
+        self._publish(values)
 
     def set_dbus_values(self):
         '''read data and set dbus values'''
         (power, pvyield, current, voltage, dc_voltage) = self.get_values_for_inverter()
+        self.polling_policy.record(power, time.monotonic())
         state = self.get_ac_inverter_state(current)
+        values = {}
 
         if self._servicename == "com.victronenergy.inverter":
             # see https://github.com/victronenergy/venus/wiki/dbus#inverter
-            self._dbusservice["/Ac/Out/L1/V"] = voltage
-            self._dbusservice["/Ac/Out/L1/I"] = current
-            self._dbusservice["/Ac/Out/L1/P"] = power
-            self._dbusservice["/Dc/0/Voltage"] = dc_voltage
-            self._dbusservice["/Ac/Power"] = power
+            values["/Ac/Out/L1/V"] = voltage
+            values["/Ac/Out/L1/I"] = current
+            values["/Ac/Out/L1/P"] = power
+            values["/Dc/0/Voltage"] = dc_voltage
+            values["/Ac/Power"] = power
 
-            self._dbusservice["/Ac/Energy/Forward"] = pvyield
-            self._dbusservice["/State"] = state
-            self._dbusservice["/Mode"] = 2  # Switch position: 2=Inverter on; 4=Off; 5=Low Power/ECO
+            values["/Ac/Energy/Forward"] = pvyield
+            values["/State"] = state
+            values["/Mode"] = 2  # Switch position: 2=Inverter on; 4=Off; 5=Low Power/ECO
 
-            self._dbusservice["/Ac/L1/Current"] = current
-            self._dbusservice["/Ac/L1/Energy/Forward"] = pvyield
-            self._dbusservice["/Ac/L1/Power"] = power
-            self._dbusservice["/Ac/L1/Voltage"] = voltage
+            values["/Ac/L1/Current"] = current
+            values["/Ac/L1/Energy/Forward"] = pvyield
+            values["/Ac/L1/Power"] = power
+            values["/Ac/L1/Voltage"] = voltage
 
             logging.debug(f"Inverter #{self.pvinverternumber} Voltage (/Ac/Out/L1/V): {voltage}")
             logging.debug(f"Inverter #{self.pvinverternumber} Current (/Ac/Out/L1/I): {current}")
@@ -806,37 +1475,38 @@ class DbusService:
                 singlePhaseVoltage = voltage / 1.73205080757
                 if self.dtuvariant == constants.DTUVARIANT_AHOY:
                     singlePhaseVoltage = voltage
-                    self._dbusservice["/Ac/Power"] = power
 
                 realCurrent = power / 3 / singlePhaseVoltage
 
-                self._dbusservice["/Ac/L1/Voltage"] = singlePhaseVoltage
-                self._dbusservice["/Ac/L1/Current"] = realCurrent
-                self._dbusservice["/Ac/L1/Power"] = powerthird
-                self._dbusservice["/Ac/L2/Voltage"] = singlePhaseVoltage
-                self._dbusservice["/Ac/L2/Current"] = realCurrent
-                self._dbusservice["/Ac/L2/Power"] = powerthird
-                self._dbusservice["/Ac/L3/Voltage"] = singlePhaseVoltage
-                self._dbusservice["/Ac/L3/Current"] = realCurrent
-                self._dbusservice["/Ac/L3/Power"] = powerthird
-                self._dbusservice["/Ac/Power"] = power
+                values["/Ac/L1/Voltage"] = singlePhaseVoltage
+                values["/Ac/L1/Current"] = realCurrent
+                values["/Ac/L1/Power"] = powerthird
+                values["/Ac/L2/Voltage"] = singlePhaseVoltage
+                values["/Ac/L2/Current"] = realCurrent
+                values["/Ac/L2/Power"] = powerthird
+                values["/Ac/L3/Voltage"] = singlePhaseVoltage
+                values["/Ac/L3/Current"] = realCurrent
+                values["/Ac/L3/Power"] = powerthird
+                values["/Ac/Power"] = power
 
                 if power > 0:
-                    self._dbusservice["/Ac/L1/Energy/Forward"] = pvyield / 3
-                    self._dbusservice["/Ac/L2/Energy/Forward"] = pvyield / 3
-                    self._dbusservice["/Ac/L3/Energy/Forward"] = pvyield / 3
-                    self._dbusservice["/Ac/Energy/Forward"] = pvyield
+                    values["/Ac/L1/Energy/Forward"] = pvyield / 3
+                    values["/Ac/L2/Energy/Forward"] = pvyield / 3
+                    values["/Ac/L3/Energy/Forward"] = pvyield / 3
+                    values["/Ac/Energy/Forward"] = pvyield
 
             else:
                 pre = "/Ac/" + self.pvinverterphase
-                self._dbusservice[pre + "/Voltage"] = voltage
-                self._dbusservice[pre + "/Current"] = current
-                self._dbusservice[pre + "/Power"] = power
-                self._dbusservice["/Ac/Power"] = power
+                values[pre + "/Voltage"] = voltage
+                values[pre + "/Current"] = current
+                values[pre + "/Power"] = power
+                values["/Ac/Power"] = power
                 if power > 0:
-                    self._dbusservice[pre + "/Energy/Forward"] = pvyield
-                    self._dbusservice["/Ac/Energy/Forward"] = pvyield
+                    values[pre + "/Energy/Forward"] = pvyield
+                    values["/Ac/Energy/Forward"] = pvyield
 
             logging.debug(f"Inverter #{self.pvinverternumber} Power (/Ac/Power): {power}")
             logging.debug(f"Inverter #{self.pvinverternumber} Energy (/Ac/Energy/Forward): {pvyield}")
             logging.debug("---")
+
+        self._publish(values)
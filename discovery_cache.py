@@ -0,0 +1,87 @@
+'''Persisted cache of the metadata discovered from the DTU, for a fast and offline-tolerant start'''
+
+# system imports:
+import json
+import logging
+import os
+import threading
+
+
+class DiscoveryCache:
+    '''
+    Small JSON file with the metadata discovered from each DTU.
+
+    Per DTU (key "<variant>|<host>") it keeps the number of inverters, ESP type (which sets the polling
+    interval) and firmware generation, and per inverter its name and serial. On startup the services register
+    on D-Bus from this data without any HTTP request; the first live data revalidates it.
+    The file is only written when something changed.
+    '''
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self._lock = threading.Lock()
+        self._data = self._load()
+
+    def _load(self):
+        try:
+            with open(self.file_name, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            if isinstance(data, dict):
+                return data
+            logging.warning("Discovery cache %s has an unexpected format, ignoring it", self.file_name)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as error:
+            logging.warning("Discovery cache %s could not be read: %s", self.file_name, error)
+        return {}
+
+    def save(self):
+        '''Write the cache file atomically'''
+        with self._lock:
+            content = json.dumps(self._data, indent=2, sort_keys=True)
+        tmp_file_name = self.file_name + ".tmp"
+        try:
+            with open(tmp_file_name, "w", encoding="utf-8") as file:
+                file.write(content)
+            os.replace(tmp_file_name, self.file_name)
+        except OSError as error:
+            logging.warning("Discovery cache %s could not be written: %s", self.file_name, error)
+
+    def get_dtu(self, dtu_key):
+        '''Return the cached metadata of a DTU or None'''
+        with self._lock:
+            dtu = self._data.get(dtu_key)
+            return {key: value for key, value in dtu.items() if key != "inverters"} if dtu else None
+
+    def get_inverter(self, dtu_key, inverter_number):
+        '''Return the cached metadata of one inverter of a DTU or None'''
+        with self._lock:
+            inverter = self._data.get(dtu_key, {}).get("inverters", {}).get(str(inverter_number))
+            return dict(inverter) if inverter else None
+
+    def update_dtu(self, dtu_key, **values):
+        '''Update the metadata of a DTU, write the file if something changed'''
+        with self._lock:
+            dtu = self._data.setdefault(dtu_key, {})
+            changed = self._merge(dtu, values)
+        if changed:
+            self.save()
+        return changed
+
+    def update_inverter(self, dtu_key, inverter_number, **values):
+        '''Update the metadata of one inverter, write the file if something changed'''
+        with self._lock:
+            inverters = self._data.setdefault(dtu_key, {}).setdefault("inverters", {})
+            changed = self._merge(inverters.setdefault(str(inverter_number), {}), values)
+        if changed:
+            self.save()
+        return changed
+
+    @staticmethod
+    def _merge(target, values):
+        changed = False
+        for key, value in values.items():
+            if key not in target or target[key] != value:
+                target[key] = value
+                changed = True
+        return changed
@@ -0,0 +1,111 @@
+'''One poller per DTU: fetches the live data once for all its inverters and shares it as numbered snapshot'''
+
+# system imports:
+import threading
+import time
+from collections import namedtuple
+
+# Immutable result of a successful fetch: generation counts up with every new snapshot of the DTU,
+# timestamp is the time.time() of the fetch, meter_data the validated and enriched live data
+# (None if it was dropped, see DtuPoller), table its values decoded for all inverters (None without build_table).
+DtuSnapshot = namedtuple("DtuSnapshot", ["generation", "timestamp", "meter_data", "table"])
+
+
+class DtuPoller:
+    '''
+    Fetches and validates the live data of one DTU for all its inverter services (the subscribers).
+
+    A subscriber that has already seen the result of the last fetch starts a new one, the others get
+    that result as long as it is younger than their max_age: the snapshot, or the error of the failed
+    fetch. So whatever order the inverters are updated in, one fetch serves all of them, and they all
+    see the same data and the same failures. The lock only guards the state, the fetch runs without it,
+    so get_health() and store() on the main loop never wait for a slow DTU.
+
+    Unless keep_meter_data is set, a snapshot whose table is complete does not keep the response:
+    between two polls the DTU then only takes the memory of the table, whatever the size of the response.
+    '''
+
+    def __init__(self, fetch, build_table=None, keep_meter_data=True, clock=time.monotonic):
+        self._fetch = fetch
+        self._build_table = build_table
+        self.keep_meter_data = keep_meter_data  # e.g. OpenDTU push: the updates are merged into the response
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.snapshot = None
+        self.failed_count = 0  # failed fetches since the last success
+        self._attempt = 0
+        self._attempt_time = None
+        self._error = None  # error of the last fetch, None if it was successful
+        self._in_flight = None  # threading.Event of the running fetch, set when it is done
+        self._seen = {}  # last attempt each subscriber got the result of
+        # kept by the fetch between polls of this DTU
+        self.iv_data = {}  # last good data of each inverter, used if fetching it fails
+        self.details_in_livedata = None  # OpenDTU firmware generation, None = not detected yet
+
+    def poll(self, subscriber, max_age=0.0):
+        '''
+        Return the latest snapshot for subscriber, fetch a new one if it has seen the last result already.
+
+        Raises the error of the fetch if it failed. Concurrent callers wait for the running fetch.
+        '''
+        while True:
+            with self._lock:
+                in_flight = self._in_flight
+                if in_flight is None:
+                    if (self._seen.get(subscriber, 0) < self._attempt and
+                            self._clock() - self._attempt_time < max_age):
+                        self._seen[subscriber] = self._attempt
+                        if self._error is not None:
+                            raise self._error
+                        return self.snapshot
+
+                    self._in_flight = in_flight = threading.Event()
+                    self._attempt += 1
+                    self._attempt_time = self._clock()
+                    self._seen[subscriber] = self._attempt
+                    break
+            # another subscriber is fetching: wait for it, then its result may do for this one as well
+            in_flight.wait()
+
+        try:
+            meter_data = self._fetch()
+            table = self._build_table(meter_data) if self._build_table is not None else None
+        except Exception as error:
+            with self._lock:
+                self.failed_count += 1
+                self._error = error
+                self._in_flight = None
+            in_flight.set()
+            raise
+        with self._lock:
+            snapshot = self._store(meter_data, table)
+            self._in_flight = None
+        in_flight.set()
+        return snapshot
+
+    def store(self, meter_data):
+        '''Publish meter_data as new snapshot without a fetch, e.g. live data pushed by the DTU'''
+        table = self._build_table(meter_data) if self._build_table is not None else None
+        with self._lock:
+            return self._store(meter_data, table)
+
+    def _store(self, meter_data, table):
+        # the table is decoded by the caller, i.e. for a poll in the worker thread of the fetch
+        if table is not None and table.complete and not self.keep_meter_data:
+            meter_data = None
+        self._error = None
+        self.failed_count = 0
+        generation = 1 if self.snapshot is None else self.snapshot.generation + 1
+        self.snapshot = DtuSnapshot(generation, time.time(), meter_data, table)
+        return self.snapshot
+
+    def get_health(self):
+        '''Return the state shared by all inverters of the DTU, for diagnostics'''
+        with self._lock:
+            snapshot = self.snapshot
+            return {
+                "generation": snapshot.generation if snapshot else 0,
+                "age": round(time.time() - snapshot.timestamp, 1) if snapshot else None,
+                "failed_count": self.failed_count,
+                "last_error": repr(self._error) if self._error is not None else None,
+            }
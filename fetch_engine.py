@@ -0,0 +1,117 @@
+'''Background fetch engine to keep blocking HTTP calls away from the GLib main loop'''
+
+# File specific rules
+# pylint: disable=broad-except
+
+# system imports:
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# workers of the pool used by run_concurrently() if no FetchEngine runs, e.g. in the benchmarks
+DEFAULT_WORKERS = 8
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+class FetchEngine:
+    '''
+    Runs blocking fetch jobs in a thread pool and hands the results back to the main loop.
+
+    Only the network I/O runs in the worker threads. The completion callback is passed to
+    `dispatch` (e.g. GLib.idle_add), so all D-Bus writes still happen on the main thread.
+    If no dispatch function is given, the callback runs directly in the worker thread.
+    '''
+
+    def __init__(self, max_workers=4, dispatch=None):
+        self.max_workers = max(1, int(max_workers))
+        self._dispatch = dispatch
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fetch")
+
+    def submit(self, job, on_done):
+        '''Run job() in a worker thread and call on_done(result, error) on the main loop'''
+        future = self._executor.submit(job)
+        future.add_done_callback(lambda finished: self._deliver(finished, on_done))
+        return future
+
+    def _deliver(self, future, on_done):
+        error = future.exception()
+        result = None if error is not None else future.result()
+        if self._dispatch is None:
+            self._run_callback(on_done, result, error)
+        else:
+            self._dispatch(self._run_callback, on_done, result, error)
+
+    @staticmethod
+    def _run_callback(on_done, result, error):
+        try:
+            on_done(result, error)
+        except Exception as ex:
+            logging.error("Error in fetch completion callback", exc_info=ex)
+        return False  # run only once when used as GLib idle source
+
+    @property
+    def executor(self):
+        '''The thread pool of the engine, e.g. for run_concurrently()'''
+        return self._executor
+
+    def shutdown(self, wait=False):
+        '''Stop accepting new jobs and release the worker threads'''
+        self._executor.shutdown(wait=wait)
+
+
+def _get_default_executor():
+    global _default_executor  # pylint: disable=global-statement
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = ThreadPoolExecutor(max_workers=DEFAULT_WORKERS, thread_name_prefix="fetch-iv")
+        return _default_executor
+
+
+def run_concurrently(func, items, max_workers, executor=None):
+    '''
+    Call func(item) for all items with at most max_workers calls in parallel.
+
+    The calls run on executor, a long-lived pool (default: one shared by all callers), and in the
+    calling thread, which takes the items no worker has started yet. So the call also returns if all
+    workers are busy, e.g. if it runs in a worker of the same pool.
+
+    Returns a list of (result, error) tuples in the order of items. An exception of one call
+    does not stop the other calls, it is returned as error instead.
+    '''
+    items = list(items)
+    if not items:
+        return []
+    results = [None] * len(items)
+    lock = threading.Lock()
+    pending = iter(range(len(items)))
+    unfinished = [len(items)]
+    finished = threading.Event()
+
+    def call(item):
+        try:
+            return (func(item), None)
+        except Exception as error:
+            return (None, error)
+
+    def work():
+        while True:
+            with lock:
+                index = next(pending, None)
+            if index is None:
+                return
+            results[index] = call(items[index])
+            with lock:
+                unfinished[0] -= 1
+                if unfinished[0] == 0:
+                    finished.set()
+
+    max_workers = max(1, min(int(max_workers), len(items)))
+    if max_workers > 1:
+        executor = executor or _get_default_executor()
+        for _worker in range(max_workers - 1):
+            executor.submit(work)
+    work()
+    finished.wait()
+    return results
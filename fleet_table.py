@@ -0,0 +1,186 @@
+'''FleetTable: the values of all inverters of a DTU, decoded once per response into one array per field'''
+
+# system imports:
+from array import array
+
+# our imports:
+from helpers import AhoyFieldIndex
+
+
+class FleetTable:
+    '''
+    The values the services publish, one row per inverter of a DTU and one array per field.
+
+    Built once per snapshot by the DtuPoller, so each inverter service reads its row by index instead of
+    walking the nested response. A row whose data is incomplete is marked invalid, the service then reads
+    the response as before (and gets the same error as before). The arrays are plain array.array,
+    as numpy is not available on every GX device.
+
+    The table also has the names and serials of the inverters and the esp_type of an Ahoy, so a complete
+    table is all the services need: the DtuPoller then drops the response.
+    '''
+    __slots__ = ("power", "yield_total", "yield_day", "current", "voltage", "dc_voltage",
+                 "producing", "reachable", "ts_last_success", "valid", "name", "serial", "esp_type",
+                 "complete")
+
+    def __init__(self, rows):
+        self.power = array("d", bytes(8 * rows))
+        self.yield_total = array("d", bytes(8 * rows))
+        self.yield_day = array("d", bytes(8 * rows))  # in kWh
+        self.current = array("d", bytes(8 * rows))
+        self.voltage = array("d", bytes(8 * rows))
+        self.dc_voltage = array("d", bytes(8 * rows))
+        self.ts_last_success = array("d", bytes(8 * rows))
+        self.producing = array("b", bytes(rows))
+        self.reachable = array("b", bytes(rows))
+        self.valid = array("b", bytes(rows))
+        self.name = (None,) * rows
+        self.serial = (None,) * rows
+        self.esp_type = None  # Ahoy only
+        # True if all rows are valid and have a name and serial, i.e. the response is not needed anymore
+        self.complete = False
+
+    def __len__(self):
+        return len(self.valid)
+
+    @classmethod
+    def from_opendtu(cls, meter_data):
+        '''Build the table from OpenDTU /livedata/status, with the details added by enrich_opendtu_data()'''
+        inverters = meter_data["inverters"]
+        table = cls._from_rows([_read_opendtu_row(inverter) for inverter in inverters])
+        table.name, table.serial = _get_names_and_serials(inverters)
+        table.complete = table.has_all_rows()
+        return table
+
+    @classmethod
+    def from_ahoy(cls, meter_data):
+        '''Build the table from Ahoy /api/live, with the inverters added by check_and_enrich_ahoy_data()'''
+        inverters = meter_data["inverter"]
+        try:
+            fields = AhoyFieldIndex.from_meter_data(meter_data)
+        except (KeyError, TypeError):
+            table = cls(len(inverters))  # all rows invalid
+        else:
+            table = cls._from_rows([_read_ahoy_row(fields, inverter) for inverter in inverters])
+        table.name, table.serial = _get_names_and_serials(inverters)
+        table.esp_type = (meter_data.get("generic") or meter_data.get("system") or {}).get("esp_type")
+        table.complete = table.has_all_rows() and table.esp_type is not None
+        return table
+
+    @classmethod
+    def _from_rows(cls, rows):
+        '''Build the table from one tuple of values per inverter (in the order of _COLUMNS), None = invalid'''
+        table = cls(0)
+        table.valid = array("b", [row is not None for row in rows])
+        rows = [_INVALID_ROW if row is None else row for row in rows]
+        try:
+            columns = [array(typecode, column) for typecode, column in zip(_TYPECODES, zip(*rows))]
+        except TypeError:
+            # a value which is not a number, e.g. null: find the rows which have one
+            for row, values in enumerate(rows):
+                try:
+                    array("d", values)
+                except TypeError:
+                    table.valid[row] = False
+                    rows[row] = _INVALID_ROW
+            columns = [array(typecode, column) for typecode, column in zip(_TYPECODES, zip(*rows))]
+        if not rows:
+            columns = [array(typecode) for typecode in _TYPECODES]
+        for name, column in zip(_COLUMNS, columns):
+            setattr(table, name, column)
+        return table
+
+    def set_row(self, row, power, yield_total, yield_day, current, voltage, dc_voltage,
+                producing, reachable, ts_last_success=0):  # pylint: disable=too-many-arguments
+        '''Set all values of one inverter and mark the row valid'''
+        # convert all values before the first assignment, so an invalid value leaves the row untouched
+        values = (float(power), float(yield_total), float(yield_day), float(current), float(voltage),
+                  float(dc_voltage), float(ts_last_success))
+        (self.power[row], self.yield_total[row], self.yield_day[row], self.current[row], self.voltage[row],
+         self.dc_voltage[row], self.ts_last_success[row]) = values
+        self.producing[row] = bool(producing)
+        self.reachable[row] = bool(reachable)
+        self.valid[row] = True
+
+    def has_all_rows(self):
+        '''True if all rows are valid and have a name and serial'''
+        return all(self.valid) and None not in self.name and None not in self.serial
+
+    def is_valid(self, row):
+        '''True if the table has all values of the inverter in row'''
+        return 0 <= row < len(self.valid) and self.valid[row]
+
+    def get_values(self, row, useyieldday=False):
+        '''return (power, pvyield, current, voltage, dc-voltage) of the inverter in row'''
+        return (self.power[row], self.yield_day[row] if useyieldday else self.yield_total[row],
+                self.current[row], self.voltage[row], self.dc_voltage[row])
+
+    def get_totals(self):
+        '''return the power and yield of all valid rows, e.g. for the sign of life log'''
+        valid = self.valid
+        return {
+            "inverters": sum(valid),
+            "producing": sum(producing for producing, is_valid in zip(self.producing, valid) if is_valid),
+            "power": sum(value for value, is_valid in zip(self.power, valid) if is_valid),
+            "yield_day": sum(value for value, is_valid in zip(self.yield_day, valid) if is_valid),
+        }
+
+
+# the value columns of a row tuple and their array typecodes
+_COLUMNS = ("power", "yield_total", "yield_day", "current", "voltage", "dc_voltage", "ts_last_success",
+            "producing", "reachable")
+_TYPECODES = ("d", "d", "d", "d", "d", "d", "d", "b", "b")
+_INVALID_ROW = (0.0,) * 7 + (False, False)
+_TRUE_VALUES = (1, '1', True, "True", "TRUE", "true")  # as is_true()
+
+
+def _get_names_and_serials(inverters):
+    '''return (names, serials) of the inverters, None if missing or empty (the services then raise as before)'''
+    names, serials = [], []
+    for inverter in inverters:
+        inverter = inverter if isinstance(inverter, dict) else {}
+        names.append(inverter.get("name") or None)
+        serials.append(inverter.get("serial") or None)
+    return tuple(names), tuple(serials)
+
+
+def _read_opendtu_row(inverter):
+    '''return the row tuple of an OpenDTU inverter, None if values are missing'''
+    try:
+        ac_values = inverter["AC"]["0"]
+        # OpenDTU v24.2.12 breaking API changes 2024-02-19: the yield moved from "AC" to "INV"
+        yield_values = ac_values if "YieldTotal" in ac_values else inverter["INV"]["0"]
+        producing = inverter["producing"] in _TRUE_VALUES
+        return (
+            ac_values["Power"]["v"] if producing else 0,
+            yield_values["YieldTotal"]["v"],
+            yield_values["YieldDay"]["v"] / 1000,
+            ac_values["Current"]["v"] if producing else 0,
+            ac_values["Voltage"]["v"],
+            inverter["DC"]["0"]["Voltage"]["v"],
+            0,
+            producing,
+            inverter["reachable"] in _TRUE_VALUES,
+        )
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def _read_ahoy_row(fields, inverter):
+    '''return the row tuple of an Ahoy inverter, None if values are missing, e.g. the {} filling a gap'''
+    try:
+        channels = inverter["ch"]
+        power = fields.get_ac(channels, "P_AC")
+        return (
+            power,
+            fields.get_ac(channels, "YieldTotal"),
+            fields.get_ac(channels, "YieldDay") / 1000,
+            fields.get_ac(channels, "I_AC"),
+            fields.get_ac(channels, "U_AC"),
+            fields.get_dc(channels, "U_DC"),
+            inverter["ts_last_success"],
+            power > 0,
+            True,
+        )
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
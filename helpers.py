@@ -35,13 +35,38 @@ def get_config_value(config, name, inverter_or_template, inverter_or_tpl_number,
     if name in config[f"{inverter_or_template}{inverter_or_tpl_number}"]:
         return config[f"{inverter_or_template}{inverter_or_tpl_number}"][name]
 
-    if defaultvalue is None and inverter_or_template == "INVERTER":
+    if defaultvalue is None and inverter_or_template.endswith("INVERTER"):
         raise ValueError(f"config entry '{name}' not found. "
                          f"(Hint: Deprecated Host ONPREMISE entries must be moved to DEFAULT section.)")
 
     return defaultvalue
 
 
+def get_dtu_sections(dtu_number):
+    '''return the config section of a DTU and the prefix of its inverter sections, e.g. ("DTU1", "DTU1.INVERTER")'''
+    if dtu_number == 0:
+        return "DEFAULT", "INVERTER"
+    return f"DTU{dtu_number}", f"DTU{dtu_number}.INVERTER"
+
+
+def get_own_config_value(config, section, name, defaultvalue=None):
+    '''
+    return a value set in section itself, not inherited from DEFAULT, otherwise defaultvalue.
+
+    configparser sections inherit all DEFAULT values, a value equal to the one in DEFAULT is
+    considered inherited.
+    '''
+    if name not in config[section]:
+        return defaultvalue
+    value = config[section][name]
+    if section != "DEFAULT" and hasattr(config, "defaults"):
+        defaults = config.defaults()
+        inherited = defaults.get(config.optionxform(name)) if hasattr(config, "optionxform") else defaults.get(name)
+        if inherited is not None and inherited == value:
+            return defaultvalue
+    return value
+
+
 def get_default_config(config, name, defaultvalue):
     '''check if config value exist in DEFAULT section, otherwise return defaultvalue'''
     if name in config["DEFAULT"]:
@@ -50,35 +75,126 @@ def get_default_config(config, name, defaultvalue):
     return defaultvalue
 
 
+def is_true(val):
+    '''helper function to test for different true values'''
+    return val in (1, '1', True, "True", "TRUE", "true")
+
+
+def _get_list_index(path_entry):
+    '''return path_entry as list index, or None if it can only be a dict key'''
+    try:
+        return int(path_entry)
+    except (ValueError, TypeError):
+        return None
+
+
+class PathAccessor:
+    '''
+    Precompiled path to a value in a nested json document, e.g. "StatusSNS/ENERGY/Power/0" split at "/".
+
+    Each path entry is looked up as dict key in dicts and as index in lists, which is decided once here
+    instead of trying both on every poll. A missing entry resolves to 0, like get_value_by_path() always did.
+    '''
+    __slots__ = ("path", "default", "factor", "_steps")
+
+    def __init__(self, path, default=None, factor=1):
+        self.path = list(path)
+        self.default = default
+        self.factor = float(factor)
+        self._steps = tuple((path_entry, _get_list_index(path_entry)) for path_entry in self.path)
+
+    def get_raw(self, meter_data):
+        '''return the value found at the path, 0 if the path does not exist'''
+        value = meter_data
+        for key, index in self._steps:
+            if isinstance(value, dict):
+                value = value.get(key, 0)
+            elif isinstance(value, list) and index is not None and -len(value) <= index < len(value):
+                value = value[index]
+            else:
+                value = 0
+        return value
+
+    def get(self, meter_data):
+        '''return the value as float multiplied by factor, or the default if it is not a number'''
+        value = convert_to_expected_type(self.get_raw(meter_data), float, self.default)
+        if isinstance(value, (float, int)):
+            return float(value * self.factor)
+        return self.default
+
+
+@functools.lru_cache(maxsize=256)
+def _get_path_accessor(path, default=None, factor=1):
+    return PathAccessor(path, default, factor)
+
+
+def get_path_accessor(path, default=None, factor=1):
+    '''return the PathAccessor of path, compiled once and reused for the same path, default and factor'''
+    return _get_path_accessor(tuple(path), default, factor)
+
+
 def get_value_by_path(meter_data: dict, path):
     '''Try to extract 'path' from nested array 'meter_data' (derived from json document) and return the found value'''
-    value = meter_data
-    for path_entry in path:
-        try:
-            value = value[path_entry]
-        except Exception:
-            try:
-                value = value[int(path_entry)]
-            except Exception:
-                value = 0
-    return value
+    return get_path_accessor(path).get_raw(meter_data)
+
+
+_CONVERSION_FUNCTIONS = {
+    str: str,
+    int: int,
+    float: float,
+    bool: is_true
+}
 
 
 def convert_to_expected_type(value: str, expected_type: [str, int, float, bool],  # type: ignore
                              default: [None, str, int, float, bool]) -> [None, str, int, float, bool]:  # type: ignore
     ''' Try to convert value to expected_type, otherwise return default'''
     try:
-        conversion_functions = {
-            str: str,
-            int: int,
-            float: float,
-            bool: is_true
-        }
-        return conversion_functions[expected_type](value)
+        return _CONVERSION_FUNCTIONS[expected_type](value)
     except (ValueError, TypeError, KeyError):
         return default
 
 
+class AhoyFieldIndex:
+    '''
+    Positions of the Ahoy fields: ch0_fld_names (AC channel 0) and fld_names (DC channels) as name -> index maps.
+
+    Built once per response by FleetTable.from_ahoy(), so the values of all inverters of the snapshot are
+    read by position. There is no state shared between responses or DTUs: when Ahoy reports other fields,
+    e.g. after a firmware update, the table of the next snapshot is built with another index.
+    '''
+    __slots__ = ("ac_indexes", "dc_indexes")
+
+    def __init__(self, ch0_fld_names, fld_names):
+        # like list.index(): the first field of a name wins
+        self.ac_indexes = {}
+        for index, name in enumerate(ch0_fld_names):
+            self.ac_indexes.setdefault(name, index)
+        self.dc_indexes = {}
+        for index, name in enumerate(fld_names):
+            self.dc_indexes.setdefault(name, index)
+
+    @classmethod
+    def from_meter_data(cls, meter_data):
+        '''Build the AhoyFieldIndex for the field names of the Ahoy live data meter_data'''
+        return cls(meter_data["ch0_fld_names"], meter_data.get("fld_names", ()))
+
+    def get_ac(self, channels, fieldname):
+        '''Return the field of AC channel 0 from the "ch" list of an inverter'''
+        try:
+            return channels[0][self.ac_indexes[fieldname]]
+        except KeyError:
+            raise ValueError(f"Ahoy does not report the field {fieldname} in ch0_fld_names") from None
+
+    def get_dc(self, channels, fieldname):
+        '''Return the field of DC channel 1 from the "ch" list of an inverter'''
+        try:
+            # TODO - check if this channel has to be adjusted
+            return channels[1][self.dc_indexes[fieldname]]  # 1 = DC1, 2 = DC2 etc.
+        except KeyError:
+            raise ValueError(f"Ahoy does not report the field {fieldname} in fld_names") from None
+
+
 def get_ahoy_field_by_name(meter_data, actual_inverter, fieldname, use_ch0_fld_names=True):
     '''get the value by name instead of list index'''
     # fetch value from record call:
@@ -110,11 +226,6 @@ def get_ahoy_field_by_name(meter_data, actual_inverter, fieldname, use_ch0_fld_n
     return data
 
 
-def is_true(val):
-    '''helper function to test for different true values'''
-    return val in (1, '1', True, "True", "TRUE", "true")
-
-
 def timeit(func):
     '''decorator to measure execution time of a function'''
     @functools.wraps(func)
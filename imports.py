@@ -14,6 +14,14 @@ import sys
 import constants
 import tests
 from helpers import *
+from fetch_engine import FetchEngine
+from discovery_cache import DiscoveryCache
+from json_decoder import JsonDecoder
+from mqtt_source import MqttSource
+from scheduler import PollScheduler
+from metrics import MetricsServer
+from circuit_breaker import CircuitBreakers
+from rate_limiter import RateLimiters, parse_rate_limit, parse_host_rate_limits
 
 # Victron imports:
 from dbus_service import DbusService
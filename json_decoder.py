@@ -0,0 +1,143 @@
+'''Pluggable JSON decoding of the DTU and template responses, optionally keeping only the fields in use'''
+
+# system imports:
+import json
+import logging
+from urllib.parse import urlsplit
+
+# optional faster decoders, used if installed:
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+KEEP_ALL = None  # field tree leaf: keep the whole value
+WILDCARD = "*"  # path entry matching all keys of a dict / all items of a list
+
+
+def _get_backends():
+    '''Return the installed backends as {name: loads function}, fastest first'''
+    backends = {}
+    if orjson is not None:
+        backends["orjson"] = orjson.loads
+    if ujson is not None:
+        backends["ujson"] = ujson.loads
+    backends["json"] = json.loads
+    return backends
+
+
+def get_backend_names():
+    '''Return the names of the installed JSON backends, fastest first'''
+    return list(_get_backends())
+
+
+class FieldSelection:
+    '''
+    Tree of the fields to keep from a JSON document, built from paths like ["inverters", "*", "AC"].
+
+    A path selects the whole value at its end. "*" matches all keys of a dict or all items of a list;
+    an explicit key next to "*" takes precedence for its entry. Items of a list which are not selected
+    are replaced by None, so the list indices stay valid.
+    '''
+
+    def __init__(self, paths=()):
+        self._tree = {}
+        for path in paths:
+            self.add(path)
+
+    def add(self, path):
+        '''Add a path (list of keys / list indices) to the selection'''
+        path = [str(path_entry) for path_entry in path]
+        if not path:
+            return
+        node = self._tree
+        for path_entry in path[:-1]:
+            if path_entry in node and node[path_entry] is KEEP_ALL:
+                return  # already selected as a whole
+            node = node.setdefault(path_entry, {})
+        node[path[-1]] = KEEP_ALL
+
+    def apply(self, document):
+        '''Return a copy of document with only the selected fields'''
+        return self._select(document, self._tree)
+
+    @classmethod
+    def _select(cls, value, tree):
+        if tree is KEEP_ALL:
+            return value
+        if isinstance(value, dict):
+            selected = {}
+            for key, subtree in tree.items():
+                if key != WILDCARD and key in value:
+                    selected[key] = cls._select(value[key], subtree)
+            if WILDCARD in tree:
+                for key, item in value.items():
+                    if key not in selected:
+                        selected[key] = cls._select(item, tree[WILDCARD])
+            return selected
+        if isinstance(value, list):
+            if WILDCARD in tree:
+                selected = [cls._select(item, tree[WILDCARD]) for item in value]
+            else:
+                selected = [None] * len(value)
+            for key, subtree in tree.items():
+                index = cls._get_index(key, len(value))
+                if index is not None:
+                    selected[index] = cls._select(value[index], subtree)
+            return selected
+        return value
+
+    @staticmethod
+    def _get_index(key, length):
+        try:
+            index = int(key)
+        except ValueError:
+            return None
+        return index if -length <= index < length else None
+
+
+class JsonDecoder:
+    '''
+    Decodes the HTTP responses with the fastest installed JSON library (orjson, ujson, stdlib json).
+
+    With selective decoding, only the fields registered for an URL (path without query) are kept
+    from its documents, so the services do not keep whole status documents of which they read a few values.
+    This is done in Python after decoding, so it costs some CPU time for less memory held between polls.
+    URLs without registered fields are returned completely.
+    '''
+
+    def __init__(self, backend="auto", selective=False):
+        backends = _get_backends()
+        if backend in ("", "auto"):
+            backend = next(iter(backends))
+        elif backend not in backends:
+            logging.warning("JSON backend '%s' is not installed, using '%s'", backend, next(iter(backends)))
+            backend = next(iter(backends))
+        self.backend = backend
+        self.selective = selective
+        self._loads = backends[backend]
+        self._fields = {}
+
+    @staticmethod
+    def _get_key(url):
+        parts = urlsplit(url)
+        return (parts.netloc, parts.path)
+
+    def add_fields(self, url, paths):
+        '''Register the fields (paths in the document) read from the responses of url'''
+        selection = self._fields.setdefault(self._get_key(url), FieldSelection())
+        for path in paths:
+            selection.add(path)
+
+    def decode(self, content, url=None):
+        '''Decode content (bytes or str), keeping only the fields registered for url. Raise ValueError on errors'''
+        document = self._loads(content)
+        if self.selective and url is not None:
+            selection = self._fields.get(self._get_key(url))
+            if selection is not None:
+                document = selection.apply(document)
+        return document
@@ -0,0 +1,223 @@
+'''Counters and latency histograms of the driver, served in Prometheus text format on an optional local port'''
+
+# system imports:
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    '''Base class: a metric with a fixed set of label names, one series per combination of label values'''
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _get_key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} needs the labels {self.labelnames}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        '''Return the lines of the metric in Prometheus text format'''
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            series = sorted(self._series.items())
+            for key, value in series:
+                lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    '''Value which only goes up, e.g. the number of errors'''
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        '''Add amount to the series of the labels'''
+        key = self._get_key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def get(self, **labels):
+        '''Return the value of the series of the labels'''
+        with self._lock:
+            return self._series.get(self._get_key(labels), 0)
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    '''Distribution of observed values (e.g. durations in seconds) in cumulative buckets'''
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        '''Add one observation to the series of the labels'''
+        key = self._get_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        '''Observe the duration of the with block'''
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def get_count(self, **labels):
+        '''Return the number of observations of the series of the labels'''
+        with self._lock:
+            series = self._series.get(self._get_key(labels))
+            return 0 if series is None else series[2]
+
+    def _render_series(self, key, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    '''All metrics of the process, rendered together for the /metrics endpoint'''
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        '''Create and register a Counter'''
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        '''Create and register a Histogram'''
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        '''Return all metrics in Prometheus text format'''
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# all metrics of a service are labeled with the host, the DTU variant and the device instance
+LABELS = ("host", "dtu", "instance")
+
+FETCH_SECONDS = REGISTRY.histogram(
+    "dbus_opendtu_fetch_seconds", "Duration of the HTTP requests to the DTU or template", LABELS)
+DECODE_SECONDS = REGISTRY.histogram(
+    "dbus_opendtu_json_decode_seconds", "Duration of decoding the JSON responses", LABELS)
+PUBLISH_SECONDS = REGISTRY.histogram(
+    "dbus_opendtu_publish_seconds", "Duration of writing the values of one update to D-Bus", LABELS)
+CYCLE_SECONDS = REGISTRY.histogram(
+    "dbus_opendtu_update_cycle_seconds", "Duration of one update from the start of the fetch until published",
+    LABELS)
+FETCH_ERRORS = REGISTRY.counter(
+    "dbus_opendtu_fetch_errors_total", "Failed requests, by type of the error", LABELS + ("type",))
+FETCH_RETRIES = REGISTRY.counter(
+    "dbus_opendtu_fetch_retries_total", "Requests sent as probe to a host whose circuit breaker was open", LABELS)
+BREAKER_TRIPS = REGISTRY.counter(
+    "dbus_opendtu_breaker_trips_total", "How often the circuit breaker of the host opened", LABELS)
+DBUS_WRITES = REGISTRY.counter(
+    "dbus_opendtu_dbus_writes_total", "Values written to D-Bus", LABELS)
+DBUS_WRITES_SKIPPED = REGISTRY.counter(
+    "dbus_opendtu_dbus_writes_skipped_total", "Values not written to D-Bus as unchanged or within deadband", LABELS)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        '''Serve /metrics'''
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        logging.debug("Metrics: " + format, *args)
+
+
+class MetricsServer:
+    '''HTTP server for the metrics in a background thread, by default only reachable from the device itself'''
+
+    def __init__(self, port, address="127.0.0.1", registry=REGISTRY):
+        self._server = ThreadingHTTPServer((address, int(port)), _MetricsHandler)
+        self._server.daemon_threads = True
+        self._server.registry = registry
+        self._thread = None
+
+    @property
+    def port(self):
+        '''The port the server listens on (useful with port 0)'''
+        return self._server.server_address[1]
+
+    def start(self):
+        '''Start serving'''
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+        logging.info("Metrics available at http://%s:%d/metrics", *self._server.server_address[:2])
+
+    def stop(self):
+        '''Stop serving and close the port'''
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,128 @@
+'''MQTT source: receive the readings of OpenDTU, AhoyDTU or Tasmota from an MQTT broker instead of polling'''
+
+# File specific rules
+# pylint: disable=broad-except
+
+# system imports:
+import json
+import logging
+import threading
+
+# optional dependency, only needed if a template uses Source=mqtt:
+try:
+    import paho.mqtt.client as paho_mqtt
+except ImportError:
+    paho_mqtt = None
+
+
+def parse_topic_spec(spec):
+    '''
+    Split a value spec like "tele/shelly/SENSOR#ENERGY/Power/0" into topic and path in the payload.
+
+    Without "#" the whole payload is the value, e.g. "solar/114182940773/0/power" of OpenDTU
+    or "inverter/HM-600/ch0/P_AC" of AhoyDTU. "#" is a wildcard in MQTT and never part of a topic name.
+    '''
+    topic, _, path = spec.partition("#")
+    return topic.strip(), [path_entry for path_entry in path.strip().split("/") if path_entry]
+
+
+def _create_paho_client():
+    if paho_mqtt is None:
+        raise ImportError("Source=mqtt needs the paho-mqtt package: pip3 install paho-mqtt")
+    if hasattr(paho_mqtt, "CallbackAPIVersion"):  # paho-mqtt 2.x
+        return paho_mqtt.Client(paho_mqtt.CallbackAPIVersion.VERSION1)
+    return paho_mqtt.Client()
+
+
+class MqttSource:
+    '''
+    One connection to an MQTT broker shared by all services using Source=mqtt.
+
+    The services subscribe to their topics with a callback. Each message is decoded once (JSON if
+    possible, else the payload as string) and handed to the callbacks of its topic via `dispatch`
+    (e.g. GLib.idle_add), so all D-Bus writes happen on the main loop. After a reconnect all topics
+    are subscribed again. client_factory creates the MQTT client (default: paho-mqtt).
+    '''
+
+    def __init__(self, host, port=1883, username=None, password=None,
+                 client_factory=None, dispatch=None, decode=json.loads):
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.messages = 0
+        self._client_factory = client_factory or _create_paho_client
+        self._dispatch = dispatch
+        self._decode = decode
+        self._callbacks = {}
+        self._lock = threading.Lock()
+        self._client = None
+
+    def subscribe(self, topic, callback):
+        '''Call callback(topic, value) on the main loop for every message on topic'''
+        with self._lock:
+            self._callbacks.setdefault(topic, []).append(callback)
+            client = self._client
+        if client is not None:
+            client.subscribe(topic)
+
+    def start(self):
+        '''Connect to the broker, the network loop runs in a background thread'''
+        client = self._client_factory()
+        if self.username:
+            client.username_pw_set(self.username, self.password)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_message = self._on_message
+        client.connect_async(self.host, self.port, keepalive=60)
+        self._client = client
+        client.loop_start()
+
+    def stop(self):
+        '''Disconnect from the broker'''
+        client, self._client = self._client, None
+        if client is not None:
+            client.disconnect()
+            client.loop_stop()
+
+    def _on_connect(self, client, _userdata, _flags, result_code, *_args):
+        if result_code != 0:
+            logging.warning("MQTT: connection to %s:%d refused: %s", self.host, self.port, result_code)
+            return
+        logging.info("MQTT: connected to %s:%d", self.host, self.port)
+        with self._lock:
+            topics = list(self._callbacks)
+        for topic in topics:
+            client.subscribe(topic)
+
+    def _on_disconnect(self, _client, _userdata, result_code, *_args):
+        if result_code != 0:
+            logging.warning("MQTT: connection to %s:%d lost (%s), reconnecting", self.host, self.port, result_code)
+
+    def _on_message(self, _client, _userdata, message):
+        with self._lock:
+            callbacks = list(self._callbacks.get(message.topic, ()))
+        if not callbacks:
+            return
+        self.messages += 1
+        value = self.decode_payload(message.payload)
+        for callback in callbacks:
+            if self._dispatch is None:
+                self._deliver(callback, message.topic, value)
+            else:
+                self._dispatch(self._deliver, callback, message.topic, value)
+
+    def decode_payload(self, payload):
+        '''Return the payload decoded as JSON (also plain numbers), or as string if it is no JSON'''
+        try:
+            return self._decode(payload)
+        except ValueError:
+            return payload.decode("utf-8", errors="replace") if isinstance(payload, bytes) else payload
+
+    @staticmethod
+    def _deliver(callback, topic, value):
+        try:
+            callback(topic, value)
+        except Exception as error:
+            logging.error("MQTT: error handling message on %s", topic, exc_info=error)
+        return False  # run only once when used as GLib idle source
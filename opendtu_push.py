@@ -0,0 +1,125 @@
+'''Push mode for OpenDTU: receive the live data over the /livedata WebSocket instead of polling'''
+
+# File specific rules
+# pylint: disable=broad-except
+
+# system imports:
+import base64
+import logging
+import threading
+
+# our imports:
+from websocket_client import WebSocketClient
+
+
+def merge_livedata(snapshot, delta):
+    '''
+    Merge a /livedata WebSocket message into the last /api/livedata/status document.
+
+    OpenDTU only sends the inverters which changed, each with its complete data. Returns the new
+    snapshot (the given one is not modified, it may still be used by other threads) and the serials
+    of the inverters contained in the message.
+    '''
+    merged = dict(snapshot)
+    for key, value in delta.items():
+        if key != "inverters":
+            merged[key] = value
+    inverters = list(snapshot.get("inverters", []))
+    index_by_serial = {inverter.get("serial"): index for index, inverter in enumerate(inverters)}
+    serials = []
+    for inverter_delta in delta.get("inverters", []):
+        serial = inverter_delta.get("serial")
+        index = index_by_serial.get(serial)
+        if index is None:
+            logging.debug("OpenDTU push: ignoring unknown inverter %s", serial)
+            continue
+        inverter = dict(inverters[index])
+        inverter.update(inverter_delta)
+        inverters[index] = inverter
+        serials.append(serial)
+    merged["inverters"] = inverters
+    return merged, serials
+
+
+class OpenDtuPush:
+    '''
+    Keeps one WebSocket connection to an OpenDTU open and hands every message to the main loop.
+
+    The connection runs in its own thread. Each decoded message is passed to on_message via
+    `dispatch` (e.g. GLib.idle_add). If the connection drops it is reopened after reconnect_interval
+    seconds; in the meantime `connected` is False and the services poll as usual.
+    '''
+
+    def __init__(self, url, on_message, decode, dispatch=None,
+                 username=None, password=None, reconnect_interval=30, timeout=30):
+        self.url = url
+        self.on_message = on_message
+        self.decode = decode
+        self.reconnect_interval = reconnect_interval
+        self.timeout = timeout
+        self.connected = False
+        self.messages = 0
+        self._dispatch = dispatch
+        self._headers = {}
+        if username and password:
+            credentials = base64.b64encode(f"{username}:{password}".encode("utf-8")).decode("ascii")
+            self._headers["Authorization"] = f"Basic {credentials}"
+        self._stop = threading.Event()
+        self._client = None
+        self._thread = None
+
+    def start(self):
+        '''Start the connection thread'''
+        self._thread = threading.Thread(target=self._run, name="opendtu-push", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        '''Close the connection and stop the thread'''
+        self._stop.set()
+        client = self._client
+        if client is not None:
+            client.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._client = WebSocketClient(self.url, headers=self._headers, timeout=self.timeout)
+            try:
+                self._client.connect()
+                logging.info("OpenDTU push: connected to %s", self.url)
+                self.connected = True
+                while not self._stop.is_set():
+                    message = self._client.receive()
+                    if message is None:
+                        break
+                    self._handle_message(message)
+            except Exception as error:
+                if not self._stop.is_set():
+                    logging.warning("OpenDTU push: connection to %s failed, polling until reconnected: %s",
+                                    self.url, error)
+            finally:
+                self.connected = False
+                self._client.close()
+            self._stop.wait(self.reconnect_interval)
+
+    def _handle_message(self, message):
+        try:
+            document = self.decode(message)
+        except ValueError as error:
+            logging.debug("OpenDTU push: ignoring invalid message: %s", error)
+            return
+        if not isinstance(document, dict) or "inverters" not in document:
+            return
+        self.messages += 1
+        if self._dispatch is None:
+            self._deliver(document)
+        else:
+            self._dispatch(self._deliver, document)
+
+    def _deliver(self, document):
+        try:
+            self.on_message(document)
+        except Exception as error:
+            logging.error("OpenDTU push: error handling message", exc_info=error)
+        return False  # run only once when used as GLib idle source
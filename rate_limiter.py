@@ -0,0 +1,177 @@
+'''Per host rate limit and cap on requests in flight, shared by all services talking to the same device'''
+
+# system imports:
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+UNLIMITED = (0.0, 1.0, 0)
+
+
+def parse_rate_limit(text):
+    '''
+    Parse a rate limit like "1/2/1": requests per second / burst / maximum requests in flight.
+
+    Missing parts and 0 mean unlimited, e.g. "//1" only limits the requests in flight to 1.
+    Returns (rate, burst, max_in_flight), or None if text is empty or invalid.
+    '''
+    text = (text or "").strip()
+    if not text:
+        return None
+    parts = [part.strip() for part in text.split("/")] + ["", ""]
+    try:
+        rate = float(parts[0] or 0)
+        burst = max(1.0, float(parts[1] or 1))
+        max_in_flight = int(parts[2] or 0)
+    except ValueError:
+        logging.warning("Ignoring invalid rate limit '%s' (expected <per second>/<burst>/<in flight>)", text)
+        return None
+    return (rate, burst, max_in_flight)
+
+
+def parse_host_rate_limits(text):
+    '''Parse "192.168.1.10:1/2/1, shelly.local://1" into a dict host -> (rate, burst, max_in_flight)'''
+    limits = {}
+    for entry in (text or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        host, _, spec = entry.partition(":")
+        limit = parse_rate_limit(spec)
+        if not host.strip() or limit is None:
+            logging.warning("Ignoring invalid host rate limit '%s' (expected <host>:<rate limit>)", entry)
+            continue
+        limits[host.strip().lower()] = limit
+    return limits
+
+
+class HostRateLimiter:
+    '''
+    Token bucket plus a cap on concurrent requests for one host.
+
+    Up to `burst` requests may start at once, then `rate` requests per second. At most
+    `max_in_flight` requests run at the same time. Waiting requests are served strictly in the
+    order they arrived, so no service can starve the others. rate=0 / max_in_flight=0 = unlimited.
+    '''
+
+    def __init__(self, rate=0.0, burst=1.0, max_in_flight=0, clock=time.monotonic):
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._waiting = deque()
+        self._in_flight = 0
+        self.waits = 0
+        self.configure(rate, burst, max_in_flight)
+
+    def configure(self, rate, burst, max_in_flight):
+        '''Change the limits, e.g. after the ESP type of the host is known'''
+        with self._condition:
+            self.rate = float(rate)
+            self.burst = max(1.0, float(burst))
+            self.max_in_flight = int(max_in_flight)
+            self._tokens = self.burst
+            self._updated = self._clock()
+            self._condition.notify_all()
+
+    def _refill(self, now):
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _get_wait_time(self, ticket):
+        '''0 if ticket may start now, else the seconds to wait (None = until a request finished)'''
+        if self._waiting[0] is not ticket:
+            return None
+        if self.max_in_flight > 0 and self._in_flight >= self.max_in_flight:
+            return None
+        if self.rate > 0:
+            self._refill(self._clock())
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+        return 0
+
+    def acquire(self, timeout=None):
+        '''Wait until a request may start, raises TimeoutError after timeout seconds'''
+        ticket = object()
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._condition:
+            self._waiting.append(ticket)
+            try:
+                waited = False
+                while True:
+                    wait_time = self._get_wait_time(ticket)
+                    if wait_time == 0:
+                        break
+                    if deadline is not None:
+                        remaining = deadline - self._clock()
+                        if remaining <= 0:
+                            raise TimeoutError("Request not started within its timeout: rate limit of host reached")
+                        wait_time = remaining if wait_time is None else min(wait_time, remaining)
+                    waited = True
+                    self._condition.wait(wait_time)
+                if self.rate > 0:
+                    self._tokens -= 1
+                self._in_flight += 1
+                if waited:
+                    self.waits += 1
+            finally:
+                self._waiting.remove(ticket)
+                self._condition.notify_all()
+
+    def release(self):
+        '''A request finished'''
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def limit(self, timeout=None):
+        '''Context manager around one request'''
+        self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class RateLimiters:
+    '''
+    One HostRateLimiter per host name, shared by all services.
+
+    The limits of a host come from `host_limits` (configured per host), else from the profile of
+    its ESP type once known (e.g. ESP8266), else from `default`.
+    '''
+
+    def __init__(self, default=None, esp_limits=None, host_limits=None):
+        self.default = default or UNLIMITED
+        self.esp_limits = esp_limits or {}
+        self.host_limits = host_limits or {}
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, host):
+        '''Return the limiter for host (the host name of an url, without port)'''
+        host = (host or "").lower()
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = HostRateLimiter(*self.host_limits.get(host, self.default))
+                self._limiters[host] = limiter
+            return limiter
+
+    def set_esp_type(self, host, esp_type):
+        '''Use the limits configured for the ESP type of host, unless limits are configured for host itself'''
+        host = (host or "").lower()
+        limit = self.esp_limits.get((esp_type or "").upper())
+        if limit is None or host in self.host_limits:
+            return
+        limiter = self.get(host)
+        if (limiter.rate, limiter.burst, limiter.max_in_flight) != limit:
+            logging.info("%s detected on %s, rate limit %s/s, burst %s, %s in flight", esp_type, host, *limit)
+            limiter.configure(*limit)
+
+    def get_stats(self):
+        '''Return the number of requests which had to wait, per host'''
+        with self._lock:
+            return {host: limiter.waits for host, limiter in self._limiters.items()}
@@ -0,0 +1,39 @@
+'''Reading: the values of one template service, extracted from the response as soon as it arrives'''
+
+# system imports:
+import time
+
+
+class Reading:
+    '''
+    The values a template (HTTP or MQTT) service publishes, without the response they were read from.
+
+    The response is dropped right after the values are extracted, so a service keeps a few numbers
+    between two polls instead of the whole decoded document. A Reading is not modified once created:
+    a new value makes a new Reading, so a Reading handed to another thread stays consistent.
+    '''
+    __slots__ = ("power", "pvyield", "current", "voltage", "dc_voltage", "timestamp", "valid")
+
+    def __init__(self, power, pvyield, current, voltage,  # pylint: disable=too-many-arguments
+                 dc_voltage=None, timestamp=None):
+        self.power = power
+        self.pvyield = pvyield
+        self.current = current
+        self.voltage = voltage
+        self.dc_voltage = dc_voltage
+        self.timestamp = time.time() if timestamp is None else timestamp  # time.time() of the response
+        # False if a value is missing, i.e. its path was not found and has no default
+        self.valid = None not in (power, pvyield, current, voltage)
+
+    @classmethod
+    def from_response(cls, response, accessors):
+        '''Read (power, pvyield, current, voltage) with the PathAccessors of the template from response'''
+        return cls(*[accessor.get(response) for accessor in accessors])
+
+    def get_values(self):
+        '''return (power, pvyield, current, voltage, dc-voltage)'''
+        return (self.power, self.pvyield, self.current, self.voltage, self.dc_voltage)
+
+    def __repr__(self):
+        return (f"Reading(power={self.power!r}, pvyield={self.pvyield!r}, current={self.current!r}, "
+                f"voltage={self.voltage!r}, valid={self.valid})")
@@ -0,0 +1,78 @@
+'''Request coalescing: one in-flight request per (url, auth), shared by all services asking for it'''
+
+# File specific rules
+# pylint: disable=broad-except
+
+# system imports:
+import threading
+import time
+
+
+class _Request:
+    '''One (possibly still running) request and its outcome'''
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.finished_at = None
+        self.ttl = 0.0  # seconds the result is kept after finished_at, the ttl of the caller which sent it
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer:
+    '''
+    Issues only one in-flight request per key and hands its result to every caller.
+
+    Typical case: one Shelly Pro 3EM status call mapped to three templates for L1/L2/L3.
+    Callers arriving while the request is running wait for it, callers arriving up to `ttl`
+    seconds after it finished get the same parsed result. Errors are shared with the callers
+    that waited, but never cached for later callers. With ttl 0 the result is not kept at all
+    once the request is done. Each result expires by the ttl it was fetched with, so a caller with
+    another ttl does not drop the results cached for others.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}
+        self.stats = {"requests": 0, "coalesced": 0}
+
+    def fetch(self, key, func, ttl=0.0):
+        '''Return func() - or the result of an identical request in flight or younger than ttl seconds'''
+        now = time.monotonic()
+        with self._lock:
+            self._remove_expired(now)
+            request = self._requests.get(key)
+            if request is not None and (request.finished_at is None or
+                                        (request.error is None and now - request.finished_at < ttl)):
+                self.stats["coalesced"] += 1
+                is_owner = False
+            else:
+                request = _Request()
+                self._requests[key] = request
+                self.stats["requests"] += 1
+                is_owner = True
+
+        if is_owner:
+            try:
+                request.result = func()
+            except Exception as error:
+                request.error = error
+            finally:
+                with self._lock:
+                    request.finished_at = time.monotonic()
+                    request.ttl = ttl
+                    if (request.error is not None or ttl <= 0) and self._requests.get(key) is request:
+                        del self._requests[key]
+                request.done.set()
+        else:
+            request.done.wait()
+
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _remove_expired(self, now):
+        expired = [key for key, request in self._requests.items()
+                   if request.finished_at is not None and now - request.finished_at >= request.ttl]
+        for key in expired:
+            del self._requests[key]
@@ -0,0 +1,103 @@
+'''Deadline based scheduler which calls update() of each service when its polling interval is due'''
+
+# File specific rules
+# pylint: disable=broad-except
+
+# system imports:
+import heapq
+import itertools
+import logging
+import math
+import random
+import time
+
+
+def _default_get_interval(service):
+    return service.polling_interval
+
+
+def _default_group_key(service):
+    # services of one DTU share the request to it, so they are polled together
+    return (service.host, service.polling_interval)
+
+
+class PollScheduler:
+    '''
+    Calls update() of every service at its own polling interval, using one timer for the next deadline.
+
+    The services are grouped by host and polling interval: the services of one DTU are updated
+    together, so their requests are coalesced into one. The groups are started with evenly spread
+    phase offsets and each deadline gets a random jitter of +/- `jitter` times the interval, so
+    devices with the same interval are not polled in the same instant. Deadlines are kept on the
+    monotonic clock and do not drift with the jitter or the time update() takes. If a group fell
+    behind by more than one interval, missed polls are skipped instead of fired in a burst.
+
+    The interval of a group is the shortest `get_interval(service)` (in ms) of its services, asked
+    anew after each poll, so a service can stretch its interval (see AdaptivePolling).
+    `timeout_add(milliseconds, callback)` arms the timer (e.g. GLib.timeout_add), the callback
+    returns False so each timer fires only once.
+    '''
+
+    def __init__(self, services, timeout_add, jitter=0.05, clock=time.monotonic,
+                 group_key=_default_group_key, get_interval=_default_get_interval, rng=None):
+        self._timeout_add = timeout_add
+        self._get_service_interval = get_interval
+        self.jitter = max(0.0, min(float(jitter), 0.5))
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._queue = []
+        self._sequence = itertools.count()
+        self.wakeups = 0
+
+        groups = {}
+        for service in services:
+            groups.setdefault(group_key(service), []).append(service)
+        self.groups = list(groups.values())
+
+    def start(self):
+        '''Schedule the first poll of every group, spread over its interval'''
+        now = self._clock()
+        for index, group in enumerate(self.groups):
+            interval = self._get_interval(group)
+            base = now + interval * index / len(self.groups)
+            self._push(base, group, interval)
+        self._arm()
+
+    def _get_interval(self, group):
+        return max(min(self._get_service_interval(service) for service in group), 1) / 1000
+
+    def _push(self, base, group, interval):
+        deadline = base + self._rng.uniform(-self.jitter, self.jitter) * interval
+        heapq.heappush(self._queue, (deadline, next(self._sequence), base, group))
+
+    def _arm(self):
+        if not self._queue:
+            return
+        deadline = self._queue[0][0]
+        delay = max(0, math.ceil((deadline - self._clock()) * 1000))
+        self._timeout_add(delay, self._on_timer)
+
+    def _on_timer(self):
+        self.wakeups += 1
+        self.run_due()
+        self._arm()
+        return False  # one shot, _arm() sets the timer for the next deadline
+
+    def run_due(self):
+        '''Update all groups whose deadline passed, returns the number of updated services'''
+        now = self._clock()
+        updated = 0
+        while self._queue and self._queue[0][0] <= now:
+            _deadline, _sequence, base, group = heapq.heappop(self._queue)
+            for service in group:
+                try:
+                    service.update()
+                except Exception as error:
+                    logging.error("Error updating service %s", getattr(service, "customname", service), exc_info=error)
+                updated += 1
+            interval = self._get_interval(group)
+            base += interval
+            if base <= now:
+                base = now + interval  # fell behind (e.g. system suspended): skip the missed polls
+            self._push(base, group, interval)
+        return updated
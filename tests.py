@@ -11,7 +11,7 @@ import constants
 
 # Victron imports:
 from dbus_service import DbusService
-from helpers import get_value_by_path
+from helpers import get_value_by_path, PathAccessor
 
 
 OPENDTU_TEST_DATA_FILE = "docs/opendtu_status.json"
@@ -145,6 +145,12 @@ def test_template_values(test_service):
     test_service.custvoltage = "StatusSNS/ENERGY/Voltage".split("/")
     test_service.custvoltage_default = 99.9
     test_service.custtotal = "StatusSNS/ENERGY/Today".split("/")
+    test_service._template_accessors = (
+        PathAccessor(test_service.custpower, test_service.custpower_default, test_service.custpower_factor),
+        PathAccessor(test_service.custtotal, test_service.custtotal_default, test_service.custtotal_factor),
+        PathAccessor(test_service.custcurrent, test_service.custcurrent_default),
+        PathAccessor(test_service.custvoltage, test_service.custvoltage_default),
+    )
 
     test_data = load_template_tasmota_test_data()
 
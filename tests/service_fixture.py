@@ -0,0 +1,152 @@
+''' Shared fixture of the tests which create DbusService instances: patched config, D-Bus and DTU responses. '''
+
+# file ignores
+# pylint: disable=protected-access
+
+import sys
+import os
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+# Add the parent directory of dbus_opendtu to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+# Mocking the dbus and other dependencies before importing the module to test
+sys.modules['dbus'] = MagicMock()
+sys.modules['vedbus'] = MagicMock()
+
+from dbus_service import DbusService  # noqa pylint: disable=wrong-import-position
+
+
+def mocked_requests_get(url, params=None, **kwargs):  # pylint: disable=unused-argument
+    """
+    Mock function to simulate `requests.Session.get` behavior for specific URLs.
+
+    Args:
+        url (str): The URL to send the GET request to.
+        params (dict, optional): Dictionary of URL parameters to append to the URL.
+        **kwargs: Additional arguments passed to the request.
+
+    Returns:
+        MockResponse: A mock response object with predefined JSON data and status code.
+
+    Raises:
+        requests.exceptions.HTTPError: If the status code of the response is not 200.
+
+    Mocked URLs and their corresponding JSON files:
+        - 'http://localhost/api/live': Returns data from 'ahoy_0.5.93_live.json'.
+        - 'http://localhost/api/inverter/id/0': Returns data from 'ahoy_0.5.93_inverter-id-0.json'.
+        - 'http://localhost/api/inverter/id/1': Returns data from 'ahoy_0.5.93_inverter-id-1.json'.
+        - 'http://localhost/cm?cmnd=STATUS+8': Returns data from 'tasmota_shelly_2pm.json'.
+        - 'http://localhost/api/livedata/status': Returns data from 'opendtu_v24.2.12_livedata_status.json'.
+        - 'http://localhost/api/livedata/status?inv=<serial>': Returns data from 'opendtu_v24.2.12_inverter.json'.
+        - Any other URL: Returns a 404 status code.
+    """
+    class MockResponse:
+        """
+        MockResponse is a mock class to simulate HTTP responses for testing purposes.
+
+        Attributes:
+            json_data (dict): The JSON data to be returned by the mock response.
+            content (bytes): The JSON data as raw response body.
+            status_code (int): The HTTP status code of the mock response.
+
+        Methods:
+            json(): Returns the JSON data of the mock response.
+            raise_for_status(): Raises an HTTPError if the status code is not 200.
+        """
+
+        def __init__(self, json_data, status_code):
+            self.json_data = json_data
+            self.content = json.dumps(json_data).encode("utf-8")
+            self.status_code = status_code
+
+        def json(self):
+            """
+            Returns the JSON data.
+
+            Returns:
+                dict: The JSON data.
+            """
+            return self.json_data
+
+        def raise_for_status(self):
+            """
+            Raises an HTTPError if the HTTP request returned an unsuccessful status code.
+
+            This method checks the status code of the HTTP response. If the status code is not 200,
+            it raises an HTTPError with a message containing the status code.
+
+            Raises:
+                requests.exceptions.HTTPError: If the status code is not 200.
+            """
+            if self.status_code != 200:
+                raise requests.exceptions.HTTPError(f"{self.status_code} Error")
+
+    print("Mock URL: ", url)
+
+    if url == 'http://localhost/api/live':
+        json_file_path = os.path.join(os.path.dirname(__file__), '../docs/ahoy_0.5.93_live.json')
+        with open(json_file_path, 'r', encoding="UTF-8") as file:
+            json_data = json.load(file)
+        return MockResponse(json_data, 200)
+    elif url == 'http://localhost/api/inverter/id/0':
+        json_file_path = os.path.join(os.path.dirname(__file__), '../docs/ahoy_0.5.93_inverter-id-0.json')
+        with open(json_file_path, 'r', encoding="UTF-8") as file:
+            json_data = json.load(file)
+        return MockResponse(json_data, 200)
+    elif url == 'http://localhost/api/inverter/id/1':
+        json_file_path = os.path.join(os.path.dirname(__file__), '../docs/ahoy_0.5.93_inverter-id-1.json')
+        with open(json_file_path, 'r', encoding="UTF-8") as file:
+            json_data = json.load(file)
+        return MockResponse(json_data, 200)
+    elif url == 'http://localhost/cm?cmnd=STATUS+8':
+        json_file_path = os.path.join(os.path.dirname(__file__), '../docs/tasmota_shelly_2pm.json')
+        with open(json_file_path, 'r', encoding="UTF-8") as file:
+            json_data = json.load(file)
+        return MockResponse(json_data, 200)
+    elif url == 'http://localhost/api/livedata/status':
+        json_file_path = os.path.join(os.path.dirname(__file__), '../docs/opendtu_v24.2.12_livedata_status.json')
+        with open(json_file_path, 'r', encoding="UTF-8") as file:
+            json_data = json.load(file)
+        return MockResponse(json_data, 200)
+    elif url.startswith('http://localhost/api/livedata/status?inv='):
+        json_file_path = os.path.join(os.path.dirname(__file__), '../docs/opendtu_v24.2.12_inverter.json')
+        with open(json_file_path, 'r', encoding="UTF-8") as file:
+            json_data = json.load(file)
+        return MockResponse(json_data, 200)
+    return MockResponse(None, 404)
+
+
+class DbusServiceTestCase(unittest.TestCase):
+    '''
+    Base class of tests creating DbusService instances from the dict `config`.
+
+    The DTU requests are answered by `requests_get` (None = a MagicMock without responses), D-Bus is
+    mocked, and the pollers and pushes shared by the services of a DTU are reset before and after each test.
+    '''
+    config = {}
+    requests_get = staticmethod(mocked_requests_get)
+
+    def setUp(self):
+        self.start_patch(patch('dbus_service.DbusService._get_config', return_value=self.config))
+        self.start_patch(patch('dbus_service.dbus'))
+        self.mock_get = self.start_patch(patch('connection_pool.requests.Session.get', side_effect=self.requests_get))
+        DbusService._pollers.clear()
+        self.addCleanup(DbusService._pollers.clear)
+        self.addCleanup(DbusService._opendtu_pushes.clear)
+
+    def start_patch(self, patcher):
+        ''' Start patcher until the end of the test, return its mock '''
+        mock = patcher.start()
+        self.addCleanup(patcher.stop)
+        return mock
+
+    def set_shared(self, name, value):
+        ''' Replace an object shared by all services until the end of the test, e.g. "rate_limiters" '''
+        setter = getattr(DbusService, f"set_{name}")
+        self.addCleanup(setter, getattr(DbusService, f"_{name}"))
+        setter(value)
@@ -0,0 +1,125 @@
+''' This file contains the unit tests for the adaptive polling policy. '''
+
+import sys
+import os
+import datetime
+import random
+import unittest
+
+# Add the parent directory of dbus_opendtu to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+from adaptive_polling import AdaptivePolling, sun_times  # noqa pylint: disable=wrong-import-position
+from scheduler import PollScheduler  # noqa pylint: disable=wrong-import-position
+from tests.test_scheduler import FakeMainLoop  # noqa pylint: disable=wrong-import-position
+
+BERLIN = (52.52, 13.405)
+
+
+def utc(*args):
+    ''' UTC datetime '''
+    return datetime.datetime(*args, tzinfo=datetime.timezone.utc)
+
+
+class TestSunTimes(unittest.TestCase):
+    ''' Test sun_times '''
+
+    def test_berlin(self):
+        ''' Sunrise and sunset in Berlin match the published times within a few minutes '''
+        sunrise, sunset = sun_times(datetime.date(2024, 6, 21), *BERLIN)
+        self.assertLess(abs(sunrise - utc(2024, 6, 21, 2, 43)), datetime.timedelta(minutes=3))
+        self.assertLess(abs(sunset - utc(2024, 6, 21, 19, 33)), datetime.timedelta(minutes=3))
+        sunrise, sunset = sun_times(datetime.date(2024, 12, 21), *BERLIN)
+        self.assertLess(abs(sunrise - utc(2024, 12, 21, 7, 15)), datetime.timedelta(minutes=3))
+        self.assertLess(abs(sunset - utc(2024, 12, 21, 14, 54)), datetime.timedelta(minutes=3))
+
+    def test_polar(self):
+        ''' No sunrise in the polar night, no sunset in the polar day '''
+        self.assertEqual(sun_times(datetime.date(2024, 12, 21), 78.2, 15.6), (None, None))
+        sunrise, sunset = sun_times(datetime.date(2024, 6, 21), 78.2, 15.6)
+        self.assertEqual(sunset - sunrise, datetime.timedelta(days=1))
+
+
+class TestAdaptivePolling(unittest.TestCase):
+    ''' Test the AdaptivePolling class '''
+
+    def test_idle_and_snap_back(self):
+        ''' The interval is stretched after idle_after seconds of 0 W and reset by the first non-zero power '''
+        policy = AdaptivePolling(idle_interval=120, idle_after=600)
+        policy.record(0, 1000)
+        self.assertEqual(policy.get_interval(5000, 1599), 5000)
+        policy.record(0, 1600)
+        self.assertEqual(policy.get_interval(5000, 1600), 120000)
+        policy.record(3.5, 1720)
+        self.assertEqual(policy.get_interval(5000, 1720), 5000)
+
+    def test_unknown_power(self):
+        ''' A missing power value counts as 0 W '''
+        policy = AdaptivePolling(idle_interval=120, idle_after=600)
+        policy.record(None, 1000)
+        self.assertTrue(policy.is_idle(1600))
+
+    def test_disabled(self):
+        ''' idle_interval=0 keeps the interval '''
+        policy = AdaptivePolling()
+        policy.record(0, 0)
+        self.assertFalse(policy.enabled)
+        self.assertEqual(policy.get_interval(5000, 10000), 5000)
+
+    def test_only_at_night(self):
+        ''' With coordinates the interval is only stretched at night and ends before sunrise '''
+        policy = AdaptivePolling(idle_interval=300, idle_after=600, latitude=BERLIN[0], longitude=BERLIN[1])
+        policy.record(0, 0)
+        # cloudy noon: no stretching during the day
+        self.assertEqual(policy.get_interval(5000, 1000, utc(2024, 12, 21, 11, 0)), 5000)
+        # midnight: stretched
+        self.assertEqual(policy.get_interval(5000, 1000, utc(2024, 12, 21, 23, 0)), 300000)
+        # shortly before the fast polling starts 30 minutes before sunrise (07:15): only until then
+        interval = policy.get_interval(5000, 1000, utc(2024, 12, 22, 6, 43))
+        self.assertLess(interval, 300000)
+        self.assertGreater(interval, 5000)
+        self.assertEqual(policy.get_interval(5000, 1000, utc(2024, 12, 22, 6, 50)), 5000)
+
+
+class NightInverter:
+    ''' Service producing from 06:00 to 18:00 '''
+
+    def __init__(self, loop, policy):
+        self.loop = loop
+        self.host = "opendtu"
+        self.polling_interval = 5000
+        self.polling_policy = policy
+        self.polls = 0
+
+    def update(self):
+        ''' Poll and record the power '''
+        self.polls += 1
+        hour = (self.loop.now / 3600) % 24
+        self.polling_policy.record(300 if 6 <= hour < 18 else 0, self.loop.now)
+
+    def get_current_polling_interval(self):
+        ''' Polling interval of the policy '''
+        return self.polling_policy.get_interval(self.polling_interval, self.loop.now)
+
+
+class TestAdaptiveScheduling(unittest.TestCase):
+    ''' Test the policy together with the PollScheduler '''
+
+    def test_night_polls_are_reduced(self):
+        ''' Overnight polls drop by more than 90 %, the first morning poll is at most one idle interval late '''
+        loop = FakeMainLoop()
+        loop.now = 18 * 3600.0
+        inverter = NightInverter(loop, AdaptivePolling(idle_interval=120, idle_after=600))
+        PollScheduler([inverter], timeout_add=loop.timeout_add, jitter=0, clock=loop,
+                      get_interval=NightInverter.get_current_polling_interval, rng=random.Random(1)).start()
+        loop.run_until(30 * 3600.0 - 1)
+
+        fast_polls = 12 * 3600 / 5
+        self.assertLess(inverter.polls, fast_polls * 0.1)
+        self.assertEqual(inverter.get_current_polling_interval(), 120000)
+        loop.run_until(30 * 3600.0 + 120)
+        self.assertEqual(inverter.get_current_polling_interval(), 5000)
+
+
+if __name__ == '__main__':
+    unittest.main()
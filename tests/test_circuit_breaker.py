@@ -0,0 +1,208 @@
+''' This file contains the unit tests for the circuit breaker. '''
+
+# file ignores
+# pylint: disable=protected-access
+
+import sys
+import os
+import random
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+# Add the parent directory of dbus_opendtu to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+# Mocking the dbus and other dependencies before importing the module to test
+sys.modules['dbus'] = MagicMock()
+sys.modules['vedbus'] = MagicMock()
+
+from circuit_breaker import (  # noqa pylint: disable=wrong-import-position
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    CircuitBreaker,
+    CircuitBreakers,
+    CircuitOpenError,
+)
+from dbus_service import DbusService  # noqa pylint: disable=wrong-import-position
+from tests.service_fixture import DbusServiceTestCase  # noqa pylint: disable=wrong-import-position
+
+
+class FakeClock:
+    ''' Monotonic clock set by the test '''
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    ''' Test the CircuitBreaker class '''
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60, max_reset_timeout=200,
+                                      jitter=0, clock=self.clock)
+
+    def failed_request(self):
+        ''' One request which fails '''
+        self.breaker.before_request()
+        self.breaker.record_failure()
+
+    def test_opens_after_threshold(self):
+        ''' Requests are rejected at once after failure_threshold consecutive failures '''
+        self.failed_request()
+        self.failed_request()
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+        self.failed_request()
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_request()
+        self.assertEqual(self.breaker.get_state(),
+                         {"state": STATE_OPEN, "failures": 3, "trips": 1, "rejected": 1, "retry_in": 60.0})
+
+    def test_success_resets_failures(self):
+        ''' Only consecutive failures count '''
+        self.failed_request()
+        self.failed_request()
+        self.breaker.before_request()
+        self.breaker.record_success()
+        self.failed_request()
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+
+    def test_half_open_probe_and_backoff(self):
+        ''' After the pause one probe is sent, each failed probe doubles the pause up to the maximum '''
+        for _ in range(3):
+            self.failed_request()
+        pauses = []
+        for _ in range(3):
+            opened_at = self.clock.now
+            self.clock.now += 59
+            with self.assertRaises(CircuitOpenError):
+                self.breaker.before_request()
+            while self.breaker._open_until > self.clock.now:
+                self.clock.now += 1
+            pauses.append(self.clock.now - opened_at)
+            self.breaker.before_request()
+            self.assertEqual(self.breaker.state, STATE_HALF_OPEN)
+            with self.assertRaises(CircuitOpenError):
+                self.breaker.before_request()  # only one probe at a time
+            self.breaker.record_failure()
+        self.assertEqual(pauses, [60, 120, 200])
+
+        self.clock.now += 200
+        self.breaker.before_request()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.get_state(), {"state": STATE_CLOSED, "failures": 0, "trips": 0, "rejected": 6})
+
+    def test_jitter(self):
+        ''' The pause varies by up to jitter '''
+        pauses = set()
+        for seed in range(10):
+            breaker = CircuitBreaker(failure_threshold=1, reset_timeout=100, jitter=0.1, clock=self.clock,
+                                     rng=random.Random(seed))
+            breaker.record_failure()
+            pauses.add(round(breaker._open_until - self.clock.now, 3))
+        self.assertGreater(len(pauses), 1)
+        self.assertTrue(all(90 <= pause <= 110 for pause in pauses))
+
+    def test_not_sent_releases_probe(self):
+        ''' A probe which was not sent does not block the next one '''
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, jitter=0, clock=self.clock)
+        breaker.record_failure()
+        self.clock.now += 10
+        breaker.before_request()
+        breaker.record_not_sent()
+        breaker.before_request()
+        self.assertEqual(breaker.state, STATE_HALF_OPEN)
+
+
+class TestDbusServiceCircuitBreaker(DbusServiceTestCase):
+    ''' Test that the services of one host share its breaker '''
+
+    config = {
+        "DEFAULT": {"DTU": "opendtu"},
+        "INVERTER0": {"Phase": "L1", "DeviceInstance": "34", "AcPosition": "1", "Host": "localhost"},
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.breakers = CircuitBreakers(failure_threshold=2, reset_timeout=60)
+        self.set_shared("circuit_breakers", self.breakers)
+
+    def test_dead_host_is_not_asked_again(self):
+        ''' After the threshold no request is sent, without any retry or sleep '''
+        service = DbusService("com.victronenergy.pvinverter", 0)
+        service.coalescing_ttl = 0
+        url = "http://localhost/api/livedata/status"
+        with patch('connection_pool.requests.Session.get',
+                   side_effect=requests.exceptions.ConnectTimeout("timed out")) as mock_get, \
+                patch('time.sleep') as mock_sleep:
+            for _ in range(2):
+                with self.assertRaises(requests.exceptions.ConnectTimeout):
+                    service.fetch_url(url)
+            with self.assertRaises(CircuitOpenError):
+                service.fetch_url(url)
+            self.assertEqual(mock_get.call_count, 2)
+            mock_sleep.assert_not_called()
+
+        self.assertEqual(self.breakers.get_states()["localhost"]["state"], STATE_OPEN)
+        service.update()
+        self.assertFalse(service.last_update_successful)
+
+    def test_answering_host_counts_as_success(self):
+        ''' An HTTP error status means the host is up '''
+        service = DbusService("com.victronenergy.pvinverter", 0)
+        service.coalescing_ttl = 0
+        for _ in range(3):
+            with self.assertRaises(requests.exceptions.HTTPError):
+                service.fetch_url("http://localhost/unknown")
+        self.assertEqual(self.breakers.get("localhost").state, STATE_CLOSED)
+
+    def test_server_error_counts_as_failure(self):
+        ''' A 5xx status means the host cannot serve the data, e.g. while it restarts '''
+        service = DbusService("com.victronenergy.pvinverter", 0)
+        service.coalescing_ttl = 0
+        response = MagicMock(status_code=503)
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError("503 Service Unavailable")
+        with patch('connection_pool.requests.Session.get', return_value=response) as mock_get:
+            for _ in range(2):
+                with self.assertRaises(requests.exceptions.HTTPError):
+                    service.fetch_url("http://localhost/api/livedata/status")
+            with self.assertRaises(CircuitOpenError):
+                service.fetch_url("http://localhost/api/livedata/status")
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(self.breakers.get("localhost").state, STATE_OPEN)
+
+    def test_update_backs_off_only_by_the_breaker(self):
+        ''' Updates after the threshold do not send requests, but still count as failures and set the error state '''
+        service = DbusService("com.victronenergy.pvinverter", 0)
+        service.coalescing_ttl = 0
+        service.min_retries_until_fail = 2
+        service.retry_after_seconds = 60
+        with patch('connection_pool.requests.Session.get',
+                   side_effect=requests.exceptions.ConnectTimeout("timed out")) as mock_get:
+            for _ in range(4):
+                service.update()
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(service.failed_update_count, 4)
+        self.assertTrue(service.reset_statuscode_on_next_success)  # zero values and StatusCode 10 were set
+
+    def test_unexpected_error_releases_probe(self):
+        ''' A probe ending with an error other than a request error does not leave the breaker half-open '''
+        service = DbusService("com.victronenergy.pvinverter", 0)
+        service.coalescing_ttl = 0
+        breaker = self.breakers.get("localhost")
+        breaker.state = STATE_HALF_OPEN
+        with patch('connection_pool.requests.Session.get', side_effect=RuntimeError("bug")):
+            with self.assertRaises(RuntimeError):
+                service.fetch_url("http://localhost/api/livedata/status")
+        self.assertTrue(breaker.before_request())  # the next probe is let through
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+''' This file contains the unit tests for the ConnectionPool class. '''
+
+import sys
+import os
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import requests
+
+# Add the parent directory of dbus_opendtu to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+from connection_pool import ConnectionPool  # noqa pylint: disable=wrong-import-position
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    ''' Minimal HTTP/1.1 handler answering every GET with a small JSON document '''
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        ''' Answer with the requested path '''
+        body = json.dumps({"path": self.path}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        ''' Keep the test output clean '''
+
+
+class TestConnectionPool(unittest.TestCase):
+    ''' Test the ConnectionPool class against a local keep-alive HTTP server '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.pool = ConnectionPool(max_sessions=2, idle_timeout=60)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_connection_is_reused(self):
+        ''' Several polls of the same host use one keep-alive connection '''
+        for _ in range(5):
+            response = self.pool.get(self.base_url + "/api/livedata/status", timeout=2)
+            self.assertEqual(response.json(), {"path": "/api/livedata/status"})
+
+        stats = self.pool.get_stats()
+        self.assertEqual(stats["sessions_opened"], 1)
+        self.assertEqual(stats["requests"], 5)
+        self.assertEqual(stats["connections_opened"], 1)
+        self.assertEqual(stats["connections_reused"], 4)
+
+    def test_key_depends_on_host_port_and_auth(self):
+        ''' Sessions are shared per host, port and credentials, not per path '''
+        key = ConnectionPool.get_key("http://dtu/api/live")
+        self.assertEqual(key, ConnectionPool.get_key("http://dtu:80/api/inverter/id/0"))
+        self.assertNotEqual(key, ConnectionPool.get_key("http://dtu:8080/api/live"))
+        self.assertNotEqual(key, ConnectionPool.get_key("http://dtu/api/live", "admin", "secret"))
+        self.assertNotEqual(ConnectionPool.get_key("http://dtu/api/live", "admin", "secret"),
+                            ConnectionPool.get_key("http://dtu/api/live", "admin", "secret", True))
+
+    def test_pool_is_bounded(self):
+        ''' The least recently used session is closed when the pool is full '''
+        for user in ("a", "b", "c"):
+            self.pool.get(self.base_url + "/status", timeout=2, username=user, password="pw")
+
+        stats = self.pool.get_stats()
+        self.assertEqual(stats["sessions_opened"], 3)
+        self.assertEqual(stats["sessions_active"], 2)
+        self.assertEqual(stats["sessions_evicted"], 1)
+
+    def test_idle_sessions_are_evicted(self):
+        ''' Sessions not used within idle_timeout are closed '''
+        self.pool.idle_timeout = 10
+        with patch('connection_pool.time.monotonic', return_value=1000):
+            self.pool.get(self.base_url + "/status", timeout=2)
+        with patch('connection_pool.time.monotonic', return_value=1011):
+            self.pool.get(self.base_url + "/status", timeout=2)
+
+        stats = self.pool.get_stats()
+        self.assertEqual(stats["sessions_opened"], 2)
+        self.assertEqual(stats["sessions_evicted"], 1)
+        self.assertEqual(stats["connections_opened"], 2)
+
+    def test_reconnect_after_reset(self):
+        ''' A reset keep-alive connection is retried once on a fresh session '''
+        self.pool.get(self.base_url + "/status", timeout=2)
+
+        def reset_by_peer(url, timeout):
+            raise requests.exceptions.ConnectionError("Connection reset by peer")
+
+        key = ConnectionPool.get_key(self.base_url)
+        self.pool._sessions[key].session.get = reset_by_peer  # pylint: disable=protected-access
+
+        response = self.pool.get(self.base_url + "/status", timeout=2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.pool.get_stats()["reconnects"], 1)
+
+    def test_no_reconnect_on_fresh_connection(self):
+        ''' A host that is down fails immediately instead of being retried '''
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.pool.get("http://127.0.0.1:1/status", timeout=1)
+        self.assertEqual(self.pool.get_stats()["reconnects"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
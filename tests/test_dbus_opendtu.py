@@ -59,6 +59,7 @@ class TestDbusOpendtu(unittest.TestCase):
         mock_dbus_service.assert_called_once_with(
             servicename="com.victronenergy.pvinverter",
             actual_inverter=0,
+            dtu_number=0,
         )
 
     @patch(
@@ -110,8 +111,8 @@ class TestDbusOpendtu(unittest.TestCase):
         services = get_DbusServices(config)
 
         self.assertEqual(len(services), 2)
-        mock_dbus_service.assert_any_call(servicename="mock_value_0", actual_inverter=0)
-        mock_dbus_service.assert_any_call(servicename="mock_value_1", actual_inverter=1)
+        mock_dbus_service.assert_any_call(servicename="mock_value_0", actual_inverter=0, dtu_number=0)
+        mock_dbus_service.assert_any_call(servicename="mock_value_1", actual_inverter=1, dtu_number=0)
 
     @patch("dbus_opendtu.get_config_value")
     @patch("dbus_opendtu.DbusService")
@@ -138,6 +139,24 @@ class TestDbusOpendtu(unittest.TestCase):
         self.assertIsInstance(services, list)
         self.assertEqual(len(services), 2)
 
+    @patch("dbus_opendtu.get_dtu_services", return_value=[])
+    @patch("dbus_opendtu.DbusService")
+    def test_get_dbus_services_with_two_dtus(self, _mock_dbus_service, mock_get_dtu_services):
+        """ Test that each DTU has its own NumberOfInvertersToQuery, DTU1 does not inherit the one of DEFAULT """
+        config = configparser.ConfigParser()
+        config.read_dict({
+            "DEFAULT": {"DTU": "opendtu", "Host": "192.168.1.10", "NumberOfInvertersToQuery": "1",
+                        "NumberOfDTUs": "3", "NumberOfTemplates": "0"},
+            "DTU1": {"DTU": "ahoy", "Host": "192.168.1.11"},
+            "DTU2": {"DTU": "ahoy", "Host": "192.168.1.12", "NumberOfInvertersToQuery": "2"},
+        })
+
+        get_DbusServices(config)
+
+        self.assertEqual([call.args[1:] for call in mock_get_dtu_services.call_args_list],
+                         [(0, 1), (1, 0), (2, 2)])
+        _mock_dbus_service.set_discovery_cache.assert_called_once_with(None)  # opt-in
+
     @patch("dbus_opendtu.DbusService")
     def test_get_dbus_services_with_no_inverters_or_templates(self, mock_dbus_service):
         """ Test get_DbusServices with no inverters or templates """
@@ -160,6 +179,7 @@ class TestDbusOpendtu(unittest.TestCase):
 
         self.assertEqual(len(services), 0)
         mock_dbus_service.assert_called_once()  # called once to check if there are inverters
+        mock_dbus_service_instance.unregister.assert_called_once()  # and removed from D-Bus again
 
     @patch("dbus_opendtu.DbusService")
     def test_get_config_with_invalid_NumberOfInverter_and_Template_values(self, mock_dbus_service):
@@ -336,12 +356,14 @@ class TestDbusOpendtu(unittest.TestCase):
     @patch('dbus_opendtu.get_config_value')
     @patch('dbus_opendtu.get_DbusServices')
     @patch('dbus_opendtu.sign_of_life_all_services')
-    @patch('dbus_opendtu.update_all_services')
+    @patch('dbus_opendtu.MetricsServer')
+    @patch('dbus_opendtu.PollScheduler')
     @patch('dbus_opendtu.gobject')
     def test_main(
         self,
         mock_gobject,
-        mock_update_all_services,
+        mock_poll_scheduler,
+        mock_metrics_server,
         mock_sign_of_life_all_services,
         mock_get_dbus_services,
         mock_get_config_value,
@@ -370,7 +392,11 @@ class TestDbusOpendtu(unittest.TestCase):
         # Assertions to verify the behavior
         mock_get_config.assert_called_once()
         mock_get_dbus_services.assert_called_once_with(mock_config)
-        mock_update_all_services.assert_called_once_with(mock_services)
+        mock_poll_scheduler.assert_called_once_with(mock_services, timeout_add=mock_gobject.timeout_add, jitter=0.01,
+                                                    get_interval=ANY)
+        mock_poll_scheduler.return_value.start.assert_called_once()
+        mock_metrics_server.assert_called_once_with(1, 1)
+        mock_metrics_server.return_value.start.assert_called_once()
         mock_sign_of_life_all_services.assert_called_once_with(mock_services)
         mock_gobject.MainLoop.assert_called_once()
 
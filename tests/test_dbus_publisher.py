@@ -0,0 +1,93 @@
+''' This file contains the unit tests for the D-Bus publish filter. '''
+
+import sys
+import os
+import unittest
+
+# Add the parent directory of dbus_opendtu to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+from dbus_publisher import PublishFilter, parse_deadbands  # noqa pylint: disable=wrong-import-position
+
+
+class TestParseDeadbands(unittest.TestCase):
+    ''' Test parse_deadbands '''
+
+    def test_absolute_and_relative(self):
+        ''' Absolute values and percentages are parsed '''
+        deadbands = parse_deadbands("/Ac/*Power:1, /Ac/*/Voltage:0.1,/Ac/*/Current:2%")
+        self.assertEqual(deadbands, [
+            ("/Ac/*Power", 1.0, 0.0),
+            ("/Ac/*/Voltage", 0.1, 0.0),
+            ("/Ac/*/Current", 0.0, 0.02),
+        ])
+
+    def test_empty_and_invalid(self):
+        ''' Empty config means no deadbands, invalid entries are ignored '''
+        self.assertEqual(parse_deadbands(""), [])
+        self.assertEqual(parse_deadbands(None), [])
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(parse_deadbands("/Ac/Power, /Ac/L1/Voltage:0.5"), [("/Ac/L1/Voltage", 0.5, 0.0)])
+
+
+class TestPublishFilter(unittest.TestCase):
+    ''' Test the PublishFilter class '''
+
+    def setUp(self):
+        self.publish_filter = PublishFilter(
+            deadbands=parse_deadbands("/Ac/*Power:1, /Ac/*/Voltage:0.1, /Ac/*/Current:5%"),
+            refresh_interval=60)
+
+    def test_first_values_are_published(self):
+        ''' Everything is written the first time '''
+        values = {"/Ac/Power": 100.0, "/StatusCode": 7}
+        self.assertEqual(self.publish_filter.filter(values, 0), values)
+        self.assertEqual(self.publish_filter.suppressed_count, 0)
+
+    def test_unchanged_values_are_skipped(self):
+        ''' Unchanged values are not written again '''
+        self.publish_filter.filter({"/Ac/Power": 100.0, "/StatusCode": 7}, 0)
+        self.assertEqual(self.publish_filter.filter({"/Ac/Power": 100.0, "/StatusCode": 10}, 1),
+                         {"/StatusCode": 10})
+        self.assertEqual(self.publish_filter.suppressed_count, 1)
+
+    def test_absolute_deadband(self):
+        ''' Changes below the absolute deadband are skipped, compared to the last published value '''
+        self.publish_filter.filter({"/Ac/L1/Power": 100.0, "/Ac/L1/Voltage": 230.0}, 0)
+        self.assertEqual(self.publish_filter.filter({"/Ac/L1/Power": 100.5, "/Ac/L1/Voltage": 230.05}, 1), {})
+        self.assertEqual(self.publish_filter.filter({"/Ac/L1/Power": 101.0, "/Ac/L1/Voltage": 230.05}, 2),
+                         {"/Ac/L1/Power": 101.0})
+
+    def test_relative_deadband(self):
+        ''' Percentages are relative to the last published value '''
+        self.publish_filter.filter({"/Ac/L1/Current": 2.0}, 0)
+        self.assertEqual(self.publish_filter.filter({"/Ac/L1/Current": 2.09}, 1), {})
+        self.assertEqual(self.publish_filter.filter({"/Ac/L1/Current": 2.2}, 2), {"/Ac/L1/Current": 2.2})
+
+    def test_paths_without_deadband(self):
+        ''' Any change of a path without deadband is published '''
+        self.publish_filter.filter({"/Ac/Energy/Forward": 1234.5}, 0)
+        self.assertEqual(self.publish_filter.filter({"/Ac/Energy/Forward": 1234.51}, 1),
+                         {"/Ac/Energy/Forward": 1234.51})
+
+    def test_zero_is_always_published(self):
+        ''' Changes to and from 0 ignore the deadband '''
+        self.publish_filter.filter({"/Ac/Power": 0.5}, 0)
+        self.assertEqual(self.publish_filter.filter({"/Ac/Power": 0}, 1), {"/Ac/Power": 0})
+        self.assertEqual(self.publish_filter.filter({"/Ac/Power": 0.5}, 2), {"/Ac/Power": 0.5})
+
+    def test_refresh_interval(self):
+        ''' Values are written again after refresh_interval even if unchanged '''
+        self.publish_filter.filter({"/Ac/Power": 100.0}, 0)
+        self.assertEqual(self.publish_filter.filter({"/Ac/Power": 100.0}, 59), {})
+        self.assertEqual(self.publish_filter.filter({"/Ac/Power": 100.0}, 60), {"/Ac/Power": 100.0})
+
+    def test_forget(self):
+        ''' After forget all values are written again '''
+        self.publish_filter.filter({"/Ac/Power": 100.0}, 0)
+        self.publish_filter.forget()
+        self.assertEqual(self.publish_filter.filter({"/Ac/Power": 100.0}, 1), {"/Ac/Power": 100.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,101 +4,16 @@ import time
 import unittest
 from unittest.mock import MagicMock, patch
 import os
-import json
+import tempfile
+import threading
 import requests
+from adaptive_polling import AdaptivePolling
+from circuit_breaker import CircuitOpenError
 from constants import MODE_TIMEOUT
 from dbus_service import DbusService
-
-
-def mocked_requests_get(url, params=None, **kwargs):  # pylint: disable=unused-argument
-    """
-    Mock function to simulate `requests.get` behavior for specific URLs.
-
-    Args:
-        url (str): The URL to send the GET request to.
-        params (dict, optional): Dictionary of URL parameters to append to the URL.
-        **kwargs: Additional arguments passed to the request.
-
-    Returns:
-        MockResponse: A mock response object with predefined JSON data and status code.
-
-    Raises:
-        requests.exceptions.HTTPError: If the status code of the response is not 200.
-
-    Mocked URLs and their corresponding JSON files:
-        - 'http://localhost/api/live': Returns data from 'ahoy_0.5.93_live.json'.
-        - 'http://localhost/api/inverter/id/0': Returns data from 'ahoy_0.5.93_inverter-id-0.json'.
-        - 'http://localhost/api/inverter/id/1': Returns data from 'ahoy_0.5.93_inverter-id-1.json'.
-        - 'http://localhost/cm?cmnd=STATUS+8': Returns data from 'tasmota_shelly_2pm.json'.
-        - Any other URL: Returns a 404 status code.
-    """
-    class MockResponse:
-        """
-        MockResponse is a mock class to simulate HTTP responses for testing purposes.
-
-        Attributes:
-            json_data (dict): The JSON data to be returned by the mock response.
-            status_code (int): The HTTP status code of the mock response.
-
-        Methods:
-            json(): Returns the JSON data of the mock response.
-            raise_for_status(): Raises an HTTPError if the status code is not 200.
-        """
-
-        def __init__(self, json_data, status_code):
-            self.json_data = json_data
-            self.status_code = status_code
-
-        def json(self):
-            """
-            Returns the JSON data.
-
-            Returns:
-                dict: The JSON data.
-            """
-            return self.json_data
-
-        def raise_for_status(self):
-            """
-            Raises an HTTPError if the HTTP request returned an unsuccessful status code.
-
-            This method checks the status code of the HTTP response. If the status code is not 200,
-            it raises an HTTPError with a message containing the status code.
-
-            Raises:
-                requests.exceptions.HTTPError: If the status code is not 200.
-            """
-            if self.status_code != 200:
-                raise requests.exceptions.HTTPError(f"{self.status_code} Error")
-
-    print("Mock URL: ", url)
-
-    if url == 'http://localhost/api/live':
-        json_file_path = os.path.join(os.path.dirname(__file__), '../docs/ahoy_0.5.93_live.json')
-        with open(json_file_path, 'r', encoding="UTF-8") as file:
-            json_data = json.load(file)
-        return MockResponse(json_data, 200)
-    elif url == 'http://localhost/api/inverter/id/0':
-        json_file_path = os.path.join(os.path.dirname(__file__), '../docs/ahoy_0.5.93_inverter-id-0.json')
-        with open(json_file_path, 'r', encoding="UTF-8") as file:
-            json_data = json.load(file)
-        return MockResponse(json_data, 200)
-    elif url == 'http://localhost/api/inverter/id/1':
-        json_file_path = os.path.join(os.path.dirname(__file__), '../docs/ahoy_0.5.93_inverter-id-1.json')
-        with open(json_file_path, 'r', encoding="UTF-8") as file:
-            json_data = json.load(file)
-        return MockResponse(json_data, 200)
-    elif url == 'http://localhost/cm?cmnd=STATUS+8':
-        json_file_path = os.path.join(os.path.dirname(__file__), '../docs/tasmota_shelly_2pm.json')
-        with open(json_file_path, 'r', encoding="UTF-8") as file:
-            json_data = json.load(file)
-        return MockResponse(json_data, 200)
-    elif url == 'http://localhost/api/livedata/status':
-        json_file_path = os.path.join(os.path.dirname(__file__), '../docs/opendtu_v24.2.12_livedata_status.json')
-        with open(json_file_path, 'r', encoding="UTF-8") as file:
-            json_data = json.load(file)
-        return MockResponse(json_data, 200)
-    return MockResponse(None, 404)
+from discovery_cache import DiscoveryCache
+from request_coalescer import RequestCoalescer
+from tests.service_fixture import mocked_requests_get
 
 
 class TestDbusService(unittest.TestCase):
@@ -129,11 +44,11 @@ class TestDbusService(unittest.TestCase):
     @patch('dbus_service.DbusService._get_config', return_value=myconfig)
     @patch('dbus_service.dbus')
     @patch('dbus_service.logging')
-    @patch('dbus_service.requests.get', side_effect=mocked_requests_get)
+    @patch('connection_pool.requests.Session.get', side_effect=mocked_requests_get)
     def test_init_non_template(self, mock__get_config, mock_dbus, mock_logging, mock_get):
         """ Test fetch_url with custom responses for different URLs """
 
-        DbusService._meter_data = None
+        DbusService._pollers.clear()
         servicename = "com.victronenergy.pvinverter"
         actual_inverter = 0
         istemplate = False
@@ -161,7 +76,7 @@ class TestDbusService(unittest.TestCase):
     @patch('dbus_service.DbusService._get_config', return_value=config_for_test_if_number_of_inverters_are_set)
     @patch('dbus_service.dbus')
     @patch('dbus_service.logging')
-    @patch('dbus_service.requests.get', side_effect=mocked_requests_get)
+    @patch('connection_pool.requests.Session.get', side_effect=mocked_requests_get)
     def test_if_number_of_inverters_are_set(self, mock__get_config, mock_dbus, mock_logging, mock_get):
         """ Test fetch_url with custom responses for different URLs """
 
@@ -189,11 +104,11 @@ class TestDbusService(unittest.TestCase):
     @patch('dbus_service.DbusService._get_config', return_value=config_for_test_if_number_of_inverters_are_set_opendtu)
     @patch('dbus_service.dbus')
     @patch('dbus_service.logging')
-    @patch('dbus_service.requests.get', side_effect=mocked_requests_get)
+    @patch('connection_pool.requests.Session.get', side_effect=mocked_requests_get)
     def test_if_number_of_inverters_are_set_opendtu(self, mock__get_config, mock_dbus, mock_logging, mock_get):
         """ Test fetch_url with custom responses for different URLs """
 
-        DbusService._meter_data = None
+        DbusService._pollers.clear()
         servicename = "com.victronenergy.pvinverter"
         actual_inverter = 0
         istemplate = False
@@ -203,6 +118,154 @@ class TestDbusService(unittest.TestCase):
         self.assertEqual(service.dtuvariant, "opendtu")
         self.assertEqual(service.get_number_of_inverters(), 2)
 
+    @patch('dbus_service.DbusService._get_config', return_value=config_for_test_if_number_of_inverters_are_set)
+    @patch('dbus_service.dbus')
+    @patch('dbus_service.logging')
+    @patch('connection_pool.requests.Session.get', side_effect=mocked_requests_get)
+    def test_ahoy_failed_inverter_keeps_last_data(self, mock__get_config, mock_dbus, mock_logging, mock_get):
+        """ If one Ahoy inverter fails, the other inverters are updated and the last data is kept """
+        DbusService._pollers.clear()
+        service = DbusService("com.victronenergy.pvinverter", 0, False)
+        service.coalescing_ttl = 0
+        last_data_inverter_1 = service._poller.iv_data[1]
+        last_values_inverter_1 = service._poller.snapshot.table.get_values(1)
+
+        def inverter_1_down(url, params=None, **kwargs):
+            if url == 'http://localhost/api/inverter/id/1':
+                raise requests.exceptions.ConnectTimeout("inverter 1 down")
+            return mocked_requests_get(url, params, **kwargs)
+
+        with patch('connection_pool.requests.Session.get', side_effect=inverter_1_down):
+            service._refresh_data()
+
+        self.assertIs(service._poller.iv_data[1], last_data_inverter_1)
+        self.assertEqual(service._poller.snapshot.generation, 2)
+        self.assertEqual(service._poller.snapshot.table.get_values(1), last_values_inverter_1)
+        self.assertTrue(service._poller.snapshot.table.complete)
+
+    @patch('dbus_service.dbus')
+    def test_private_dbus_connection_per_service(self, mock_dbus):
+        """ Each service gets its own private connection, on the session bus as well """
+        with patch.dict(os.environ, {"DBUS_SESSION_BUS_ADDRESS": "unix:path=/tmp/bus"}):
+            DbusService._open_dbus_connection()
+        mock_dbus.SessionBus.assert_called_once_with(private=True)
+        with patch.dict(os.environ, clear=True):
+            DbusService._open_dbus_connection()
+        mock_dbus.SystemBus.assert_called_once_with(private=True)
+
+    def test_ahoy_parallel_requests(self):
+        """ ESP8266 builds of Ahoy are fetched one inverter at a time, unless configured """
+        service = DbusService("testing", 0)
+        service.ahoy_parallel_requests = 0
+        self.assertEqual(service._get_ahoy_parallel_requests({"generic": {"esp_type": "ESP8266"}}), 1)
+        self.assertEqual(service._get_ahoy_parallel_requests({"generic": {"esp_type": "ESP32"}}), 4)
+        self.assertEqual(service._get_ahoy_parallel_requests({}), 4)
+        service.ahoy_parallel_requests = 2
+        self.assertEqual(service._get_ahoy_parallel_requests({"generic": {"esp_type": "ESP8266"}}), 2)
+
+    @patch('dbus_service.DbusService._get_config', return_value=config_for_test_if_number_of_inverters_are_set_opendtu)
+    @patch('dbus_service.dbus')
+    @patch('dbus_service.logging')
+    @patch('connection_pool.requests.Session.get', side_effect=mocked_requests_get)
+    def test_opendtu_inverter_details_fetched_once_per_cycle(self, mock_get, mock_logging, mock_dbus, mock__get_config):
+        """ OpenDTU v24.2.12+: details of all inverters are fetched in the refresh, not per get_values call """
+        DbusService._pollers.clear()
+        self.addCleanup(DbusService._pollers.clear)
+        service = DbusService("com.victronenergy.pvinverter", 0, False)
+        service.coalescing_ttl = 0
+        self.assertFalse(service._poller.details_in_livedata)
+
+        mock_get.reset_mock()
+        service._refresh_data()
+        urls = [call.args[0] for call in mock_get.call_args_list]
+        self.assertEqual(len(urls), 3)  # livedata/status + 2 inverters
+        self.assertEqual(len([url for url in urls if "?inv=" in url]), 2)
+
+        mock_get.reset_mock()
+        (power, pvyield, current, voltage, dc_voltage) = service.get_values_for_inverter()
+        mock_get.assert_not_called()
+        self.assertEqual((power, pvyield, current, voltage, dc_voltage),
+                         (12.10000038, 0.004, 0.050000001, 226.3999939, 31.29999924))
+
+    @patch('dbus_service.DbusService._get_config', return_value=config_for_test_if_number_of_inverters_are_set_opendtu)
+    @patch('dbus_service.dbus')
+    @patch('dbus_service.logging')
+    @patch('connection_pool.requests.Session.get', side_effect=mocked_requests_get)
+    def test_opendtu_firmware_update_is_detected(self, mock_get, mock_logging, mock_dbus, mock__get_config):
+        """ An OpenDTU updated to v24.2.12+ while the service runs: the details are fetched from then on """
+        DbusService._pollers.clear()
+        self.addCleanup(DbusService._pollers.clear)
+        service = DbusService("com.victronenergy.pvinverter", 0, False)
+        service.coalescing_ttl = 0
+        service._poller.details_in_livedata = True  # as detected before the update
+
+        mock_get.reset_mock()
+        service._refresh_data()
+        self.assertEqual(mock_get.call_count, 3)  # livedata/status + 2 inverters
+        self.assertFalse(service._poller.details_in_livedata)
+        self.assertEqual(service.get_values_for_inverter()[0], 12.10000038)
+
+    @patch('dbus_service.DbusService._get_config', return_value=config_for_test_if_number_of_inverters_are_set)
+    @patch('dbus_service.dbus')
+    @patch('dbus_service.logging')
+    def test_start_from_discovery_cache_without_dtu(self, mock_logging, mock_dbus, mock__get_config):
+        """ With a discovery cache the service registers without any HTTP request and revalidates later """
+        tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmp_dir.cleanup)
+        cache = DiscoveryCache(os.path.join(tmp_dir.name, "discovery_cache.json"))
+        cache.update_dtu("ahoy|localhost", number_of_inverters=2, esp_type="ESP32")
+        cache.update_inverter("ahoy|localhost", 0, name="old name", serial="116199999999")
+        DbusService.set_discovery_cache(cache)
+        self.addCleanup(DbusService.set_discovery_cache, None)
+        DbusService._pollers.clear()
+        self.addCleanup(DbusService._pollers.clear)
+
+        dtu_offline = requests.exceptions.ConnectTimeout("DTU offline")
+        with patch('connection_pool.requests.Session.get', side_effect=dtu_offline) as mock_get:
+            service = DbusService("com.victronenergy.pvinverter", 0, False)
+            # no data yet: nothing is fetched on the main loop, update() fetches the first response
+            self.assertFalse(service.is_data_up2date())
+            with self.assertRaises(ValueError):
+                service.get_values_for_inverter()
+            mock_get.assert_not_called()
+        self.assertEqual(service.get_number_of_inverters(), 2)
+        self.assertEqual(service._get_name(), "old name")
+        self.assertEqual(service.polling_interval, 5000)
+
+        # the first live data revalidates the cached metadata
+        service.dry_run = True
+        service.coalescing_ttl = 0
+        with patch('connection_pool.requests.Session.get', side_effect=mocked_requests_get):
+            service._refresh_data()
+            service._publish_refreshed_data()
+        service._dbusservice.__setitem__.assert_any_call("/CustomName", "MC1")
+        self.assertEqual(cache.get_inverter("ahoy|localhost", 0), {"name": "MC1", "serial": "116199999999"})
+
+    @patch('dbus_service.DbusService._get_config', return_value=config_for_test_if_number_of_inverters_are_set_opendtu)
+    @patch('dbus_service.dbus')
+    @patch('dbus_service.logging')
+    def test_cached_details_in_livedata_is_only_a_hint(self, mock_logging, mock_dbus, mock__get_config):
+        """ The cache says the details are in /livedata/status, the response says they are not """
+        tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmp_dir.cleanup)
+        cache = DiscoveryCache(os.path.join(tmp_dir.name, "discovery_cache.json"))
+        cache.update_dtu("opendtu|localhost", number_of_inverters=2, esp_type=None, details_in_livedata=True)
+        cache.update_inverter("opendtu|localhost", 0, name="HM-600", serial="114182940773")
+        DbusService.set_discovery_cache(cache)
+        self.addCleanup(DbusService.set_discovery_cache, None)
+        DbusService._pollers.clear()
+        self.addCleanup(DbusService._pollers.clear)
+
+        with patch('connection_pool.requests.Session.get', side_effect=mocked_requests_get):
+            service = DbusService("com.victronenergy.pvinverter", 0, False)
+            self.assertTrue(service._poller.details_in_livedata)
+            service.dry_run = True
+            service.coalescing_ttl = 0
+            service._refresh_data()
+            service._publish_refreshed_data()
+        self.assertEqual(service.get_values_for_inverter()[0], 12.10000038)
+        self.assertFalse(cache.get_dtu("opendtu|localhost")["details_in_livedata"])
+
     template_config = {
         "DEFAULT": {
             "DTU": "ahoy",
@@ -232,7 +295,7 @@ class TestDbusService(unittest.TestCase):
     @patch('dbus_service.DbusService._get_config', return_value=template_config)
     @patch('dbus_service.dbus')
     @patch('dbus_service.logging')
-    @patch('dbus_service.requests.get', side_effect=mocked_requests_get)
+    @patch('connection_pool.requests.Session.get', side_effect=mocked_requests_get)
     def test_init_template(self,  mock__get_config, mock_dbus,  mock_logging, mock_get):
         # Test the initialization with template servicename
         servicename = "com.victronenergy.inverter"
@@ -246,6 +309,146 @@ class TestDbusService(unittest.TestCase):
         self.assertFalse(service.last_update_successful)
         self.assertIsNotNone(service._dbusservice)
 
+    @patch('dbus_service.DbusService._get_config', return_value=template_config)
+    @patch('dbus_service.dbus')
+    @patch('dbus_service.logging')
+    @patch('connection_pool.requests.Session.get', side_effect=mocked_requests_get)
+    def test_template_without_reading_has_no_data(self, mock_get, mock_logging, mock_dbus, mock__get_config):
+        """ Before the first fetch a template has no data, it is not fetched by reading it """
+        service = DbusService("com.victronenergy.grid", 0, True)
+        service.coalescing_ttl = 0
+        mock_get.reset_mock()
+        self.assertFalse(service.is_data_up2date())
+        mock_get.assert_not_called()
+
+        service._refresh_data()
+        self.assertTrue(service._has_data())
+        self.assertEqual(service.get_values_for_inverter()[3], 235)
+
+    @patch('dbus_service.DbusService._get_config',
+           return_value={"DEFAULT": template_config["DEFAULT"],
+                         "TEMPLATE0": {key: value for key, value in template_config["TEMPLATE0"].items()
+                                       if key != "CUST_Current"}})
+    @patch('dbus_service.dbus')
+    @patch('dbus_service.logging')
+    @patch('connection_pool.requests.Session.get', side_effect=mocked_requests_get)
+    def test_template_without_current(self, mock_get, mock_logging, mock_dbus, mock__get_config):
+        """ An unset CUST_Current is not registered as field of the selective JSON decoder """
+        with patch.object(DbusService, '_json_decoder') as mock_decoder:
+            DbusService("com.victronenergy.grid", 0, True)
+        _url, paths = mock_decoder.add_fields.call_args[0]
+        self.assertEqual(paths, [["StatusSNS", "ENERGY", "Power"], ["StatusSNS", "ENERGY", "Total"],
+                                 ["StatusSNS", "ENERGY", "Voltage"]])
+
+    @patch('dbus_service.DbusService._get_config', return_value=template_config)
+    @patch('dbus_service.dbus')
+    @patch('dbus_service.logging')
+    @patch('connection_pool.requests.Session.get', side_effect=mocked_requests_get)
+    def test_templates_on_same_host_share_one_request(self, mock_get, mock_logging, mock_dbus, mock__get_config):
+        """ Templates polling the same host and API path cause only one HTTP request per cycle """
+        services = [DbusService("com.victronenergy.grid", 0, True) for _ in range(3)]
+        for service in services:
+            service.coalescing_ttl = 10
+
+        mock_get.reset_mock()
+        with patch.object(DbusService, '_request_coalescer', RequestCoalescer()):
+            for service in services:
+                service._refresh_data()
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(services[0].reading.get_values(), services[2].reading.get_values())
+        self.assertEqual(services[2].get_values_for_inverter()[3], 235)
+
+    @patch('dbus_service.DbusService._get_config', return_value=template_config)
+    @patch('dbus_service.dbus')
+    @patch('dbus_service.logging')
+    @patch('connection_pool.requests.Session.get', side_effect=mocked_requests_get)
+    def test_templates_share_the_request_in_flight(self, mock_get, mock_logging, mock_dbus, mock__get_config):
+        """ Without any ttl, a template asking while the request of another one is running waits for it """
+        services = [DbusService("com.victronenergy.grid", 0, True) for _ in range(2)]
+        started, release = threading.Event(), threading.Event()
+
+        def slow_get(url, params=None, **kwargs):
+            started.set()
+            release.wait(5)
+            return mocked_requests_get(url, params, **kwargs)
+
+        coalescer = RequestCoalescer()
+        mock_get.reset_mock()
+        mock_get.side_effect = slow_get
+        with patch.object(DbusService, '_request_coalescer', coalescer):
+            for service in services:
+                service.coalescing_ttl = 0
+            threads = [threading.Thread(target=service._refresh_data) for service in services]
+            threads[0].start()
+            self.assertTrue(started.wait(5))
+            threads[1].start()
+            while coalescer.stats["coalesced"] < 1:
+                threading.Event().wait(0.001)
+            release.set()
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(services[1].get_values_for_inverter()[3], 235)
+
+    @patch('dbus_service.DbusService._get_config', return_value=template_config)
+    @patch('dbus_service.dbus')
+    @patch('dbus_service.logging')
+    @patch('connection_pool.requests.Session.get', side_effect=mocked_requests_get)
+    def test_fetch_without_ttl_keeps_the_cached_templates(self, mock_get, mock_logging, mock_dbus,
+                                                          mock__get_config):
+        """ A fetch with ttl 0 between two templates, e.g. of a DTU, does not expire their shared response """
+        services = [DbusService("com.victronenergy.grid", 0, True) for _ in range(2)]
+        other = DbusService("com.victronenergy.grid", 0, True)
+        other.coalescing_ttl = 0
+
+        mock_get.reset_mock()
+        with patch.object(DbusService, '_request_coalescer', RequestCoalescer()):
+            services[0].coalescing_ttl = services[1].coalescing_ttl = 10
+            services[0]._refresh_data()
+            other.fetch_url("http://localhost/api/live")
+            services[1]._refresh_data()
+
+        self.assertEqual([call[0][0] for call in mock_get.call_args_list],
+                         ["http://localhost/cm?cmnd=STATUS+8", "http://localhost/api/live"])
+
+
+class FakeVeDbusService(dict):
+    """ Mimics velib's VeDbusService: a write sends one signal, all writes within "with" one ItemsChanged """
+
+    class Batch:
+        """ Mimics velib's ServiceContext """
+
+        def __init__(self, parent):
+            self.parent = parent
+            self.changes = {}
+
+        def __getitem__(self, path):
+            return self.parent[path]
+
+        def __setitem__(self, path, value):
+            dict.__setitem__(self.parent, path, value)
+            self.changes[path] = value
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.signals = []
+        self._batches = []
+
+    def __setitem__(self, path, value):
+        super().__setitem__(path, value)
+        self.signals.append({path: value})
+
+    def __enter__(self):
+        self._batches.append(self.Batch(self))
+        return self._batches[-1]
+
+    def __exit__(self, *exc):
+        changes = self._batches.pop().changes
+        if changes:
+            self.signals.append(changes)
+
 
 class ReconnectLogicTest(unittest.TestCase):
     def setUp(self):
@@ -256,7 +459,7 @@ class ReconnectLogicTest(unittest.TestCase):
         })
         self.patcher_dbus = patch('dbus_service.dbus')
         self.patcher_logging = patch('dbus_service.logging')
-        self.patcher_requests = patch('dbus_service.requests.get', side_effect=mocked_requests_get)
+        self.patcher_requests = patch('connection_pool.requests.Session.get', side_effect=mocked_requests_get)
         self.mock_config = self.patcher_config.start()
         self.mock_dbus = self.patcher_dbus.start()
         self.mock_logging = self.patcher_logging.start()
@@ -289,14 +492,14 @@ class ReconnectLogicTest(unittest.TestCase):
         self.assertEqual(self.service.failed_update_count, 3)
         self.service._refresh_data.side_effect = None
 
-    def test_reconnect_pause_after_3_failures(self):
-        """Test that after 3 failures, update() does not call _refresh_data if reconnectAfter time is not over."""
+    def test_reconnect_pause_after_3_failures_is_left_to_the_breaker(self):
+        """Test that after 3 failures, update() still calls _refresh_data, whose request the circuit breaker rejects."""
         self.service.failed_update_count = 3
         self.service.last_update_successful = False
         self.service._last_update = time.time() - (4 * 60)  # less than reconnectAfter
         self.service._refresh_data.reset_mock()
         self.service.update()
-        self.service._refresh_data.assert_not_called()
+        self.service._refresh_data.assert_called_once()
 
     def test_update_allowed_after_reconnect_pause(self):
         """Test that after 3 failures, update() calls _refresh_data if reconnectAfter time is over."""
@@ -307,6 +510,13 @@ class ReconnectLogicTest(unittest.TestCase):
         self.service.update()
         self.service._refresh_data.assert_called_once()
 
+    def test_stale_data_is_recorded_as_idle(self):
+        """Test that updates without up-to-date data stretch the polling interval, e.g. after a start at night."""
+        self.service.polling_policy = AdaptivePolling(idle_interval=120, idle_after=0)
+        self.service.update()
+        self.service.set_dbus_values.assert_not_called()
+        self.assertEqual(self.service.get_current_polling_interval(), 120000)
+
     def test_failed_update_count_reset_on_success(self):
         """Test that failed_update_count is reset to 0 after a successful update."""
         self.service.failed_update_count = 3
@@ -332,6 +542,7 @@ class ReconnectLogicTest(unittest.TestCase):
         self.service._last_update = time.time()
         self.service.retry_after_seconds = 60
         self.service.reset_statuscode_on_next_success = False
+        self.service._refresh_data.side_effect = CircuitOpenError("Circuit breaker open")
         self.service.update()
         self.assertEqual(self.service._dbusservice['/StatusCode'], 10)
         self.assertEqual(self.service._dbusservice['/Ac/Power'], 0)
@@ -353,6 +564,21 @@ class ReconnectLogicTest(unittest.TestCase):
         self.assertEqual(self.service._dbusservice['/StatusCode'], 7)
         self.assertFalse(self.service.reset_statuscode_on_next_success)
 
+    def test_statuscode_error_again_after_recovery(self):
+        """Fail, recover and fail again within the publish refresh interval: StatusCode is 10, 7 and 10 again."""
+        self.service.is_data_up2date = MagicMock(return_value=True)
+        self.service.retry_after_seconds = 60
+        status_codes = []
+        for successful in (False, True, False):
+            self.service.last_update_successful = False
+            self.service.failed_update_count = 0 if successful else 3
+            self.service._last_update = time.time()
+            self.service._refresh_data.side_effect = None if successful else CircuitOpenError("Circuit breaker open")
+            self.service.update()
+            status_codes.append(self.service._dbusservice['/StatusCode'])
+        self.assertEqual(status_codes, [10, 7, 10])
+        self.assertEqual(self.service._dbusservice['/Ac/Power'], 0)
+
     def test_timeout_mode_no_zero_before_timeout(self):
         """If ErrorMode=timeout and error_state_after_seconds=600, before 10min no zero/StatusCode=10 is sent."""
         self.service.error_mode = MODE_TIMEOUT
@@ -429,6 +655,69 @@ class ReconnectLogicTest(unittest.TestCase):
         self.assertEqual(self.service.failed_update_count, 0)
         self.assertTrue(self.service.last_update_successful)
 
+    def test_background_fetch_sets_values_on_completion(self):
+        """With a fetch engine, update() only submits the fetch and values are set when the result is handed back."""
+        submitted = []
+        self.service.fetch_engine = MagicMock()
+        self.service.fetch_engine.submit.side_effect = lambda job, on_done: submitted.append((job, on_done))
+        self.service.last_update_successful = True
+        self.service.dry_run = False
+        self.service.is_data_up2date = MagicMock(return_value=True)
+
+        self.service.update()
+        self.service.update()  # previous fetch still pending, nothing new is submitted
+        self.assertEqual(len(submitted), 1)
+        self.service.set_dbus_values.assert_not_called()
+
+        _job, on_done = submitted[0]
+        on_done(None, None)
+        self.service.set_dbus_values.assert_called_once()
+        self.service._update_index.assert_called_once()
+        self.assertTrue(self.service.last_update_successful)
+        self.assertEqual(self.service.failed_update_count, 0)
+
+    def test_background_fetch_error_counts_as_failure(self):
+        """An error raised in the background fetch is handled like a failed update."""
+        submitted = []
+        self.service.fetch_engine = MagicMock()
+        self.service.fetch_engine.submit.side_effect = lambda job, on_done: submitted.append((job, on_done))
+        self.service.last_update_successful = True
+
+        self.service.update()
+        _job, on_done = submitted[0]
+        on_done(None, requests.exceptions.ConnectionError("Test exception"))
+
+        self.service.set_dbus_values.assert_not_called()
+        self.assertFalse(self.service.last_update_successful)
+        self.assertEqual(self.service.failed_update_count, 1)
+
+    def test_all_writes_of_one_cycle_are_one_signal(self):
+        """All D-Bus writes of one update cycle are sent as one ItemsChanged signal."""
+        self.service._dbusservice = FakeVeDbusService(self.service._dbusservice, **{"/UpdateIndex": 0})
+        self.service.failed_update_count = 3
+        self.service._last_update = time.time()
+        self.service.retry_after_seconds = 60
+        self.service._refresh_data.side_effect = CircuitOpenError("Circuit breaker open")
+        self.service.update()
+        self.assertEqual(self.service._dbusservice.signals, [{
+            "/StatusCode": 10, "/Ac/L1/Voltage": 0, "/Ac/L1/Current": 0, "/Ac/L1/Power": 0, "/Ac/Power": 0}])
+
+        # recovery with a background fetch: status code and update index in one signal
+        submitted = []
+        self.service.fetch_engine = MagicMock()
+        self.service.fetch_engine.submit.side_effect = lambda job, on_done: submitted.append((job, on_done))
+        del self.service._update_index
+        self.service.dry_run = False
+        self.service._last_update = time.time() - 100
+        self.service._refresh_data.side_effect = None
+        self.service.update()
+        submitted[0][1](None, None)
+        self.assertEqual(self.service._dbusservice.signals[1:], [{"/UpdateIndex": 1, "/StatusCode": 7}])
+
+        # writes outside of an update cycle are sent directly
+        self.service._set_dbus_value("/Ac/Power", 5)
+        self.assertEqual(self.service._dbusservice.signals[2:], [{"/Ac/Power": 5}])
+
     def test_config_values_are_read_correctly(self):
         """Test that config values are read and mapped to class attributes correctly."""
         config = {
@@ -0,0 +1,68 @@
+''' This file contains the unit tests for the DiscoveryCache class. '''
+
+import sys
+import os
+import tempfile
+import unittest
+
+# Add the parent directory of dbus_opendtu to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+from discovery_cache import DiscoveryCache  # noqa pylint: disable=wrong-import-position
+
+
+class TestDiscoveryCache(unittest.TestCase):
+    ''' Test the DiscoveryCache class '''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.file_name = os.path.join(self.tmp_dir.name, "discovery_cache.json")
+
+    def test_missing_file_is_empty_cache(self):
+        ''' Without a file there is nothing cached '''
+        cache = DiscoveryCache(self.file_name)
+        self.assertIsNone(cache.get_dtu("opendtu|192.168.1.2"))
+        self.assertIsNone(cache.get_inverter("opendtu|192.168.1.2", 0))
+
+    def test_values_are_persisted(self):
+        ''' Values written by one instance are read by the next one '''
+        cache = DiscoveryCache(self.file_name)
+        cache.update_dtu("ahoy|dtu", number_of_inverters=2, esp_type="ESP8266")
+        cache.update_inverter("ahoy|dtu", 1, name="HM-600", serial="116181234567")
+
+        cache = DiscoveryCache(self.file_name)
+        self.assertEqual(cache.get_dtu("ahoy|dtu"),
+                         {"number_of_inverters": 2, "esp_type": "ESP8266"})
+        self.assertEqual(cache.get_inverter("ahoy|dtu", 1), {"name": "HM-600", "serial": "116181234567"})
+        self.assertIsNone(cache.get_inverter("ahoy|dtu", 0))
+
+    def test_none_is_persisted(self):
+        ''' None is a value as well, e.g. the esp_type of an OpenDTU '''
+        cache = DiscoveryCache(self.file_name)
+        self.assertTrue(cache.update_dtu("opendtu|dtu", number_of_inverters=1, esp_type=None))
+        self.assertEqual(DiscoveryCache(self.file_name).get_dtu("opendtu|dtu"),
+                         {"number_of_inverters": 1, "esp_type": None})
+
+    def test_file_is_only_written_on_change(self):
+        ''' Unchanged values do not write the file again '''
+        cache = DiscoveryCache(self.file_name)
+        self.assertTrue(cache.update_inverter("ahoy|dtu", 0, name="HM-600"))
+        modified = os.stat(self.file_name).st_mtime_ns
+        os.utime(self.file_name, ns=(0, 0))
+
+        self.assertFalse(cache.update_inverter("ahoy|dtu", 0, name="HM-600"))
+        self.assertEqual(os.stat(self.file_name).st_mtime_ns, 0)
+        self.assertNotEqual(modified, 0)
+
+    def test_corrupt_file_is_ignored(self):
+        ''' A broken file must not prevent the start '''
+        with open(self.file_name, "w", encoding="utf-8") as file:
+            file.write("{not json")
+        with self.assertLogs(level="WARNING"):
+            cache = DiscoveryCache(self.file_name)
+        self.assertIsNone(cache.get_dtu("ahoy|dtu"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+''' This file contains the unit tests for the DtuPoller shared by the inverters of a DTU and for several DTUs. '''
+
+# file ignores
+# pylint: disable=protected-access
+
+import sys
+import os
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+# Add the parent directory of dbus_opendtu to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+# Mocking the dbus and other dependencies before importing the module to test
+sys.modules['dbus'] = MagicMock()
+sys.modules['vedbus'] = MagicMock()
+
+from dbus_service import DbusService  # noqa pylint: disable=wrong-import-position
+from dtu_poller import DtuPoller  # noqa pylint: disable=wrong-import-position
+from tests.service_fixture import DbusServiceTestCase, mocked_requests_get  # noqa pylint: disable=wrong-import-position
+
+
+class FakeClock:
+    ''' time.monotonic() stand-in the tests advance '''
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestDtuPoller(unittest.TestCase):
+    ''' Test the poller on its own '''
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.fetch = MagicMock(side_effect=lambda: {"fetch": self.fetch.call_count})
+        self.poller = DtuPoller(self.fetch, clock=self.clock)
+
+    def test_one_fetch_serves_all_subscribers(self):
+        ''' Whichever subscriber comes first fetches, the others get its snapshot '''
+        for order in ([0, 1, 2], [2, 0, 1]):
+            snapshots = [self.poller.poll(subscriber, max_age=5) for subscriber in order]
+            self.assertEqual(len({id(snapshot) for snapshot in snapshots}), 1)
+        self.assertEqual(self.fetch.call_count, 2)
+        self.assertEqual(self.poller.snapshot.generation, 2)
+        self.assertEqual(self.poller.snapshot.meter_data, {"fetch": 2})
+
+    def test_old_result_is_not_reused(self):
+        ''' A result older than max_age is fetched again '''
+        self.poller.poll(0, max_age=5)
+        self.clock.now += 5
+        self.poller.poll(1, max_age=5)
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_failure_is_shared(self):
+        ''' All subscribers get the error of the failed fetch, the snapshot is kept '''
+        first = self.poller.poll(0, max_age=5)
+        self.fetch.side_effect = requests.exceptions.ConnectTimeout("DTU offline")
+        for subscriber in (0, 1):
+            with self.assertRaises(requests.exceptions.ConnectTimeout):
+                self.poller.poll(subscriber, max_age=5)
+        self.assertEqual(self.fetch.call_count, 2)
+        self.assertIs(self.poller.snapshot, first)
+        health = self.poller.get_health()
+        self.assertEqual((health["generation"], health["failed_count"]), (1, 1))
+        self.assertIn("DTU offline", health["last_error"])
+
+    def test_store(self):
+        ''' Stored data, e.g. pushed by the DTU, is a new generation and resets the failure state '''
+        self.fetch.side_effect = requests.exceptions.ConnectTimeout("DTU offline")
+        with self.assertRaises(requests.exceptions.ConnectTimeout):
+            self.poller.poll(0)
+        snapshot = self.poller.store({"pushed": True})
+        self.assertEqual((snapshot.generation, snapshot.meter_data), (1, {"pushed": True}))
+        self.assertEqual(self.poller.get_health()["failed_count"], 0)
+
+    def test_response_is_dropped_if_table_is_complete(self):
+        ''' Without keep_meter_data only the table of a complete snapshot is kept '''
+        table = MagicMock(complete=True)
+        poller = DtuPoller(self.fetch, build_table=lambda meter_data: table, keep_meter_data=False, clock=self.clock)
+        snapshot = poller.poll(0)
+        self.assertIs(snapshot.table, table)
+        self.assertIsNone(snapshot.meter_data)
+
+        table.complete = False  # e.g. an inverter without data: the services read it from the response
+        self.assertEqual(poller.store({"stored": True}).meter_data, {"stored": True})
+        table.complete = True
+        poller.keep_meter_data = True  # e.g. OpenDTU push: the updates are merged into the response
+        self.assertEqual(poller.store({"stored": True}).meter_data, {"stored": True})
+
+    def test_fetch_does_not_block_the_main_loop(self):
+        ''' While a fetch hangs, get_health() and store() return and other subscribers wait for it '''
+        started, release = threading.Event(), threading.Event()
+
+        def slow_fetch():
+            started.set()
+            release.wait(5)
+            return {"fetched": True}
+        poller = DtuPoller(MagicMock(side_effect=slow_fetch), clock=self.clock)
+        results = {}
+        threads = [threading.Thread(target=lambda subscriber=subscriber: results.update(
+            {subscriber: poller.poll(subscriber, max_age=5)})) for subscriber in (0, 1)]
+        threads[0].start()
+        self.assertTrue(started.wait(5))
+        threads[1].start()
+
+        self.assertEqual(poller.get_health()["generation"], 0)
+        self.assertEqual(poller.store({"pushed": True}).generation, 1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(poller.snapshot.generation, 2)
+        self.assertIs(results[0], results[1])
+        self.assertEqual(poller._fetch.call_count, 1)
+
+
+class TestDtuPollerServices(DbusServiceTestCase):
+    ''' Test the inverter services sharing the poller of their DTU '''
+
+    config = {
+        "DEFAULT": {"DTU": "opendtu"},
+        "INVERTER0": {"Phase": "L1", "DeviceInstance": "34", "AcPosition": "1", "Host": "localhost"},
+        "INVERTER1": {"Phase": "L2", "DeviceInstance": "35", "AcPosition": "1", "Host": "localhost"},
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.services = [DbusService("com.victronenergy.pvinverter", number) for number in range(2)]
+        for service in self.services:
+            service.coalescing_ttl = 0
+            service._dbusservice = {"/UpdateIndex": 0}
+
+    def test_update_order_does_not_matter(self):
+        ''' The inverters share one fetch per cycle, also if inverter 1 is updated first '''
+        self.assertIs(self.services[0]._poller, self.services[1]._poller)
+        with patch('connection_pool.requests.Session.get', side_effect=mocked_requests_get) as mock_get:
+            for order in ([0, 1], [1, 0], [1, 0]):
+                mock_get.reset_mock()
+                self.services[order[0]].update()
+                requests_per_cycle = mock_get.call_count
+                self.services[order[1]].update()
+                self.assertEqual(mock_get.call_count, requests_per_cycle)
+                self.assertEqual(self.services[0]._published_generation, self.services[1]._published_generation)
+        self.assertEqual(requests_per_cycle, 3)  # livedata/status + details of 2 inverters
+        for service in self.services:
+            self.assertTrue(service.last_update_successful)
+            self.assertEqual(service._dbusservice["/UpdateIndex"], 3)
+
+    def test_unchanged_snapshot_is_not_published_again(self):
+        ''' A service publishes only when the generation of the snapshot has changed '''
+        service = self.services[0]
+        with patch('connection_pool.requests.Session.get', side_effect=mocked_requests_get):
+            service.update()
+        self.assertFalse(service._store_fetched_data(service._poller.snapshot))
+
+    def test_failure_is_shared(self):
+        ''' If the fetch fails, all inverters fail instead of publishing the old data '''
+        with patch('connection_pool.requests.Session.get',
+                   side_effect=requests.exceptions.ConnectTimeout("DTU offline")) as mock_get:
+            for service in self.services:
+                service.update()
+        self.assertEqual(mock_get.call_count, 1)
+        for service in self.services:
+            self.assertFalse(service.last_update_successful)
+            self.assertEqual(service.failed_update_count, 1)
+            self.assertEqual(service._dbusservice["/UpdateIndex"], 0)
+
+
+
+class TestMultipleDtus(DbusServiceTestCase):
+    ''' Test an OpenDTU and an Ahoy polled by the same process '''
+
+    config = {
+        "DEFAULT": {"DTU": "opendtu", "OpenDTUPush": "1"},
+        "INVERTER0": {"Phase": "L1", "DeviceInstance": "34", "AcPosition": "1", "Host": "localhost"},
+        "DTU1": {"DTU": "ahoy", "Host": "localhost", "OpenDTUPush": "0"},
+        "DTU1.INVERTER0": {"Phase": "L2", "DeviceInstance": "40", "AcPosition": "0"},
+        "DTU1.INVERTER1": {"Phase": "L3", "DeviceInstance": "41", "AcPosition": "0"},
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.opendtu = DbusService("com.victronenergy.pvinverter", 0)
+        self.ahoy = [DbusService("com.victronenergy.pvinverter", number, dtu_number=1) for number in range(2)]
+        for service in [self.opendtu] + self.ahoy:
+            service.coalescing_ttl = 0
+            service._dbusservice = {"/UpdateIndex": 0}
+
+    def test_config_sections(self):
+        ''' The services of DTU1 are configured by the DTU1 and DTU1.INVERTER<n> sections '''
+        self.assertEqual((self.opendtu.dtuvariant, self.opendtu.deviceinstance), ("opendtu", 34))
+        self.assertEqual([(service.dtuvariant, service.deviceinstance, service.pvinverterphase)
+                          for service in self.ahoy], [("ahoy", 40, "L2"), ("ahoy", 41, "L3")])
+        self.assertEqual(self.ahoy[1]._get_name(), "MC1")
+        self.assertEqual(self.opendtu._get_name(), "HM-600")
+        self.assertEqual([service.opendtu_push for service in [self.opendtu] + self.ahoy], [True, False, False])
+
+    def test_isolated_snapshots_and_failures(self):
+        ''' Each DTU has its own snapshot, a failing DTU does not affect the other '''
+        self.assertIs(self.ahoy[0]._poller, self.ahoy[1]._poller)
+        self.assertIsNot(self.opendtu._poller, self.ahoy[0]._poller)
+        self.assertEqual(self.opendtu._get_fleet_table().serial, ("114182940773", "114182000001"))
+        self.assertEqual(len(self.ahoy[0]._get_fleet_table()), 2)
+
+        def ahoy_down(url, params=None, **kwargs):
+            if url.endswith("/api/live") or "/api/inverter/" in url:
+                raise requests.exceptions.ConnectTimeout("Ahoy offline")
+            return mocked_requests_get(url, params, **kwargs)
+
+        with patch('connection_pool.requests.Session.get', side_effect=ahoy_down):
+            for service in [self.opendtu] + self.ahoy:
+                service.update()
+        self.assertTrue(self.opendtu.last_update_successful)
+        self.assertEqual(self.opendtu._poller.get_health()["failed_count"], 0)
+        self.assertEqual([service.last_update_successful for service in self.ahoy], [False, False])
+        self.assertEqual(self.ahoy[0]._poller.get_health()["failed_count"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+''' This file contains the unit tests for the FetchEngine class. '''
+
+import sys
+import os
+import threading
+import unittest
+
+# Add the parent directory of dbus_opendtu to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+from fetch_engine import FetchEngine, run_concurrently  # noqa pylint: disable=wrong-import-position
+
+
+class TestFetchEngine(unittest.TestCase):
+    ''' Test the FetchEngine class '''
+
+    def setUp(self):
+        self.dispatched = []
+        self.dispatched_cond = threading.Condition()
+        self.engine = FetchEngine(max_workers=2, dispatch=self.fake_idle_add)
+
+    def tearDown(self):
+        self.engine.shutdown(wait=True)
+
+    def fake_idle_add(self, callback, *args):
+        ''' Collect the callbacks instead of running them on a GLib mainloop '''
+        with self.dispatched_cond:
+            self.dispatched.append((callback, args))
+            self.dispatched_cond.notify_all()
+
+    def run_mainloop(self, expected=1):
+        ''' Run the dispatched callbacks like the GLib mainloop would do '''
+        with self.dispatched_cond:
+            self.dispatched_cond.wait_for(lambda: len(self.dispatched) >= expected, timeout=1)
+            dispatched = list(self.dispatched)
+            self.dispatched.clear()
+        for callback, args in dispatched:
+            self.assertFalse(callback(*args))
+
+    def test_result_is_dispatched_to_mainloop(self):
+        ''' The job runs in a worker thread, the callback only when the mainloop runs '''
+        results = []
+        worker_threads = []
+
+        def job():
+            worker_threads.append(threading.current_thread())
+            return {"value": 42}
+
+        self.engine.submit(job, lambda result, error: results.append((result, error))).result()
+
+        self.assertNotEqual(worker_threads[0], threading.current_thread())
+        self.assertEqual(results, [])
+        self.run_mainloop()
+        self.assertEqual(results, [({"value": 42}, None)])
+
+    def test_error_is_dispatched_to_mainloop(self):
+        ''' An exception in the job is handed to the callback instead of being raised '''
+        results = []
+
+        def job():
+            raise ValueError("broken")
+
+        self.engine.submit(job, lambda result, error: results.append((result, error)))
+        self.run_mainloop()
+
+        self.assertIsNone(results[0][0])
+        self.assertIsInstance(results[0][1], ValueError)
+
+    def test_slow_job_does_not_block_other_jobs(self):
+        ''' A blocked job must not delay the result of another job '''
+        release = threading.Event()
+        results = []
+
+        slow = self.engine.submit(release.wait, lambda result, error: results.append("slow"))
+        self.engine.submit(lambda: "fast", lambda result, error: results.append(result))
+        self.run_mainloop()
+        self.assertEqual(results, ["fast"])
+
+        release.set()
+        slow.result(timeout=1)
+        self.run_mainloop()
+        self.assertEqual(results, ["fast", "slow"])
+
+    def test_callback_error_is_logged_not_raised(self):
+        ''' A failing callback must not break the mainloop '''
+        def on_done(result, error):
+            raise RuntimeError("callback failed")
+
+        self.engine.submit(lambda: 1, on_done)
+        with self.assertLogs(level="ERROR"):
+            self.run_mainloop()
+
+
+
+class TestRunConcurrently(unittest.TestCase):
+    ''' Test the run_concurrently function '''
+
+    def test_results_keep_order_and_errors(self):
+        ''' Results are returned in order and one error does not stop the others '''
+        def func(item):
+            if item == 2:
+                raise ValueError("inverter 2 failed")
+            return item * 10
+
+        results = run_concurrently(func, [0, 1, 2, 3], max_workers=4)
+
+        self.assertEqual([result for result, _error in results], [0, 10, None, 30])
+        self.assertIsInstance(results[2][1], ValueError)
+
+    def test_calls_run_in_parallel(self):
+        ''' All calls are started before any of them returns '''
+        barrier = threading.Barrier(3, timeout=1)
+        results = run_concurrently(lambda item: barrier.wait() is not None, [0, 1, 2], max_workers=3)
+        self.assertEqual(results, [(True, None)] * 3)
+
+    def test_limit_is_respected(self):
+        ''' Never more than max_workers calls at the same time '''
+        lock = threading.Lock()
+        running = [0, 0]  # current, maximum
+
+        def func(_item):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            threading.Event().wait(0.01)
+            with lock:
+                running[0] -= 1
+
+        run_concurrently(func, range(6), max_workers=2)
+        self.assertLessEqual(running[1], 2)
+
+    def test_empty_list(self):
+        ''' Nothing to do for an empty list '''
+        self.assertEqual(run_concurrently(lambda item: item, [], max_workers=2), [])
+
+    def test_executor_is_reused(self):
+        ''' The calls run on the given pool, no threads are started per call '''
+        engine = FetchEngine(max_workers=2)
+        self.addCleanup(engine.shutdown)
+        threads = set()
+
+        def func(item):
+            threads.add(threading.current_thread().name)
+            threading.Event().wait(0.01)
+            return item
+        for _ in range(3):
+            self.assertEqual(run_concurrently(func, range(4), max_workers=3, executor=engine.executor),
+                             [(item, None) for item in range(4)])
+        self.assertLessEqual(len(threads), 3)  # the two workers of the engine and the calling thread
+
+    def test_busy_executor(self):
+        ''' Called from the only worker of the pool, the calling thread does all the calls itself '''
+        engine = FetchEngine(max_workers=1)
+        self.addCleanup(engine.shutdown)
+        future = engine.executor.submit(run_concurrently, lambda item: item * 2, range(3), 3, engine.executor)
+        self.assertEqual(future.result(timeout=5), [(0, None), (2, None), (4, None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
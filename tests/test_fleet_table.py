@@ -0,0 +1,132 @@
+''' This file contains the unit tests for the FleetTable. '''
+
+# file ignores
+# pylint: disable=protected-access
+
+import sys
+import os
+import json
+import unittest
+from unittest.mock import MagicMock
+
+# Add the parent directory of dbus_opendtu to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+# Mocking the dbus and other dependencies before importing the module to test
+sys.modules['dbus'] = MagicMock()
+sys.modules['vedbus'] = MagicMock()
+
+import constants  # noqa pylint: disable=wrong-import-position
+from dbus_service import DbusService  # noqa pylint: disable=wrong-import-position
+from fleet_table import FleetTable  # noqa pylint: disable=wrong-import-position
+
+
+def read_doc(file_name):
+    ''' Return the decoded docs/<file_name> '''
+    with open(os.path.join(os.path.dirname(__file__), "..", "docs", file_name), encoding="utf-8") as file:
+        return json.load(file)
+
+
+def get_ahoy_data():
+    ''' Ahoy /api/live with the inverter data added, as check_and_enrich_ahoy_data() does '''
+    meter_data = read_doc("ahoy_0.5.93_live.json")
+    meter_data["inverter"] = [read_doc(f"ahoy_0.5.93_inverter-id-{number}.json") for number in range(2)]
+    return meter_data
+
+
+def get_values_from_response(dtuvariant, meter_data, row, useyieldday):
+    ''' The values get_values_for_inverter() reads from the response itself '''
+    service = DbusService("testing", row)
+    service.dtuvariant = dtuvariant
+    service.useyieldday = useyieldday
+    service.set_test_data(meter_data)
+    return service.get_values_for_inverter()
+
+
+class TestFleetTable(unittest.TestCase):
+    ''' Test building and reading the table '''
+
+    def assert_same_values(self, dtuvariant, meter_data, table):
+        ''' Each valid row has the values read from the response '''
+        for row in range(len(table)):
+            for useyieldday in (False, True):
+                self.assertEqual(table.get_values(row, useyieldday),
+                                 get_values_from_response(dtuvariant, meter_data, row, useyieldday))
+
+    def test_opendtu(self):
+        ''' One row per inverter with the values of the response, power and current are 0 when not producing '''
+        meter_data = read_doc("opendtu_status.json")
+        table = FleetTable.from_opendtu(meter_data)
+        self.assertEqual(len(table), 2)
+        self.assertTrue(table.is_valid(0) and table.is_valid(1))
+        self.assertFalse(table.is_valid(2))
+        self.assert_same_values(constants.DTUVARIANT_OPENDTU, meter_data, table)
+        self.assertEqual((table.power[0], table.current[0], table.producing[0]), (0, 0, False))
+        self.assertEqual(table.power[1], 86.59999847)
+        self.assertEqual(table.serial, tuple(inverter["serial"] for inverter in meter_data["inverters"]))
+        self.assertEqual(table.name, ("HM-1500-Balkon", "HM-1500-Garten"))
+        self.assertTrue(table.complete)
+
+    def test_opendtu_v24(self):
+        ''' The yield of OpenDTU v24.2.12 and newer is read from "INV" '''
+        meter_data = read_doc("opendtu_v24.2.12_livedata_status.json")
+        details = read_doc("opendtu_v24.2.12_inverter.json")["inverters"][0]
+        for inverter in meter_data["inverters"]:
+            inverter.update({field: details[field] for field in ("AC", "DC", "INV")})
+        table = FleetTable.from_opendtu(meter_data)
+        self.assertEqual(sum(table.valid), len(meter_data["inverters"]))
+        self.assert_same_values(constants.DTUVARIANT_OPENDTU, meter_data, table)
+
+    def test_ahoy(self):
+        ''' The Ahoy fields are resolved by name, ts_last_success is kept for is_data_up2date() '''
+        meter_data = get_ahoy_data()
+        table = FleetTable.from_ahoy(meter_data)
+        self.assertEqual(len(table), 2)
+        self.assert_same_values(constants.DTUVARIANT_AHOY, meter_data, table)
+        self.assertEqual(table.ts_last_success[1], meter_data["inverter"][1]["ts_last_success"])
+        self.assertEqual(table.esp_type, meter_data["generic"]["esp_type"])
+        self.assertTrue(table.complete)
+
+    def test_ahoy_fields_per_snapshot(self):
+        ''' Each table is read with the field positions of its own response, e.g. two DTUs with different firmware '''
+        meter_data = get_ahoy_data()
+        table = FleetTable.from_ahoy(meter_data)
+        reordered = get_ahoy_data()
+        reordered["ch0_fld_names"] = reordered["ch0_fld_names"][::-1]
+        for inverter in reordered["inverter"]:
+            inverter["ch"][0] = inverter["ch"][0][::-1]
+        reordered_table = FleetTable.from_ahoy(reordered)
+
+        self.assertEqual(reordered_table.get_values(0), table.get_values(0))
+        self.assertEqual(FleetTable.from_ahoy(meter_data).get_values(1), table.get_values(1))
+
+    def test_incomplete_rows_are_invalid(self):
+        ''' A row with missing values is invalid, the other rows are not affected '''
+        meter_data = get_ahoy_data()
+        meter_data["inverter"].insert(0, {})  # gap in the inverter numbers
+        table = FleetTable.from_ahoy(meter_data)
+        self.assertEqual(list(table.valid), [0, 1, 1])
+        self.assertEqual(table.name[0], None)
+        self.assertFalse(table.complete)
+
+        meter_data = read_doc("opendtu_status.json")
+        del meter_data["inverters"][1]["DC"]
+        table = FleetTable.from_opendtu(meter_data)
+        self.assertEqual(list(table.valid), [1, 0])
+
+    def test_totals(self):
+        ''' The totals only add the valid rows '''
+        table = FleetTable(3)
+        table.set_row(0, power=100, yield_total=5, yield_day=0.5, current=0.4, voltage=230, dc_voltage=30,
+                      producing=True, reachable=True)
+        table.set_row(2, power=50, yield_total=7, yield_day=0.25, current=0.2, voltage=231, dc_voltage=31,
+                      producing=True, reachable=True)
+        self.assertEqual(table.get_totals(), {"inverters": 2, "producing": 2, "power": 150, "yield_day": 0.75})
+        with self.assertRaises(ValueError):
+            table.set_row(1, power="n/a", yield_total=0, yield_day=0, current=0, voltage=0, dc_voltage=0,
+                          producing=False, reachable=False)
+        self.assertFalse(table.is_valid(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
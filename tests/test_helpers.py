@@ -5,6 +5,7 @@
 
 import sys
 import os
+import configparser
 import unittest
 from unittest.mock import MagicMock
 import json
@@ -13,9 +14,13 @@ import json
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
 
 from helpers import (
+    AhoyFieldIndex,
     get_config_value,
     get_default_config,
+    get_own_config_value,
     get_value_by_path,
+    get_path_accessor,
+    PathAccessor,
     convert_to_expected_type,
     get_ahoy_field_by_name,
     is_true,
@@ -28,8 +33,6 @@ from helpers import (
 sys.modules['vedbus'] = MagicMock()
 sys.modules['dbus'] = MagicMock()
 sys.modules['gi.repository'] = MagicMock()
-sys.modules['requests'] = MagicMock()
-sys.modules['requests.auth'] = MagicMock()
 
 import dbus_service  # noqa pylint: disable=wrong-import-position
 
@@ -132,6 +135,16 @@ class TestHelpersFunctions(unittest.TestCase):
         with self.assertRaises(ValueError):
             get_config_value(self.config, "not_exist", "INVERTER", 0)
 
+    def test_get_own_config_value(self):
+        ''' Test that get_own_config_value() ignores the values a section inherits from DEFAULT '''
+        config = configparser.ConfigParser()
+        config.read_dict({"DEFAULT": {"Username": "admin", "Host": "dtu0"},
+                          "DTU1": {"Host": "dtu1"}})
+        self.assertEqual(get_own_config_value(config, "DTU1", "Host"), "dtu1")
+        self.assertIsNone(get_own_config_value(config, "DTU1", "Username"))
+        self.assertEqual(get_own_config_value(config, "DTU1", "Password", ""), "")
+        self.assertEqual(get_own_config_value(config, "DEFAULT", "Username"), "admin")
+
     def test_get_default_config(self):
         ''' Test the get_default_config() function. '''
         self.assertEqual(get_default_config(self.config, "Phase", "L1"), "L1")
@@ -145,6 +158,28 @@ class TestHelpersFunctions(unittest.TestCase):
         self.assertEqual(get_value_by_path(meter_data, ["StatusSNS", "ENERGY", "not_there"]), 0)
         self.assertEqual(get_value_by_path(meter_data, ["StatusSNS", "Switch1"]), "ON")
 
+    def test_get_path_accessor(self):
+        ''' The accessor of a path is compiled once and reused for lists and tuples of the same path '''
+        accessor = get_path_accessor(self.custpower, None, 2)
+        self.assertIs(get_path_accessor(tuple(self.custpower), None, 2), accessor)
+        self.assertIsNot(get_path_accessor(self.custpower), accessor)
+        self.assertEqual(accessor.get(meter_data), 380)
+
+    def test_path_accessor(self):
+        ''' Test the PathAccessor class. '''
+        document = {"a": {"0": "dict key", "list": [{"v": "1.5"}, {"v": None}]}}
+        self.assertEqual(PathAccessor(["a", "0"]).get_raw(document), "dict key")
+        self.assertEqual(PathAccessor("a/list/0/v".split("/")).get_raw(document), "1.5")
+        self.assertEqual(PathAccessor(["a", "list", -1, "v"]).get_raw(document), None)
+        self.assertEqual(PathAccessor(["a", "list", "2", "v"]).get_raw(document), 0)
+        self.assertEqual(PathAccessor(["a", "list", "v"]).get_raw(document), 0)
+        self.assertEqual(PathAccessor(["a", "missing", "deeper"]).get_raw(document), 0)
+
+        self.assertEqual(PathAccessor("a/list/0/v".split("/"), None, "2").get(document), 3.0)
+        self.assertEqual(PathAccessor("a/list/1/v".split("/"), "n/a", "2").get(document), "n/a")
+        self.assertEqual(PathAccessor(self.custpower, self.custpower_default, self.custpower_factor).get(meter_data),
+                         190.0)
+
     def test_convert_to_expected_type(self):
         ''' Test the convert_to_expected_type() function. '''
         self.assertEqual(convert_to_expected_type("test", str, "default"), "test")
@@ -168,6 +203,27 @@ class TestHelpersFunctions(unittest.TestCase):
         self.assertEqual(get_ahoy_field_by_name(meter_data_ahoy, 0, "I_DC", False), 1.75)
         self.assertEqual(get_ahoy_field_by_name(meter_data_ahoy, 0, "P_DC", False), 58.1)
 
+    def test_ahoy_field_index(self):
+        ''' The field positions are resolved per response and follow the field names of that response. '''
+        data = {"ch0_fld_names": ["U_AC", "I_AC", "P_AC"], "fld_names": ["U_DC"],
+                "inverter": [{"ch": [[230, 1.5, 345], [33.3]]}]}
+        field_index = AhoyFieldIndex.from_meter_data(data)
+        channels = data["inverter"][0]["ch"]
+        self.assertEqual(field_index.get_ac(channels, "P_AC"), 345)
+        self.assertEqual(field_index.get_dc(channels, "U_DC"), 33.3)
+        self.assertFalse(hasattr(AhoyFieldIndex, "_cache"))  # no state shared between DTUs
+
+        # a firmware update moved P_AC to the front
+        data = {"ch0_fld_names": ["P_AC", "U_AC", "I_AC"], "fld_names": ["U_DC"],
+                "inverter": [{"ch": [[345, 230, 1.5], [33.3]]}]}
+        field_index = AhoyFieldIndex.from_meter_data(data)
+        self.assertEqual(field_index.get_ac(data["inverter"][0]["ch"], "P_AC"), 345)
+        self.assertEqual(get_ahoy_field_by_name(data, 0, "P_AC"), 345)
+        with self.assertRaises(ValueError):
+            field_index.get_ac(data["inverter"][0]["ch"], "YieldDay")
+        with self.assertRaises(ValueError):
+            get_ahoy_field_by_name(data, 0, "YieldDay")
+
     def test_get_ahoy_gap_in_inverter_sequence(self):
         ''' Test the special case when there is a gap in the sequence of inverters IDs.'''
         meter_data_ahoy_bad_sequence = get_ahoy_meterdata(
@@ -0,0 +1,112 @@
+''' This file contains the unit tests for the JSON decoding. '''
+
+import sys
+import os
+import json
+import unittest
+from unittest.mock import patch
+
+# Add the parent directory of dbus_opendtu to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+import constants  # noqa pylint: disable=wrong-import-position
+from helpers import PathAccessor  # noqa pylint: disable=wrong-import-position
+from json_decoder import FieldSelection, JsonDecoder, get_backend_names  # noqa pylint: disable=wrong-import-position
+
+DOCS_DIR = os.path.join(os.path.dirname(__file__), '..', 'docs')
+
+
+def read_doc(file_name):
+    ''' Read a fixture from the docs directory as bytes '''
+    with open(os.path.join(DOCS_DIR, file_name), 'rb') as file:
+        return file.read()
+
+
+class TestFieldSelection(unittest.TestCase):
+    ''' Test the FieldSelection class '''
+
+    def test_dict_keys_and_wildcard(self):
+        ''' Only selected keys are kept, "*" matches all keys '''
+        document = {"a": {"x": 1, "y": 2}, "b": {"x": 3, "y": 4}, "c": 5}
+        self.assertEqual(FieldSelection([["*", "x"], ["c"]]).apply(document),
+                         {"a": {"x": 1}, "b": {"x": 3}, "c": 5})
+
+    def test_list_indices_are_kept(self):
+        ''' Items of a list which are not selected become None, so the indices stay valid '''
+        document = {"Power": [10, 20, 30]}
+        self.assertEqual(FieldSelection([["Power", "1"]]).apply(document), {"Power": [None, 20, None]})
+        self.assertEqual(FieldSelection([["Power", "*"]]).apply(document), {"Power": [10, 20, 30]})
+
+    def test_whole_value_wins(self):
+        ''' Selecting a value as a whole includes all paths below it '''
+        document = {"a": {"x": 1, "y": 2}}
+        self.assertEqual(FieldSelection([["a"], ["a", "x"]]).apply(document), document)
+        self.assertEqual(FieldSelection([["a", "x"], ["a"]]).apply(document), document)
+
+    def test_missing_fields(self):
+        ''' Missing fields are not added and paths through scalars keep the scalar '''
+        self.assertEqual(FieldSelection([["a", "b"], ["c", "d"]]).apply({"c": 1}), {"c": 1})
+
+
+class TestJsonDecoder(unittest.TestCase):
+    ''' Test the JsonDecoder class '''
+
+    def test_backends(self):
+        ''' All installed backends decode the same document, stdlib json is always available '''
+        self.assertIn("json", get_backend_names())
+        content = read_doc("ahoy_0.5.93_live.json")
+        expected = json.loads(content)
+        for backend in get_backend_names():
+            self.assertEqual(JsonDecoder(backend).decode(content), expected)
+
+    def test_unknown_backend(self):
+        ''' An unknown backend falls back to the fastest installed one '''
+        with patch('json_decoder.logging') as mock_logging:
+            decoder = JsonDecoder("does-not-exist")
+        mock_logging.warning.assert_called_once()
+        self.assertEqual(decoder.backend, get_backend_names()[0])
+
+    def test_invalid_json_raises_value_error(self):
+        ''' All backends raise a ValueError for invalid JSON '''
+        for backend in get_backend_names():
+            with self.assertRaises(ValueError):
+                JsonDecoder(backend).decode(b"<html>not json</html>")
+
+    def test_selective_template(self):
+        ''' Only the fields of the registered paths are kept, the accessors still find their values '''
+        url = "http://localhost/cm?cmnd=STATUS+8"
+        accessors = [PathAccessor("StatusSNS/ENERGY/Power/0".split("/")),
+                     PathAccessor("StatusSNS/ENERGY/Total".split("/"))]
+        decoder = JsonDecoder(selective=True)
+        decoder.add_fields(url, [accessor.path for accessor in accessors])
+
+        content = read_doc("tasmota_shelly_2pm.json")
+        document = decoder.decode(content, url)
+        self.assertEqual(list(document), ["StatusSNS"])
+        self.assertEqual(list(document["StatusSNS"]["ENERGY"]), ["Power", "Total"])
+        full_document = json.loads(content)
+        for accessor in accessors:
+            self.assertEqual(accessor.get(document), accessor.get(full_document))
+
+        # other urls and a decoder without selection return the whole document
+        self.assertEqual(decoder.decode(content, "http://otherhost/cm?cmnd=STATUS+8"), full_document)
+        self.assertEqual(JsonDecoder().decode(content, url), full_document)
+
+    def test_selective_opendtu(self):
+        ''' The OpenDTU fields keep the values read by the services, for the status and per inverter url '''
+        decoder = JsonDecoder(selective=True)
+        decoder.add_fields("http://localhost/api/livedata/status", constants.OPENDTU_LIVEDATA_FIELDS)
+
+        content = read_doc("opendtu_v24.2.12_inverter.json")
+        document = decoder.decode(content, "http://localhost/api/livedata/status?inv=114100000001")
+        inverter = document["inverters"][0]
+        full_inverter = json.loads(content)["inverters"][0]
+        self.assertEqual(set(inverter), {"serial", "name", "producing", "reachable", "AC", "DC", "INV"})
+        self.assertEqual(inverter["AC"]["0"]["Power"], full_inverter["AC"]["0"]["Power"])
+        self.assertEqual(inverter["DC"]["0"]["Voltage"], full_inverter["DC"]["0"]["Voltage"])
+        self.assertEqual(inverter["INV"]["0"]["YieldTotal"], full_inverter["INV"]["0"]["YieldTotal"])
+        self.assertEqual(list(inverter["DC"]["0"]), ["Voltage"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+''' This file contains the unit tests for the metrics and their /metrics endpoint. '''
+
+# file ignores
+# pylint: disable=protected-access
+
+import sys
+import os
+import unittest
+import urllib.error
+import urllib.request
+from unittest.mock import MagicMock, patch
+
+import requests
+
+# Add the parent directory of dbus_opendtu to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+# Mocking the dbus and other dependencies before importing the module to test
+sys.modules['dbus'] = MagicMock()
+sys.modules['vedbus'] = MagicMock()
+
+import metrics  # noqa pylint: disable=wrong-import-position
+from circuit_breaker import CircuitBreakers  # noqa pylint: disable=wrong-import-position
+from dbus_service import DbusService  # noqa pylint: disable=wrong-import-position
+from metrics import MetricsRegistry, MetricsServer  # noqa pylint: disable=wrong-import-position
+from tests.service_fixture import DbusServiceTestCase  # noqa pylint: disable=wrong-import-position
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    ''' Test the Prometheus text format '''
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter(self):
+        ''' One line per label combination, label values are escaped '''
+        counter = self.registry.counter("errors_total", "Errors", ("host", "type"))
+        counter.inc(host="ahoy", type="ConnectTimeout")
+        counter.inc(2, host='a"b', type="X")
+        self.assertEqual(counter.get(host="ahoy", type="ConnectTimeout"), 1)
+        self.assertEqual(self.registry.render(),
+                         "# HELP errors_total Errors\n"
+                         "# TYPE errors_total counter\n"
+                         'errors_total{host="a\\"b",type="X"} 2\n'
+                         'errors_total{host="ahoy",type="ConnectTimeout"} 1\n')
+        with self.assertRaises(ValueError):
+            counter.inc(host="ahoy")
+
+    def test_histogram(self):
+        ''' Buckets are cumulative and end with +Inf '''
+        histogram = self.registry.histogram("fetch_seconds", "Fetch", ("host",), buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, host="dtu")
+        with histogram.time(host="dtu"):
+            pass
+        self.assertEqual(histogram.get_count(host="dtu"), 5)
+        lines = self.registry.render().splitlines()
+        self.assertEqual(lines[2:], [
+            'fetch_seconds_bucket{host="dtu",le="0.1"} 3',
+            'fetch_seconds_bucket{host="dtu",le="1.0"} 4',
+            'fetch_seconds_bucket{host="dtu",le="+Inf"} 5',
+            lines[5],
+            'fetch_seconds_count{host="dtu"} 5',
+        ])
+        self.assertTrue(lines[5].startswith('fetch_seconds_sum{host="dtu"} 3.65'))
+
+
+class TestMetricsServer(unittest.TestCase):
+    ''' Scrape the endpoint like Prometheus does '''
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.registry.counter("probes_total", "Probes").inc()
+        self.server = MetricsServer(0, registry=self.registry)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.url = f"http://127.0.0.1:{self.server.port}"
+
+    def test_scrape(self):
+        ''' /metrics serves the text format, other paths are not found '''
+        with urllib.request.urlopen(f"{self.url}/metrics", timeout=5) as response:
+            self.assertEqual(response.headers["Content-Type"], metrics.CONTENT_TYPE)
+            self.assertEqual(response.read().decode(), self.registry.render())
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            urllib.request.urlopen(f"{self.url}/other", timeout=5)  # pylint: disable=consider-using-with
+        self.assertEqual(context.exception.code, 404)
+
+
+class TestDbusServiceMetrics(DbusServiceTestCase):
+    ''' Test the metrics recorded by the DbusService '''
+
+    config = {
+        "DEFAULT": {"DTU": "opendtu"},
+        "INVERTER0": {"Phase": "L1", "DeviceInstance": "34", "AcPosition": "1", "Host": "localhost"},
+    }
+    labels = {"host": "localhost", "dtu": "opendtu", "instance": "34"}
+
+    def setUp(self):
+        super().setUp()
+        self.set_shared("circuit_breakers", CircuitBreakers(failure_threshold=2, reset_timeout=0, jitter=0))
+        self.service = DbusService("com.victronenergy.pvinverter", 0)
+        self.service.coalescing_ttl = 0
+        self.service._dbusservice = {"/UpdateIndex": 0}
+
+    def test_update_cycle(self):
+        ''' An update records the fetch, decode, publish and cycle latencies and the skipped writes '''
+        histograms = (metrics.FETCH_SECONDS, metrics.DECODE_SECONDS, metrics.PUBLISH_SECONDS, metrics.CYCLE_SECONDS)
+        before = [histogram.get_count(**self.labels) for histogram in histograms]
+        skipped = metrics.DBUS_WRITES_SKIPPED.get(**self.labels)
+
+        self.service.update()
+        self.service.update()
+
+        self.assertTrue(self.service.last_update_successful)
+        after = [histogram.get_count(**self.labels) for histogram in histograms]
+        self.assertTrue(all(count > 0 for count in (a - b for a, b in zip(after, before))))
+        self.assertEqual(after[3] - before[3], 2)
+        # the second update has the same values, they are not written again
+        self.assertGreater(metrics.DBUS_WRITES_SKIPPED.get(**self.labels), skipped)
+
+    def test_errors_probes_and_trips(self):
+        ''' Errors are counted by type, the breaker trips and the probe after its pause are counted '''
+        def counts():
+            return (metrics.FETCH_ERRORS.get(type="ConnectTimeout", **self.labels),
+                    metrics.FETCH_ERRORS.get(type="CircuitOpenError", **self.labels),
+                    metrics.BREAKER_TRIPS.get(**self.labels),
+                    metrics.FETCH_RETRIES.get(**self.labels))
+        before = counts()
+        url = "http://localhost/api/livedata/status"
+        with patch('connection_pool.requests.Session.get',
+                   side_effect=requests.exceptions.ConnectTimeout("timed out")):
+            for _ in range(3):  # reset_timeout=0: the third request is the probe
+                with self.assertRaises(requests.exceptions.ConnectTimeout):
+                    self.service.fetch_url(url)
+        self.assertEqual([a - b for a, b in zip(counts(), before)], [3, 0, 2, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,243 @@
+''' This file contains the unit tests for the MQTT source. '''
+
+# file ignores
+# pylint: disable=protected-access
+
+import sys
+import os
+import json
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add the parent directory of dbus_opendtu to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+# Mocking the dbus and other dependencies before importing the module to test
+sys.modules['dbus'] = MagicMock()
+sys.modules['vedbus'] = MagicMock()
+
+from dbus_service import DbusService  # noqa pylint: disable=wrong-import-position
+from mqtt_source import MqttSource, parse_topic_spec  # noqa pylint: disable=wrong-import-position
+from reading import Reading  # noqa pylint: disable=wrong-import-position
+from tests.service_fixture import DbusServiceTestCase  # noqa pylint: disable=wrong-import-position
+
+DOCS_DIR = os.path.join(os.path.dirname(__file__), '..', 'docs')
+
+
+class FakeMqttMessage:
+    ''' Message as passed to on_message by paho-mqtt '''
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+class FakeMqttClient:
+    ''' In-process stand-in for the paho-mqtt client and its broker '''
+
+    def __init__(self):
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_message = None
+        self.credentials = None
+        self.address = None
+        self.subscriptions = []
+        self.running = False
+
+    def username_pw_set(self, username, password):
+        ''' Store the credentials '''
+        self.credentials = (username, password)
+
+    def connect_async(self, host, port, keepalive):  # pylint: disable=unused-argument
+        ''' Remember the broker address, the connection is made in loop_start() '''
+        self.address = (host, port)
+
+    def loop_start(self):
+        ''' "Connect" to the broker '''
+        self.running = True
+        self.on_connect(self, None, {}, 0)
+
+    def loop_stop(self):
+        ''' Stop the network loop '''
+        self.running = False
+
+    def disconnect(self):
+        ''' Disconnect from the broker '''
+        self.on_disconnect(self, None, 0)
+
+    def subscribe(self, topic):
+        ''' Subscribe to a topic '''
+        self.subscriptions.append(topic)
+
+    def publish(self, topic, payload):
+        ''' A message from the broker, delivered if subscribed '''
+        if topic in self.subscriptions:
+            self.on_message(self, None, FakeMqttMessage(topic, payload))
+
+
+class TestParseTopicSpec(unittest.TestCase):
+    ''' Test parse_topic_spec '''
+
+    def test_parse(self):
+        ''' Topic with and without path in the JSON payload '''
+        self.assertEqual(parse_topic_spec("solar/114182940773/0/power"), ("solar/114182940773/0/power", []))
+        self.assertEqual(parse_topic_spec(" tele/shelly/SENSOR#ENERGY/Power/0 "),
+                         ("tele/shelly/SENSOR", ["ENERGY", "Power", "0"]))
+        self.assertEqual(parse_topic_spec(""), ("", []))
+
+
+class TestMqttSource(unittest.TestCase):
+    ''' Test the MqttSource class '''
+
+    def setUp(self):
+        self.client = FakeMqttClient()
+        self.source = MqttSource("broker", 1884, "user", "secret", client_factory=lambda: self.client)
+        self.received = []
+
+    def callback(self, topic, value):
+        ''' Collects the messages '''
+        self.received.append((topic, value))
+
+    def test_subscribe_and_receive(self):
+        ''' Topics are subscribed on connect, payloads are decoded once per message '''
+        self.source.subscribe("solar/1/0/power", self.callback)
+        self.source.start()
+        self.assertEqual(self.client.address, ("broker", 1884))
+        self.assertEqual(self.client.credentials, ("user", "secret"))
+        self.assertEqual(self.client.subscriptions, ["solar/1/0/power"])
+
+        self.source.subscribe("solar/1/status/producing", self.callback)
+        self.client.publish("solar/1/0/power", b"123.4")
+        self.client.publish("solar/1/status/producing", b"ON")
+        self.client.publish("solar/2/0/power", b"99")
+        self.assertEqual(self.received, [("solar/1/0/power", 123.4), ("solar/1/status/producing", "ON")])
+        self.assertEqual(self.source.messages, 2)
+
+    def test_dispatch_and_resubscribe(self):
+        ''' Messages go through dispatch, a reconnect subscribes all topics again '''
+        dispatched = []
+        source = MqttSource("broker", client_factory=lambda: self.client,
+                            dispatch=lambda *args: dispatched.append(args))
+        source.subscribe("tele/shelly/SENSOR", self.callback)
+        source.start()
+        self.client.publish("tele/shelly/SENSOR", b'{"ENERGY": {"Power": 5}}')
+        self.assertEqual(self.received, [])
+        function, *args = dispatched[0]
+        self.assertFalse(function(*args))
+        self.assertEqual(self.received, [("tele/shelly/SENSOR", {"ENERGY": {"Power": 5}})])
+
+        self.client.on_connect(self.client, None, {}, 0)
+        self.assertEqual(self.client.subscriptions, ["tele/shelly/SENSOR", "tele/shelly/SENSOR"])
+
+    def test_missing_paho(self):
+        ''' Without paho-mqtt and without client factory start() explains what to install '''
+        with patch('mqtt_source.paho_mqtt', None):
+            with self.assertRaises(ImportError):
+                MqttSource("broker").start()
+
+
+class TestMqttTemplate(DbusServiceTestCase):
+    ''' Test a template with Source=mqtt '''
+
+    config = {
+        "DEFAULT": {"DTU": "template", "MqttHost": "broker", "MinRetriesUntilFail": "1"},
+        "TEMPLATE0": {
+            "Source": "mqtt",
+            "CUST_SN": "12345678",
+            "CUST_Total": "tele/shelly/SENSOR#StatusSNS/ENERGY/Total",
+            "CUST_Total_Mult": "1",
+            "CUST_Power": "tele/shelly/SENSOR#StatusSNS/ENERGY/Power/0",
+            "CUST_Power_Mult": "1",
+            "CUST_Voltage": "tele/shelly/SENSOR#StatusSNS/ENERGY/Voltage",
+            "CUST_Current": "tele/shelly/current",
+            "CUST_Current_Default": "0",
+            "Phase": "L1",
+            "DeviceInstance": "47",
+            "AcPosition": "1",
+            "Name": "Tasmota via MQTT",
+        },
+    }
+
+    requests_get = None  # no HTTP requests expected
+
+    def setUp(self):
+        super().setUp()
+        self.service = DbusService("com.victronenergy.pvinverter", 0, istemplate=True)
+        self.service._dbusservice = {"/UpdateIndex": 0}
+        self.client = FakeMqttClient()
+        self.source = MqttSource("broker", client_factory=lambda: self.client)
+        self.service.subscribe_mqtt(self.source)
+        self.source.start()
+
+    def test_values_are_published_on_message(self):
+        ''' Each message publishes the values at once, without any HTTP request '''
+        self.assertEqual(self.service.dtuvariant, "mqtt")
+        self.assertEqual(self.client.subscriptions, ["tele/shelly/SENSOR", "tele/shelly/current"])
+
+        with open(os.path.join(DOCS_DIR, "tasmota_shelly_2pm.json"), "rb") as file:
+            self.client.publish("tele/shelly/SENSOR", file.read())
+        self.assertEqual(self.service._dbusservice["/Ac/Power"], 160.0)
+        self.assertEqual(self.service._dbusservice["/Ac/L1/Voltage"], 235.0)
+        self.assertEqual(self.service._dbusservice["/Ac/L1/Current"], "0")  # default until published
+
+        self.client.publish("tele/shelly/current", b"1.36")
+        self.assertEqual(self.service._dbusservice["/Ac/L1/Current"], 1.36)
+        self.assertEqual(self.service._dbusservice["/UpdateIndex"], 2)
+
+        self.service.update()
+        self.assertTrue(self.service.last_update_successful)
+        self.mock_get.assert_not_called()
+
+    def test_no_messages_is_an_error(self):
+        ''' Before the first message there is no data yet, without messages for MaxAgeTsLastSuccess it is an error '''
+        self.service.update()
+        self.assertTrue(self.service.last_update_successful)
+        self.assertNotIn("/Ac/Power", self.service._dbusservice)  # nothing published yet
+
+        with open(os.path.join(DOCS_DIR, "tasmota_shelly_2pm.json"), "rb") as file:
+            self.client.publish("tele/shelly/SENSOR", file.read())
+        self.assertEqual(self.service._dbusservice["/Ac/Power"], 160.0)
+
+        self.service._mqtt_last_message = time.monotonic() - 601
+        self.service.update()
+        self.assertFalse(self.service.last_update_successful)
+        self.service.update()
+        self.assertEqual(self.service._dbusservice["/StatusCode"], 10)
+
+        self.client.publish("tele/shelly/current", json.dumps(0.5).encode())
+        self.assertEqual(self.service._dbusservice["/StatusCode"], 7)
+
+    def test_incomplete_or_old_reading_is_not_published(self):
+        ''' A value without message and default, or a reading older than MaxAgeTsLastSuccess, is not published '''
+        self.client.publish("tele/shelly/current", json.dumps(0.5).encode())
+        self.assertFalse(self.service.reading.valid)  # no voltage yet
+        self.assertNotIn("/Ac/L1/Current", self.service._dbusservice)
+
+        self.client.publish("tele/shelly/SENSOR", json.dumps({"StatusSNS": {"ENERGY": {"Voltage": 230}}}).encode())
+        self.assertEqual(self.service._dbusservice["/Ac/L1/Current"], 0.5)
+
+        self.service.reading = Reading(*self.service.reading.get_values()[:4], timestamp=time.time() - 601)
+        self.assertFalse(self.service.is_data_up2date())
+
+    def test_burst_of_messages_is_published_once(self):
+        ''' The messages queued on the main loop are published together, in one update cycle '''
+        queued = []
+        self.service.subscribe_mqtt(MqttSource("broker"), dispatch=lambda callback: queued.append(callback))
+        self.service._on_mqtt_message("tele/shelly/current", 1.36)
+        self.service._on_mqtt_message("tele/shelly/SENSOR",
+                                      {"StatusSNS": {"ENERGY": {"Power": [160.0], "Voltage": 235.0}}})
+        self.assertEqual(len(queued), 1)
+        self.assertNotIn("/Ac/Power", self.service._dbusservice)
+
+        self.assertFalse(queued.pop()())
+        self.assertEqual(self.service._dbusservice["/Ac/Power"], 160.0)
+        self.assertEqual(self.service._dbusservice["/Ac/L1/Current"], 1.36)
+        self.assertEqual(self.service._dbusservice["/UpdateIndex"], 1)
+
+        # the next message is published again
+        self.service._on_mqtt_message("tele/shelly/current", 1.5)
+        self.assertEqual(len(queued), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,229 @@
+''' This file contains the unit tests for the OpenDTU push mode and its WebSocket client. '''
+
+# file ignores
+# pylint: disable=protected-access
+
+import sys
+import os
+import base64
+import copy
+import hashlib
+import json
+import socketserver
+import struct
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add the parent directory of dbus_opendtu to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+# Mocking the dbus and other dependencies before importing the module to test
+sys.modules['dbus'] = MagicMock()
+sys.modules['vedbus'] = MagicMock()
+
+from dbus_service import DbusService  # noqa pylint: disable=wrong-import-position
+from opendtu_push import OpenDtuPush, merge_livedata  # noqa pylint: disable=wrong-import-position
+from websocket_client import WEBSOCKET_GUID, WebSocketClient  # noqa pylint: disable=wrong-import-position
+from tests.service_fixture import DbusServiceTestCase  # noqa pylint: disable=wrong-import-position
+
+DOCS_DIR = os.path.join(os.path.dirname(__file__), '..', 'docs')
+
+
+def read_doc(file_name):
+    ''' Read a fixture from the docs directory '''
+    with open(os.path.join(DOCS_DIR, file_name), 'r', encoding="UTF-8") as file:
+        return json.load(file)
+
+
+def pushed_inverter(serial, power):
+    ''' An OpenDTU /livedata message for one inverter, based on the per-inverter fixture '''
+    message = read_doc("opendtu_v24.2.12_inverter.json")
+    message["inverters"][0]["serial"] = serial
+    message["inverters"][0]["reachable"] = True
+    message["inverters"][0]["AC"]["0"]["Power"]["v"] = power
+    return message
+
+
+def frame(opcode, payload, fin=True):
+    ''' Unmasked server frame '''
+    header = bytes([(0x80 if fin else 0) | opcode])
+    if len(payload) < 126:
+        header += bytes([len(payload)])
+    else:
+        header += bytes([126]) + struct.pack("!H", len(payload))
+    return header + payload
+
+
+class StandInHandler(socketserver.StreamRequestHandler):
+    ''' WebSocket stand-in for OpenDTU: replays the frames of the server after the handshake '''
+
+    def handle(self):
+        headers = {}
+        self.rfile.readline()  # request line
+        while True:
+            line = self.rfile.readline().decode("iso-8859-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        self.server.requests.append(headers)
+        accept = base64.b64encode(hashlib.sha1(
+            (headers["sec-websocket-key"] + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+        self.wfile.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                          f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode("ascii"))
+        for data in self.server.frames:
+            self.wfile.write(data)
+            self.wfile.flush()
+        # read what the client sends (pong, close) until it closes the connection
+        while True:
+            first_bytes = self.rfile.read(2)
+            if len(first_bytes) < 2:
+                break
+            length = first_bytes[1] & 0x7F
+            payload = bytes(self.rfile.read(4 + length))
+            mask, payload = payload[:4], payload[4:]
+            payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+            self.server.received.append((first_bytes[0] & 0x0F, payload))
+            if first_bytes[0] & 0x0F == 0x8:
+                break
+        self.server.closed.set()
+
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    ''' Local WebSocket server '''
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, frames):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.frames = frames
+        self.requests = []
+        self.received = []
+        self.closed = threading.Event()  # set once the client closed the connection
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def address(self):
+        ''' host:port of the server '''
+        return f"127.0.0.1:{self.server_address[1]}"
+
+    def stop(self):
+        ''' Stop the server '''
+        self.shutdown()
+        self.server_close()
+
+
+class TestWebSocketClient(unittest.TestCase):
+    ''' Test the WebSocketClient against the stand-in server '''
+
+    def test_receive_messages(self):
+        ''' Text, fragmented and binary messages are received, pings are answered, close ends the stream '''
+        status = json.dumps(read_doc("opendtu_status.json")).encode("utf-8")
+        server = StandInServer([
+            frame(0x1, status),
+            frame(0x9, b"ping"),
+            frame(0x1, b'{"inverters": ', fin=False),
+            frame(0x0, b'[]}'),
+            frame(0x2, b"\x01\x02"),
+            frame(0x8, struct.pack("!H", 1000)),
+        ])
+        self.addCleanup(server.stop)
+
+        client = WebSocketClient(f"ws://{server.address}/livedata", headers={"Authorization": "Basic abc"}, timeout=5)
+        client.connect()
+        self.assertEqual(json.loads(client.receive()), read_doc("opendtu_status.json"))
+        self.assertEqual(client.receive(), '{"inverters": []}')
+        self.assertEqual(client.receive(), b"\x01\x02")
+        self.assertIsNone(client.receive())
+
+        self.assertTrue(server.closed.wait(5))
+        self.assertEqual(server.requests[0]["authorization"], "Basic abc")
+        self.assertEqual(server.received[0], (0xA, b"ping"))
+        self.assertEqual(server.received[1][0], 0x8)
+
+
+class TestMergeLivedata(unittest.TestCase):
+    ''' Test merge_livedata '''
+
+    def test_merge(self):
+        ''' Only the pushed inverters are replaced, the snapshot itself is not modified '''
+        snapshot = read_doc("opendtu_status.json")
+        original = copy.deepcopy(snapshot)
+        serial = snapshot["inverters"][0]["serial"]
+        delta = pushed_inverter(serial, 42.5)
+        delta["inverters"].append({"serial": "unknown"})
+
+        merged, serials = merge_livedata(snapshot, delta)
+        self.assertEqual(serials, [serial])
+        self.assertEqual(merged["inverters"][0]["AC"]["0"]["Power"]["v"], 42.5)
+        self.assertEqual(merged["inverters"][0]["name"], delta["inverters"][0]["name"])
+        self.assertEqual(merged["inverters"][1:], snapshot["inverters"][1:])
+        self.assertEqual(merged["total"], delta["total"])
+        self.assertEqual(snapshot, original)
+
+
+class TestOpenDtuPush(DbusServiceTestCase):
+    ''' Test the push mode of DbusService against the stand-in server '''
+
+    config = {
+        "DEFAULT": {"DTU": "opendtu", "OpenDTUPush": "1"},
+        "INVERTER0": {"Phase": "L1", "DeviceInstance": "34", "AcPosition": "1", "Host": "localhost"},
+    }
+
+    def test_pushed_data_is_published_immediately(self):
+        ''' A pushed update is merged and published at once, polling pauses while the socket is connected '''
+        service = DbusService("com.victronenergy.pvinverter", 0, False)
+        service.coalescing_ttl = 0
+        service._dbusservice = {"/UpdateIndex": 0}
+        service.update()  # the first poll provides the complete data
+        self.assertEqual(service._dbusservice["/Ac/Power"], 12.10000038)
+
+        serial = service._get_serial(0)
+        message = json.dumps(pushed_inverter(serial, 42.5)).encode("utf-8")
+        server = StandInServer([frame(0x1, message)])
+        self.addCleanup(server.stop)
+        service.host = server.address
+
+        received = threading.Event()
+        deliveries = []
+
+        def dispatch(callback, document):
+            deliveries.append((callback, document))
+            received.set()
+
+        push = service.start_opendtu_push([service], dispatch=dispatch)
+        self.addCleanup(push.stop)
+        self.assertTrue(received.wait(5))
+        self.assertTrue(push.connected)
+
+        # the message is handed to the main loop, which publishes it
+        callback, document = deliveries[0]
+        self.assertFalse(callback(document))
+        self.assertEqual(service._dbusservice["/Ac/Power"], 42.5)
+        self.assertEqual(service._dbusservice["/UpdateIndex"], 2)
+
+        with patch('connection_pool.requests.Session.get') as mock_get:
+            service.update()
+            mock_get.assert_not_called()
+
+        push.stop()
+        self.assertFalse(push.connected)
+
+    def test_push_reconnects(self):
+        ''' A dropped connection is reopened after the reconnect interval '''
+        server = StandInServer([frame(0x8, struct.pack("!H", 1000))])
+        self.addCleanup(server.stop)
+        push = OpenDtuPush(f"ws://{server.address}/livedata", on_message=lambda document: None,
+                           decode=json.loads, reconnect_interval=0.05, timeout=5)
+        push.start()
+        self.addCleanup(push.stop)
+        for _ in range(100):
+            if len(server.requests) >= 2:
+                break
+            threading.Event().wait(0.05)
+        self.assertGreaterEqual(len(server.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+''' This file contains the unit tests for the per host rate limiter. '''
+
+# file ignores
+# pylint: disable=protected-access
+
+import sys
+import os
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add the parent directory of dbus_opendtu to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+# Mocking the dbus and other dependencies before importing the module to test
+sys.modules['dbus'] = MagicMock()
+sys.modules['vedbus'] = MagicMock()
+
+from dbus_service import DbusService  # noqa pylint: disable=wrong-import-position
+from rate_limiter import (  # noqa pylint: disable=wrong-import-position
+    HostRateLimiter,
+    RateLimiters,
+    parse_host_rate_limits,
+    parse_rate_limit,
+)
+from tests.service_fixture import DbusServiceTestCase  # noqa pylint: disable=wrong-import-position
+
+
+class TestParseRateLimit(unittest.TestCase):
+    ''' Test parse_rate_limit and parse_host_rate_limits '''
+
+    def test_parse_rate_limit(self):
+        ''' Missing parts are unlimited, invalid values are ignored '''
+        self.assertEqual(parse_rate_limit("1/2/1"), (1.0, 2.0, 1))
+        self.assertEqual(parse_rate_limit("0.5"), (0.5, 1.0, 0))
+        self.assertEqual(parse_rate_limit("//1"), (0.0, 1.0, 1))
+        self.assertIsNone(parse_rate_limit(""))
+        self.assertIsNone(parse_rate_limit("fast"))
+
+    def test_parse_host_rate_limits(self):
+        ''' Host names are case insensitive '''
+        self.assertEqual(parse_host_rate_limits("192.168.1.10:1/2/1, Shelly.local://1, broken"),
+                         {"192.168.1.10": (1.0, 2.0, 1), "shelly.local": (0.0, 1.0, 1)})
+
+
+class TestHostRateLimiter(unittest.TestCase):
+    ''' Test the HostRateLimiter class '''
+
+    def test_token_bucket(self):
+        ''' A burst starts at once, further requests follow at the configured rate '''
+        limiter = HostRateLimiter(rate=20, burst=2)
+        start = time.monotonic()
+        for _ in range(6):
+            with limiter.limit():
+                pass
+        elapsed = time.monotonic() - start
+        self.assertGreaterEqual(elapsed, 4 / 20 * 0.9)
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(limiter.waits, 4)
+
+    def test_max_in_flight_and_order(self):
+        ''' At most max_in_flight requests run at once, waiting requests start in the order they arrived '''
+        limiter = HostRateLimiter(max_in_flight=1)
+        started = []
+        running = []
+        max_running = []
+
+        def request(number):
+            with limiter.limit(timeout=5):
+                started.append(number)
+                running.append(number)
+                max_running.append(len(running))
+                time.sleep(0.01)
+                running.remove(number)
+
+        limiter.acquire()  # block the host, so the threads queue up
+        threads = []
+        for number in range(5):
+            thread = threading.Thread(target=request, args=(number,))
+            thread.start()
+            threads.append(thread)
+            while len(limiter._waiting) <= number:
+                time.sleep(0.001)
+        limiter.release()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(started, [0, 1, 2, 3, 4])
+        self.assertEqual(max(max_running), 1)
+
+    def test_timeout(self):
+        ''' A request which does not get its turn in time fails and leaves the queue '''
+        limiter = HostRateLimiter(max_in_flight=1)
+        limiter.acquire()
+        with self.assertRaises(TimeoutError):
+            limiter.acquire(timeout=0.05)
+        self.assertEqual(len(limiter._waiting), 0)
+        limiter.release()
+        with limiter.limit(timeout=0.05):
+            pass
+
+
+class TestRateLimiters(unittest.TestCase):
+    ''' Test the RateLimiters class '''
+
+    def test_limits_per_host_and_esp_type(self):
+        ''' Host limits win over the ESP type profile, which wins over the default '''
+        limiters = RateLimiters(default=(0, 1, 4), esp_limits={"ESP8266": (1.0, 2.0, 1)},
+                                host_limits={"shelly": (5.0, 5.0, 2)})
+        self.assertIs(limiters.get("AHOY"), limiters.get("ahoy"))
+        self.assertEqual(limiters.get("ahoy").max_in_flight, 4)
+
+        limiters.set_esp_type("ahoy", "esp8266")
+        self.assertEqual((limiters.get("ahoy").rate, limiters.get("ahoy").max_in_flight), (1.0, 1))
+        limiters.set_esp_type("shelly", "ESP8266")
+        self.assertEqual((limiters.get("shelly").rate, limiters.get("shelly").max_in_flight), (5.0, 2))
+        limiters.set_esp_type("opendtu", "ESP32")
+        self.assertEqual(limiters.get("opendtu").max_in_flight, 4)
+
+
+class TestDbusServiceRateLimit(DbusServiceTestCase):
+    ''' Test that the services share the limiter of their host '''
+
+    config = {
+        "DEFAULT": {"DTU": "ahoy", "Host": "localhost"},
+        "INVERTER0": {"Phase": "L1", "DeviceInstance": "34", "AcPosition": "1", "Host": "localhost"},
+        "TEMPLATE0": {
+            "Username": "", "Password": "", "DigestAuth": "False", "Host": "localhost",
+            "CUST_SN": "12345678", "CUST_API_PATH": "cm?cmnd=STATUS+8", "CUST_POLLING": "2000",
+            "CUST_Total": "StatusSNS/ENERGY/Total", "CUST_Total_Mult": "1",
+            "CUST_Power": "StatusSNS/ENERGY/Power", "CUST_Power_Mult": "1",
+            "CUST_Voltage": "StatusSNS/ENERGY/Voltage", "CUST_Current": "StatusSNS/ENERGY/Current",
+            "Phase": "L1", "DeviceInstance": "47", "AcPosition": "1", "Name": "Tasmota", "ESPType": "ESP8266",
+        },
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.limiters = RateLimiters(esp_limits={"ESP8266": (100.0, 2.0, 1)})
+        self.set_shared("rate_limiters", self.limiters)
+
+    def test_template_and_dtu_share_the_host(self):
+        ''' The template configured as ESP8266 limits all requests to its host, also those of the DTU '''
+        template = DbusService("com.victronenergy.pvinverter", 0, istemplate=True)
+        limiter = self.limiters.get("localhost")
+        self.assertEqual(limiter.max_in_flight, 1)
+
+        with patch.object(limiter, "acquire", wraps=limiter.acquire) as acquire:
+            template.coalescing_ttl = 0
+            template.fetch_url("http://localhost/cm?cmnd=STATUS+8")
+            DbusService("com.victronenergy.pvinverter", 0)
+        self.assertGreater(acquire.call_count, 1)
+        self.assertEqual(limiter._in_flight, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
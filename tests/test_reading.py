@@ -0,0 +1,42 @@
+''' This file contains the unit tests for the Reading of the template services. '''
+
+import sys
+import os
+import unittest
+
+# Add the parent directory of dbus_opendtu to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+from helpers import PathAccessor  # noqa pylint: disable=wrong-import-position
+from reading import Reading  # noqa pylint: disable=wrong-import-position
+
+
+class TestReading(unittest.TestCase):
+    ''' Test the Reading class '''
+
+    accessors = (
+        PathAccessor(["StatusSNS", "ENERGY", "Power"], 0, 2),
+        PathAccessor(["StatusSNS", "ENERGY", "Total"], 0, 1),
+        PathAccessor(["StatusSNS", "ENERGY", "Current"], None),
+        PathAccessor(["StatusSNS", "ENERGY", "Voltage"], None),
+    )
+
+    def test_from_response(self):
+        ''' Only the values are kept, with the factor applied '''
+        response = {"StatusSNS": {"ENERGY": {"Power": 95, "Total": 13.5, "Current": 0.8, "Voltage": 235,
+                                             "Other": list(range(1000))}}}
+        reading = Reading.from_response(response, self.accessors)
+        self.assertEqual(reading.get_values(), (190, 13.5, 0.8, 235, None))
+        self.assertTrue(reading.valid)
+        self.assertFalse(hasattr(reading, "__dict__"))
+
+    def test_missing_value_is_invalid(self):
+        ''' A value which is not a number and has no default is None and makes the reading invalid '''
+        response = {"StatusSNS": {"ENERGY": {"Power": 95, "Current": "n/a", "Voltage": None}}}
+        reading = Reading.from_response(response, self.accessors)
+        self.assertEqual(reading.get_values(), (190, 0, None, None, None))
+        self.assertFalse(reading.valid)
+
+
+if __name__ == '__main__':
+    unittest.main()
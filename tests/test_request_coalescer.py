@@ -0,0 +1,104 @@
+''' This file contains the unit tests for the RequestCoalescer class. '''
+
+import sys
+import os
+import threading
+import unittest
+from unittest.mock import patch
+
+# Add the parent directory of dbus_opendtu to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+from request_coalescer import RequestCoalescer  # noqa pylint: disable=wrong-import-position
+
+
+class TestRequestCoalescer(unittest.TestCase):
+    ''' Test the RequestCoalescer class '''
+
+    def setUp(self):
+        self.coalescer = RequestCoalescer()
+        self.calls = 0
+
+    def fetch_status(self):
+        ''' Simulated HTTP request '''
+        self.calls += 1
+        return {"call": self.calls}
+
+    def test_result_is_shared_within_ttl(self):
+        ''' Callers within the ttl get the same result without a new request '''
+        with patch('request_coalescer.time.monotonic', return_value=100.0):
+            first = self.coalescer.fetch("shelly/status", self.fetch_status, ttl=0.5)
+        with patch('request_coalescer.time.monotonic', return_value=100.4):
+            second = self.coalescer.fetch("shelly/status", self.fetch_status, ttl=0.5)
+        self.assertIs(first, second)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.coalescer.stats, {"requests": 1, "coalesced": 1})
+
+    def test_new_request_after_ttl(self):
+        ''' After the ttl the next caller issues a new request '''
+        with patch('request_coalescer.time.monotonic', return_value=100.0):
+            self.coalescer.fetch("shelly/status", self.fetch_status, ttl=0.5)
+        with patch('request_coalescer.time.monotonic', return_value=100.6):
+            result = self.coalescer.fetch("shelly/status", self.fetch_status, ttl=0.5)
+        self.assertEqual(result, {"call": 2})
+
+    def test_different_keys_are_not_shared(self):
+        ''' Other host, path or credentials means another request '''
+        self.coalescer.fetch(("http://a/status", "", ""), self.fetch_status, ttl=10)
+        self.coalescer.fetch(("http://b/status", "", ""), self.fetch_status, ttl=10)
+        self.coalescer.fetch(("http://a/status", "admin", "pw"), self.fetch_status, ttl=10)
+        self.assertEqual(self.calls, 3)
+
+    def test_only_one_request_in_flight(self):
+        ''' Concurrent callers wait for the running request instead of issuing their own '''
+        release = threading.Event()
+        started = threading.Event()
+        results = []
+
+        def slow_fetch():
+            started.set()
+            release.wait(1)
+            return self.fetch_status()
+
+        threads = [threading.Thread(target=lambda: results.append(
+            self.coalescer.fetch("key", slow_fetch, ttl=0))) for _ in range(3)]
+        threads[0].start()
+        started.wait(1)
+        for thread in threads[1:]:
+            thread.start()
+        while self.coalescer.stats["coalesced"] < 2:
+            threading.Event().wait(0.001)
+        release.set()
+        for thread in threads:
+            thread.join(1)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [{"call": 1}] * 3)
+
+    def test_result_is_not_kept_without_ttl(self):
+        ''' With ttl 0 the coalescer drops the result as soon as the request is done '''
+        self.coalescer.fetch("key", self.fetch_status, ttl=0)
+        self.assertEqual(self.coalescer._requests, {})  # pylint: disable=protected-access
+        self.assertEqual(self.coalescer.fetch("key", self.fetch_status, ttl=0), {"call": 2})
+
+    def test_ttl_of_each_result(self):
+        ''' A result expires by the ttl it was fetched with, not by the ttl of later callers '''
+        with patch('request_coalescer.time.monotonic', return_value=100.0):
+            first = self.coalescer.fetch("template", self.fetch_status, ttl=10)
+        with patch('request_coalescer.time.monotonic', return_value=101.0):
+            self.coalescer.fetch("dtu", self.fetch_status, ttl=0)
+            self.assertIs(self.coalescer.fetch("template", self.fetch_status, ttl=10), first)
+        self.assertEqual(self.calls, 2)
+
+    def test_errors_are_not_cached(self):
+        ''' A failed request is not handed to later callers '''
+        def failing_fetch():
+            raise ConnectionError("device offline")
+
+        with self.assertRaises(ConnectionError):
+            self.coalescer.fetch("key", failing_fetch, ttl=10)
+        self.assertEqual(self.coalescer.fetch("key", self.fetch_status, ttl=10), {"call": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+''' This file contains the unit tests for the PollScheduler. '''
+
+# file ignores
+# pylint: disable=protected-access
+
+import sys
+import os
+import random
+import unittest
+
+# Add the parent directory of dbus_opendtu to the system path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa pylint: disable=wrong-import-position
+
+from scheduler import PollScheduler  # noqa pylint: disable=wrong-import-position
+
+
+class FakeService:
+    ''' Service recording the times update() was called '''
+
+    def __init__(self, clock, host, polling_interval):
+        self.clock = clock
+        self.host = host
+        self.polling_interval = polling_interval
+        self.updates = []
+
+    def update(self):
+        ''' Record the update '''
+        self.updates.append(self.clock.now)
+
+
+class FakeMainLoop:
+    ''' Clock and GLib.timeout_add stand-in, runs the timers in order of their due time '''
+
+    def __init__(self):
+        self.now = 100.0
+        self.timers = []
+        self.wakeups = 0
+
+    def __call__(self):
+        return self.now
+
+    def timeout_add(self, milliseconds, callback):
+        ''' Arm a timer '''
+        self.timers.append((self.now + milliseconds / 1000, callback))
+        return len(self.timers)
+
+    def run_until(self, end):
+        ''' Fire the timers until the given time '''
+        while self.timers:
+            self.timers.sort(key=lambda timer: timer[0])
+            due, callback = self.timers[0]
+            if due > end:
+                break
+            self.timers.pop(0)
+            self.now = due
+            self.wakeups += 1
+            if callback():
+                self.timers.append((self.now, callback))
+        self.now = end
+
+
+class TestPollScheduler(unittest.TestCase):
+    ''' Test the PollScheduler class '''
+
+    def setUp(self):
+        self.loop = FakeMainLoop()
+
+    def create_scheduler(self, services, jitter=0.0):
+        ''' Scheduler on the fake main loop '''
+        return PollScheduler(services, timeout_add=self.loop.timeout_add, jitter=jitter,
+                             clock=self.loop, rng=random.Random(1))
+
+    def test_sub_second_intervals(self):
+        ''' Every service is polled at its own interval, also below one second '''
+        fast = FakeService(self.loop, "shelly", 500)
+        slow = FakeService(self.loop, "tasmota", 5000)
+        self.create_scheduler([fast, slow]).start()
+        self.loop.run_until(109.9)
+
+        self.assertEqual(len(fast.updates), 20)
+        self.assertEqual(len(slow.updates), 2)
+        self.assertAlmostEqual(fast.updates[1] - fast.updates[0], 0.5)
+        self.assertAlmostEqual(slow.updates[1] - slow.updates[0], 5.0)
+
+    def test_one_timer_only_when_due(self):
+        ''' Only one timer is armed at a time and it fires only when a deadline is due '''
+        services = [FakeService(self.loop, "dtu", 5000) for _ in range(3)]
+        scheduler = self.create_scheduler(services)
+        scheduler.start()
+        self.assertEqual(len(self.loop.timers), 1)
+        self.loop.run_until(129.9)
+
+        self.assertEqual(self.loop.wakeups, 6)
+        self.assertEqual(scheduler.wakeups, 6)
+        self.assertEqual(len(self.loop.timers), 1)
+
+    def test_services_of_one_dtu_are_polled_together(self):
+        ''' Services sharing host and interval form one group, groups are spread over the interval '''
+        inverters = [FakeService(self.loop, "opendtu", 5000) for _ in range(2)]
+        template_1 = FakeService(self.loop, "shelly1", 5000)
+        template_2 = FakeService(self.loop, "shelly2", 5000)
+        scheduler = self.create_scheduler(inverters + [template_1, template_2])
+        self.assertEqual(len(scheduler.groups), 3)
+        scheduler.start()
+        self.loop.run_until(109.9)
+
+        self.assertEqual(inverters[0].updates, inverters[1].updates)
+        first_polls = sorted([inverters[0].updates[0], template_1.updates[0], template_2.updates[0]])
+        self.assertAlmostEqual(first_polls[1] - first_polls[0], 5 / 3, places=2)
+        self.assertAlmostEqual(first_polls[2] - first_polls[1], 5 / 3, places=2)
+
+    def test_jitter_does_not_drift(self):
+        ''' Each poll is moved by at most the jitter, the deadlines stay on the interval grid '''
+        service = FakeService(self.loop, "dtu", 1000)
+        self.create_scheduler([service], jitter=0.1).start()
+        self.loop.run_until(200.0)
+
+        self.assertIn(len(service.updates), (99, 100, 101))
+        for index, update_time in enumerate(service.updates):
+            self.assertLessEqual(abs(update_time - (100.0 + index)), 0.1 + 0.001)
+        self.assertGreater(len({round(b - a, 3) for a, b in zip(service.updates, service.updates[1:])}), 1)
+
+    def test_missed_polls_are_skipped(self):
+        ''' After a long stall the service is polled once, not once for every missed interval '''
+        service = FakeService(self.loop, "dtu", 1000)
+        scheduler = self.create_scheduler([service])
+        scheduler.start()
+        self.loop.timers.clear()
+        self.loop.now += 60
+        self.assertEqual(scheduler.run_due(), 1)
+        self.assertEqual(scheduler.run_due(), 0)
+        self.loop.now += 1
+        self.assertEqual(scheduler.run_due(), 1)
+
+    def test_error_in_update(self):
+        ''' An exception in one service does not stop the others '''
+        failing = FakeService(self.loop, "dtu", 1000)
+        failing.update = lambda: 1 / 0
+        service = FakeService(self.loop, "dtu", 1000)
+        self.create_scheduler([failing, service]).start()
+        self.loop.run_until(102.5)
+        self.assertEqual(len(service.updates), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
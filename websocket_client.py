@@ -0,0 +1,187 @@
+'''Minimal WebSocket client (RFC 6455) to receive the live data pushed by OpenDTU'''
+
+# system imports:
+import base64
+import hashlib
+import os
+import socket
+import ssl
+import struct
+from urllib.parse import urlsplit
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+MAX_MESSAGE_SIZE = 1024 * 1024
+
+
+class WebSocketError(ConnectionError):
+    '''The WebSocket connection failed or was closed'''
+
+
+class WebSocketClient:
+    '''
+    Client side of a WebSocket connection, only what is needed to receive messages from a DTU.
+
+    receive() blocks until the next text or binary message. If nothing was received for `timeout`
+    seconds a ping is sent; if there is still no answer after another `timeout` seconds the connection
+    is considered dead and WebSocketError is raised.
+    '''
+
+    def __init__(self, url, headers=None, timeout=30):
+        self.url = url
+        self.headers = headers or {}
+        self.timeout = timeout
+        self._sock = None
+        self._buffer = b""
+
+    def connect(self):
+        '''Open the TCP connection and do the WebSocket handshake'''
+        parts = urlsplit(self.url)
+        if parts.scheme not in ("ws", "wss"):
+            raise ValueError(f"Not a WebSocket url: {self.url}")
+        port = parts.port or (443 if parts.scheme == "wss" else 80)
+        sock = socket.create_connection((parts.hostname, port), timeout=self.timeout)
+        if parts.scheme == "wss":
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parts.hostname)
+        self._sock = sock
+        self._buffer = b""
+
+        key = base64.b64encode(os.urandom(16)).decode("ascii")
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        lines = [
+            f"GET {path} HTTP/1.1",
+            f"Host: {parts.netloc}",
+            "Upgrade: websocket",
+            "Connection: Upgrade",
+            f"Sec-WebSocket-Key: {key}",
+            "Sec-WebSocket-Version: 13",
+        ]
+        lines += [f"{name}: {value}" for name, value in self.headers.items()]
+        self._sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode("ascii"))
+
+        status_line, response_headers = self._read_http_response()
+        if status_line.split(" ")[1:2] != ["101"]:
+            self.close()
+            raise WebSocketError(f"WebSocket handshake with {self.url} failed: {status_line}")
+        expected_accept = base64.b64encode(
+            hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+        if response_headers.get("sec-websocket-accept") != expected_accept:
+            self.close()
+            raise WebSocketError(f"WebSocket handshake with {self.url} failed: invalid Sec-WebSocket-Accept")
+
+    def _read_http_response(self):
+        while b"\r\n\r\n" not in self._buffer:
+            self._recv_into_buffer()
+            if len(self._buffer) > 16384:
+                raise WebSocketError("WebSocket handshake response too long")
+        head, self._buffer = self._buffer.split(b"\r\n\r\n", 1)
+        lines = head.decode("iso-8859-1").split("\r\n")
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return lines[0], headers
+
+    def _get_socket(self):
+        if self._sock is None:
+            raise WebSocketError("WebSocket connection is closed")
+        return self._sock
+
+    def _recv_into_buffer(self):
+        data = self._get_socket().recv(65536)
+        if not data:
+            raise WebSocketError("WebSocket connection closed by peer")
+        self._buffer += data
+
+    def _read_exactly(self, size):
+        waiting_for_pong = False
+        while len(self._buffer) < size:
+            try:
+                self._recv_into_buffer()
+                waiting_for_pong = False
+            except socket.timeout as error:
+                if waiting_for_pong:
+                    raise WebSocketError("WebSocket connection timed out") from error
+                self.send_frame(OPCODE_PING, b"")
+                waiting_for_pong = True
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def _read_frame(self):
+        first, second = self._read_exactly(2)
+        fin = bool(first & 0x80)
+        opcode = first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self._read_exactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self._read_exactly(8))[0]
+        if length > MAX_MESSAGE_SIZE:
+            raise WebSocketError(f"WebSocket frame too large: {length} bytes")
+        mask = self._read_exactly(4) if second & 0x80 else None
+        payload = self._read_exactly(length)
+        if mask:
+            payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+        return fin, opcode, payload
+
+    def receive(self):
+        '''Return the next message (str for text, bytes for binary messages), None if the peer closed'''
+        message = b""
+        message_opcode = None
+        while True:
+            fin, opcode, payload = self._read_frame()
+            if opcode == OPCODE_PING:
+                self.send_frame(OPCODE_PONG, payload)
+            elif opcode == OPCODE_PONG:
+                pass
+            elif opcode == OPCODE_CLOSE:
+                self._send_close()
+                self.close()
+                return None
+            else:
+                if opcode != OPCODE_CONTINUATION:
+                    message_opcode = opcode
+                    message = b""
+                message += payload
+                if len(message) > MAX_MESSAGE_SIZE:
+                    raise WebSocketError("WebSocket message too large")
+                if fin:
+                    return message.decode("utf-8") if message_opcode == OPCODE_TEXT else message
+
+    def send_frame(self, opcode, payload):
+        '''Send one (masked, as required for clients) frame'''
+        header = bytes([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header += bytes([0x80 | length])
+        elif length < 65536:
+            header += bytes([0x80 | 126]) + struct.pack("!H", length)
+        else:
+            header += bytes([0x80 | 127]) + struct.pack("!Q", length)
+        mask = os.urandom(4)
+        self._get_socket().sendall(header + mask + bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload)))
+
+    def _send_close(self):
+        try:
+            self.send_frame(OPCODE_CLOSE, struct.pack("!H", 1000))
+        except OSError:
+            pass
+
+    def close(self):
+        '''Close the connection'''
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)  # also wakes up a receive() blocked in another thread
+            except OSError:
+                pass
+            sock.close()